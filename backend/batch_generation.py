@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Offline bulk generation of TIA reports through a Batch API.
+Builds per-section requests for many jobs, submits them as one JSONL batch,
+polls until it completes and fans results back into the section cache
+and job results. Providers: the OpenAI Batch API, or a file-based local
+stand-in for tests and development.
+"""
+
+import os
+import sys
+import json
+import uuid
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Callable, Set, Tuple
+
+from dotenv import load_dotenv
+
+from tia_generator import (
+    DEFAULT_TEMPERATURE,
+    extract_sections,
+    get_cached_section,
+    cache_section,
+    get_report_hash,
+    build_section_messages,
+    get_section_token_limit,
+    record_job_cost,
+    validate_input_data
+)
+from section_scheduler import get_section_dependencies, generation_error, is_generation_error
+from model_selection import select_model_for_section
+from canonicalization import canonicalize_request
+from openai_client import get_client
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.batch")
+
+# Batch settings
+BATCH_PROVIDER = os.getenv("BATCH_PROVIDER", "openai")  # "openai" or "local"
+BATCH_WORK_DIR = os.getenv("BATCH_WORK_DIR", "/tmp/tia-batches")
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+# Expiry of the lock a worker holds while ingesting a batch's results
+BATCH_INGEST_LOCK_TTL = int(os.getenv("BATCH_INGEST_LOCK_TTL", "600"))
+
+# Provider statuses that end polling
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchProvider(ABC):
+    """Interface for submitting JSONL request batches"""
+
+    @abstractmethod
+    async def submit(self, input_path: str) -> str:
+        """Submit a JSONL file of requests, returning the provider batch id"""
+
+    @abstractmethod
+    async def poll(self, batch_id: str) -> str:
+        """Get the batch status (one of TERMINAL_STATUSES when done)"""
+
+    @abstractmethod
+    async def fetch_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Get the output lines of a completed batch"""
+
+
+class OpenAIBatchProvider(BatchProvider):
+    """Submits batches to the OpenAI Batch API"""
+
+    def __init__(self, completion_window: str = BATCH_COMPLETION_WINDOW):
+        self.completion_window = completion_window
+
+    async def submit(self, input_path: str) -> str:
+        client = get_client()
+        with open(input_path, "rb") as f:
+            input_file = await client.files.create(file=f, purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    async def poll(self, batch_id: str) -> str:
+        batch = await get_client().batches.retrieve(batch_id)
+        return batch.status
+
+    async def fetch_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        client = get_client()
+        batch = await client.batches.retrieve(batch_id)
+        results = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await client.files.content(file_id)
+                results.extend(json.loads(line) for line in content.text.splitlines() if line.strip())
+        return results
+
+
+class LocalBatchProvider(BatchProvider):
+    """
+    File-based stand-in for the Batch API.
+    Batches are processed on first poll by a responder function that maps a
+    request body to the completion text (a placeholder by default).
+    """
+
+    def __init__(self, work_dir: str = BATCH_WORK_DIR, responder: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.work_dir = work_dir
+        self.responder = responder or self._placeholder_response
+
+    @staticmethod
+    def _placeholder_response(body: Dict[str, Any]) -> str:
+        return f"[local batch] {body['messages'][-1]['content'][:200]}"
+
+    def _batch_dir(self, batch_id: str) -> str:
+        return os.path.join(self.work_dir, batch_id)
+
+    async def submit(self, input_path: str) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex}"
+        batch_dir = self._batch_dir(batch_id)
+        os.makedirs(batch_dir, exist_ok=True)
+        with open(input_path) as src, open(os.path.join(batch_dir, "input.jsonl"), "w") as dst:
+            dst.write(src.read())
+        return batch_id
+
+    async def poll(self, batch_id: str) -> str:
+        batch_dir = self._batch_dir(batch_id)
+        if not os.path.exists(os.path.join(batch_dir, "input.jsonl")):
+            return "failed"
+        if not os.path.exists(os.path.join(batch_dir, "output.jsonl")):
+            await asyncio.to_thread(self._process, batch_dir)
+        return "completed"
+
+    def _process(self, batch_dir: str):
+        with open(os.path.join(batch_dir, "input.jsonl")) as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+
+        with open(os.path.join(batch_dir, "output.jsonl"), "w") as f:
+            for request in requests:
+                body = request["body"]
+                text = self.responder(body)
+                prompt_chars = sum(len(message["content"]) for message in body["messages"])
+                f.write(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {
+                            "model": body["model"],
+                            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                            "usage": {
+                                "prompt_tokens": prompt_chars // 4,
+                                "completion_tokens": len(text) // 4,
+                                "total_tokens": prompt_chars // 4 + len(text) // 4
+                            }
+                        }
+                    },
+                    "error": None
+                }) + "\n")
+
+    async def fetch_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        output_path = os.path.join(self._batch_dir(batch_id), "output.jsonl")
+        with open(output_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def get_batch_provider(name: str = BATCH_PROVIDER) -> BatchProvider:
+    """Get the configured batch provider"""
+    if name == "local":
+        return LocalBatchProvider()
+    return OpenAIBatchProvider()
+
+
+def _dependency_inputs(section: str, done: Dict[str, str]) -> Tuple[Dict[str, str], Set[str]]:
+    """
+    Generated text of the sections a section builds on, from the job's sections
+    generated so far, and the dependencies that failed (left out of that text)
+    """
+    deps = [dep for dep in get_section_dependencies(section) if dep in done]
+    # An error message is not content to build on
+    failed = {dep for dep in deps if is_generation_error(done[dep])}
+    inputs = {dep: done[dep] for dep in deps if dep not in failed and done[dep]}
+    return inputs, failed
+
+
+async def build_batch_requests(
+    job_id: str,
+    data: Dict[str, Any],
+    redis_cache = None,
+    done: Optional[Dict[str, str]] = None
+):
+    """
+    Build Batch API request lines for one job.
+    Only sections whose dependencies are all in done (the job's sections
+    generated so far, by earlier batches) are requested; the rest are deferred
+    to a follow-up batch. Sections already in the section cache are returned
+    instead of requested.
+
+    Returns:
+        (request lines, {section: cached content}, [deferred sections])
+    """
+    sections = extract_sections(data)
+    project_context = {k: v for k, v in sections.items() if k.startswith("_")}
+    done = done or {}
+    requests = []
+    cached = {}
+
+    wanted = {
+        section: content for section, content in sections.items()
+        if not section.startswith("_") and content and content.strip() and section not in done
+    }
+    ready, deferred = [], []
+    for section in wanted:
+        # Dependencies outside this report (e.g. empty sections) are already satisfied
+        deps = set(get_section_dependencies(section)) & (wanted.keys() | done.keys())
+        (ready if deps <= done.keys() else deferred).append(section)
+    if deferred and not ready:
+        # Only a dependency cycle can leave nothing requestable; request the rest without inputs
+        logger.warning(f"Section dependency cycle among {deferred} in job {job_id}, ignoring dependencies")
+        ready, deferred = deferred, []
+
+    for section in ready:
+        content = wanted[section]
+        inputs, failed = _dependency_inputs(section, done)
+        if failed:
+            logger.warning(f"Requesting {section} for job {job_id} without failed dependencies {sorted(failed)}")
+
+        # Text built without a failed dependency isn't what the cache key describes
+        if redis_cache and not failed:
+            cached_result = await get_cached_section(section, content, project_context, redis_cache, inputs or None)
+            if cached_result:
+                cached[section] = cached_result
+                continue
+
+        requests.append({
+            "custom_id": f"{job_id}:{section}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": select_model_for_section(section, len(content)),
+                "messages": build_section_messages(section, content, project_context, inputs or None),
+                "max_tokens": get_section_token_limit(section),
+                "temperature": DEFAULT_TEMPERATURE
+            }
+        })
+
+    return requests, cached, deferred
+
+
+async def _submit_batch(
+    requests: List[Dict[str, Any]],
+    record: Dict[str, Any],
+    redis_cache,
+    provider: BatchProvider
+) -> str:
+    """Write request lines to a JSONL file, submit it and store the batch record"""
+    os.makedirs(BATCH_WORK_DIR, exist_ok=True)
+    input_path = os.path.join(BATCH_WORK_DIR, f"input_{uuid.uuid4().hex}.jsonl")
+    with open(input_path, "w") as f:
+        for request in requests:
+            f.write(json.dumps(request) + "\n")
+
+    batch_id = await provider.submit(input_path)
+    await redis_cache.set_batch(batch_id, record)
+    logger.info(f"Submitted batch {batch_id} with {len(requests)} requests for {len(record['jobs'])} jobs")
+    return batch_id
+
+
+async def submit_bulk_jobs(
+    jobs: Dict[str, Dict[str, Any]],
+    redis_cache,
+    provider: Optional[BatchProvider] = None
+) -> str:
+    """
+    Submit many report jobs as one batch. Each job is marked "queued_batch".
+    Sections that build on others (e.g. the conclusion) follow in a second
+    batch, submitted when this one is ingested.
+
+    Args:
+        jobs: Mapping of job_id to TIA request data
+        redis_cache: Cache for job state and sections
+        provider: Batch provider (defaults to BATCH_PROVIDER)
+
+    Returns:
+        The batch id to pass to poll_and_ingest
+    """
+    provider = provider or get_batch_provider()
+    all_requests = []
+    record = {"jobs": {}, "created": time.time()}
+
+    for job_id, data in jobs.items():
+        requests, cached, deferred = await build_batch_requests(job_id, data, redis_cache)
+        all_requests.extend(requests)
+        record["jobs"][job_id] = {"cached": cached, "requested": len(requests), "deferred": deferred}
+        await redis_cache.start_job(job_id, data, status="queued_batch")
+
+    if not all_requests:
+        # Everything was cached; finish the jobs without a provider round-trip
+        batch_id = f"cached_batch_{uuid.uuid4().hex}"
+        await redis_cache.set_batch(batch_id, record)
+        await ingest_batch_results(batch_id, [], redis_cache, provider)
+        return batch_id
+
+    return await _submit_batch(all_requests, record, redis_cache, provider)
+
+
+async def ingest_batch_results(
+    batch_id: str,
+    results: List[Dict[str, Any]],
+    redis_cache,
+    provider: Optional[BatchProvider] = None
+) -> Dict[str, Dict[str, str]]:
+    """
+    Write batch results into the section cache and finish each job, or submit
+    a follow-up batch for jobs with sections still waiting on these results.
+
+    Returns:
+        Final report per finished job id
+    """
+    record = await redis_cache.get_batch(batch_id) or {"jobs": {}}
+    reports = {job_id: dict(job["cached"]) for job_id, job in record["jobs"].items()}
+    # Usage carried over from earlier batches of the same jobs
+    earlier_usage = {job_id: job.get("usage", []) for job_id, job in record["jobs"].items()}
+
+    for line in results:
+        job_id, _, section = line.get("custom_id", "").partition(":")
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+
+        if line.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+            error = line.get("error") or body.get("error") or "no response"
+            logger.error(f"Batch {batch_id} request {line.get('custom_id')} failed: {error}")
+            metrics.record_section_failure(section, str(error))
+            reports.setdefault(job_id, {})[section] = generation_error(str(error))
+            continue
+
+        content = (body["choices"][0]["message"]["content"] or "").strip()
+        usage = body.get("usage") or {}
+        metrics.record_token_usage(
+            body.get("model", ""),
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+            section=section,
+            job_id=job_id,
+            batch=True
+        )
+        reports.setdefault(job_id, {})[section] = content
+
+    finished = {}
+    follow_up_requests = []
+    follow_up = {"jobs": {}, "created": time.time(), "parent": batch_id}
+
+    for job_id, report in reports.items():
+        job = record["jobs"].get(job_id, {})
+        data = await redis_cache.get_job_input(job_id) or {}
+        sections = extract_sections(data)
+        project_context = {k: v for k, v in sections.items() if k.startswith("_")}
+
+        # Cache freshly generated sections for later interactive jobs
+        for section, content in report.items():
+            if section in job.get("cached", {}) or is_generation_error(content):
+                continue
+            inputs, failed = _dependency_inputs(section, report)
+            if not failed:
+                await cache_section(section, sections.get(section, ""), project_context, content, redis_cache, inputs or None)
+
+        # Sections that were waiting on this batch; keep going while they come from cache
+        deferred = job.get("deferred", [])
+        requests = []
+        while deferred and not requests:
+            requests, cached, deferred = await build_batch_requests(job_id, data, redis_cache, done=report)
+            report.update(cached)
+
+        if requests:
+            follow_up_requests.extend(requests)
+            follow_up["jobs"][job_id] = {
+                "cached": report,
+                "requested": len(requests),
+                "deferred": deferred,
+                "usage": earlier_usage.get(job_id, []) + metrics.pop_job_usage(job_id)["calls"]
+            }
+            continue
+
+        await record_job_cost(job_id, redis_cache, earlier_calls=earlier_usage.get(job_id))
+        await redis_cache.finish_job(job_id, report, report_hash=get_report_hash(data))
+        finished[job_id] = report
+
+    if follow_up_requests:
+        provider = provider or get_batch_provider()
+        record["next_batch"] = await _submit_batch(follow_up_requests, follow_up, redis_cache, provider)
+        start_polling(record["next_batch"], redis_cache, provider)
+
+    record["ingested"] = True
+    await redis_cache.set_batch(batch_id, record)
+    return finished
+
+
+async def _wait_for_batch(batch_id: str, provider: BatchProvider, interval: float) -> str:
+    """Poll a batch until it reaches a terminal status"""
+    while True:
+        try:
+            status = await provider.poll(batch_id)
+            if status in TERMINAL_STATUSES:
+                return status
+        except Exception as e:
+            # A failed poll (e.g. a network blip) shouldn't abandon a day-long batch
+            logger.warning(f"Polling batch {batch_id} failed, will retry: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+async def poll_and_ingest(
+    batch_id: str,
+    redis_cache,
+    provider: Optional[BatchProvider] = None,
+    interval: float = BATCH_POLL_INTERVAL
+) -> Dict[str, Dict[str, str]]:
+    """Poll a batch until it finishes, then ingest its results (or fail its jobs)"""
+    provider = provider or get_batch_provider()
+
+    record = await redis_cache.get_batch(batch_id)
+    if record and record.get("ingested"):
+        return {}
+
+    status = await _wait_for_batch(batch_id, provider, interval)
+
+    # Every worker that resumed this batch polls it, but only one ingests it
+    owner = uuid.uuid4().hex
+    if await redis_cache.acquire_inflight("batch", batch_id, owner, BATCH_INGEST_LOCK_TTL):
+        return {}
+    try:
+        record = await redis_cache.get_batch(batch_id)
+        if record and record.get("ingested"):
+            return {}
+
+        if status == "completed":
+            results = await provider.fetch_results(batch_id)
+            logger.info(f"Batch {batch_id} completed with {len(results)} results")
+            return await ingest_batch_results(batch_id, results, redis_cache, provider)
+
+        logger.error(f"Batch {batch_id} ended with status {status}")
+        record = record or {"jobs": {}}
+        for job_id in record["jobs"]:
+            metrics.pop_job_usage(job_id)
+            await redis_cache.fail_job(job_id, f"Batch {batch_id} {status}")
+        # Nothing left to ingest; stop resuming it
+        record["ingested"] = True
+        await redis_cache.set_batch(batch_id, record)
+        return {}
+    finally:
+        await redis_cache.release_inflight("batch", batch_id, owner)
+
+
+def start_polling(
+    batch_id: str,
+    redis_cache,
+    provider: Optional[BatchProvider] = None
+) -> asyncio.Task:
+    """Poll and ingest a batch in the background (once per batch in this process)"""
+    if batch_id not in _polling:
+        task = asyncio.create_task(poll_and_ingest(batch_id, redis_cache, provider))
+        _polling[batch_id] = task
+        task.add_done_callback(lambda _: _polling.pop(batch_id, None))
+    return _polling[batch_id]
+
+
+async def resume_pending_batches(redis_cache, provider: Optional[BatchProvider] = None) -> List[str]:
+    """Start polling every batch submitted but not yet ingested (e.g. after a restart)"""
+    batch_ids = await redis_cache.get_pending_batches()
+    for batch_id in batch_ids:
+        start_polling(batch_id, redis_cache, provider)
+    if batch_ids:
+        logger.info(f"Resumed polling {len(batch_ids)} pending batches")
+    return batch_ids
+
+
+async def wait_for_polling():
+    """Wait until no batch is being polled in this process (follow-up batches included)"""
+    while _polling:
+        await asyncio.gather(*list(_polling.values()), return_exceptions=True)
+
+
+async def stop_polling():
+    """Cancel background polling; pending batches are resumed on the next start"""
+    tasks = list(_polling.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Background polling tasks in this process, by batch id
+_polling: Dict[str, asyncio.Task] = {}
+
+
+async def _main(path: str):
+    """Submit every request in a JSONL file as one batch and wait for it"""
+    from caching import RedisCache
+
+    redis_cache = RedisCache()
+    await redis_cache.initialize()
+
+    jobs = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                data = canonicalize_request(json.loads(line))
+                errors = validate_input_data(data)
+                if errors:
+                    logger.warning(f"Skipping invalid request: {errors}")
+                    continue
+                jobs[str(uuid.uuid4())] = data
+
+    batch_id = await submit_bulk_jobs(jobs, redis_cache)
+    print(json.dumps({"batch_id": batch_id, "job_ids": list(jobs)}))
+    await poll_and_ingest(batch_id, redis_cache)
+    await wait_for_polling()
+    await redis_cache.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1]))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Cache payload benchmark for TIA Generator.
+Reports stored size and encode/decode time per report for plain JSON and
+the encodings caching.py can use.
+
+Usage: python cache_benchmark.py [report.json] [iterations]
+"""
+
+import sys
+import json
+import time
+import zlib
+import random
+from typing import Dict, Callable, Any, Tuple
+
+import orjson
+
+from caching import (
+    encode_payload,
+    decode_payload,
+    zstandard,
+    CACHE_COMPRESSION,
+    CACHE_COMPRESS_LEVEL,
+)
+from prompt_engineering import PROMPT_REGISTRY
+
+
+def sample_report(seed: int = 0) -> Dict[str, str]:
+    """Build a report-shaped dict: every known section with ~250 words of prose"""
+    rng = random.Random(seed)
+    words = (
+        "the site development traffic parking spaces vehicles peak hour council "
+        "access driveway road network proposed existing generation trips per "
+        "dwelling survey pedestrian bicycle public transport compliance with "
+        "requirements assessment impact minimal acceptable residential commercial"
+    ).split()
+    report = {}
+    for section in PROMPT_REGISTRY:
+        sentences = []
+        for _ in range(20):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 18)))
+            sentences.append(sentence.capitalize() + ".")
+        report[section] = " ".join(sentences)
+    return report
+
+
+def _time(fn: Callable[[], Any], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def _codecs() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    codecs = {
+        "json": (lambda v: json.dumps(v).encode("utf-8"), json.loads),
+        "orjson": (orjson.dumps, orjson.loads),
+        "orjson+zlib": (
+            lambda v: zlib.compress(orjson.dumps(v), CACHE_COMPRESS_LEVEL),
+            lambda b: orjson.loads(zlib.decompress(b))
+        ),
+    }
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=CACHE_COMPRESS_LEVEL)
+        decompressor = zstandard.ZstdDecompressor()
+        codecs["orjson+zstd"] = (
+            lambda v: compressor.compress(orjson.dumps(v)),
+            lambda b: orjson.loads(decompressor.decompress(b))
+        )
+    codecs[f"cache ({CACHE_COMPRESSION})"] = (encode_payload, decode_payload)
+    return codecs
+
+
+def run(report: Dict[str, str], iterations: int):
+    print(f"Report: {len(report)} sections, {sum(len(v) for v in report.values())} characters")
+    print(f"{'encoding':<20}{'report bytes':>14}{'section bytes':>15}{'encode ms':>12}{'decode ms':>12}")
+
+    for name, (encode, decode) in _codecs().items():
+        encoded = encode(report)
+        # Sections are also stored one key each
+        section_bytes = sum(len(encode(text)) for text in report.values())
+        encode_ms = _time(lambda: encode(report), iterations)
+        decode_ms = _time(lambda: decode(encoded), iterations)
+        print(f"{name:<20}{len(encoded):>14}{section_bytes:>15}{encode_ms:>12.3f}{decode_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            report = json.load(f)
+    else:
+        report = sample_report()
+    run(report, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
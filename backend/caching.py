@@ -6,83 +6,503 @@ Provides efficient caching of generated sections and reports
 
 import os
 import json
+import time
+import uuid
+import zlib
 import asyncio
 import logging
 import hashlib
-from typing import Dict, Any, Optional, List, Set
+from typing import Dict, Any, Optional, List, Set, Tuple, Union
 
-import redis.asyncio as redis
+import orjson
 from dotenv import load_dotenv
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from local_cache import LocalCache, L1_CACHE, approximate_size
+from storage import DiskStore, DISK_CACHE_PATH
+from redis_pool import (
+    build_client,
+    SharedPubSub,
+    backoff_delay,
+    normalize_redis_url,
+    REDIS_HEALTH_CHECK_PERIOD,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_BACKOFF_BASE,
+    REDIS_BACKOFF_CAP,
+)
+from canonicalization import report_hash, fuzzy_report_hash
+
 # Load environment variables
 load_dotenv()
 
 # Configure logging
 logger = logging.getLogger("tia-generator.cache")
 
+# Cache payload serialization
+#
+# Sections, results, inputs and batch records are stored as a 4-byte header
+# (magic, version, format, compression) followed by the body: UTF-8 text,
+# orjson, or a blob manifest (orjson), compressed when large enough. 0xFF never starts UTF-8 text, so
+# entries written before the header existed are told apart and still read.
+PAYLOAD_MAGIC = 0xFF
+PAYLOAD_VERSION = 1
+FORMAT_TEXT = 0
+FORMAT_JSON = 1
+FORMAT_MANIFEST = 2
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Compression: "zstd" (needs the zstandard package), "zlib" or "none"
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "zlib").lower()
+# Payloads smaller than this are stored uncompressed
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "512"))
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", "6"))
+
+if CACHE_COMPRESSION == "zstd" and zstandard is None:
+    logger.warning("CACHE_COMPRESSION=zstd but zstandard is not installed, using zlib")
+    CACHE_COMPRESSION = "zlib"
+
+
+def _compress(body: bytes) -> Tuple[int, bytes]:
+    if len(body) < CACHE_COMPRESS_MIN_BYTES or CACHE_COMPRESSION == "none":
+        return CODEC_NONE, body
+    if CACHE_COMPRESSION == "zstd":
+        codec, compressed = CODEC_ZSTD, zstandard.ZstdCompressor(level=CACHE_COMPRESS_LEVEL).compress(body)
+    else:
+        codec, compressed = CODEC_ZLIB, zlib.compress(body, CACHE_COMPRESS_LEVEL)
+    # Keep incompressible payloads as they are
+    return (codec, compressed) if len(compressed) < len(body) else (CODEC_NONE, body)
+
+
+def _decompress(codec: int, body: bytes) -> bytes:
+    if codec == CODEC_NONE:
+        return body
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(body)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Cached payload is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unknown cache payload compression {codec}")
+
+
+class BlobManifest(dict):
+    """Maps names (e.g. report sections) to the digests of the blobs holding their text"""
+
+
+def blob_digest(text: str) -> str:
+    """Content address of a blob"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def encode_payload(value: Any) -> bytes:
+    """Serialize a str (as text), BlobManifest or JSON-compatible value for storage"""
+    if isinstance(value, str):
+        payload_format, body = FORMAT_TEXT, value.encode("utf-8")
+    elif isinstance(value, BlobManifest):
+        payload_format, body = FORMAT_MANIFEST, orjson.dumps(value)
+    else:
+        payload_format, body = FORMAT_JSON, orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    codec, body = _compress(body)
+    return bytes((PAYLOAD_MAGIC, PAYLOAD_VERSION, payload_format, codec)) + body
+
+
+def decode_payload(data: Optional[Union[bytes, str]], legacy_json: bool = False) -> Any:
+    """
+    Deserialize a value written by encode_payload. Entries without a header
+    are read as plain text, or parsed as JSON if legacy_json is set.
+    """
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    if not data or data[0] != PAYLOAD_MAGIC:
+        return json.loads(data) if legacy_json else data.decode("utf-8")
+
+    if len(data) < 4 or data[1] > PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported cache payload version {data[1] if len(data) > 1 else None}")
+    body = _decompress(data[3], data[4:])
+    if data[2] == FORMAT_MANIFEST:
+        return BlobManifest(orjson.loads(body))
+    return orjson.loads(body) if data[2] == FORMAT_JSON else body.decode("utf-8")
+
+
+def _decode_text(value: Optional[bytes]) -> Optional[str]:
+    """Decode a plain (unenveloped) string value, e.g. a job status"""
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+# Atomically take from a request bucket (KEYS[1]) and a token bucket (KEYS[2]).
+# ARGV: rpm capacity, rpm refill/s, tpm capacity, tpm refill/s, request cost, token cost.
+# A capacity of 0 means no limit: that bucket is neither checked nor stored.
+# Deducts from both buckets only if both can pay; returns seconds to wait (0 = granted).
+RATE_LIMIT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local wait = 0
+local levels = {}
+
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    if capacity > 0 then
+        local cost = math.min(tonumber(ARGV[i + 4]), capacity)
+        local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        levels[i] = {tokens, cost, capacity, rate}
+        if tokens < cost then
+            wait = math.max(wait, (cost - tokens) / rate)
+        end
+    end
+end
+
+for i, level in pairs(levels) do
+    local tokens = level[1]
+    if wait == 0 then
+        tokens = tokens - level[2]
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(level[3] / level[4] * 1000) + 1000)
+end
+
+return tostring(wait)
+"""
+
+# Delete an in-flight lock (KEYS[1]) only if it is still held by ARGV[1]
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Section text is stored once per distinct content under tia:blob:{digest};
+# section cache entries, job results and report-hash entries hold manifests
+# of digests. BLOB_REFS_KEY counts the holders referencing each blob.
+BLOB_REFS_KEY = "tia:blobrefs"
+
+# Add ARGV[2] references to each blob (KEYS[2..]) in the refs hash (KEYS[1]),
+# storing ARGV[i + 1] as the content of KEYS[i] if it doesn't exist yet.
+# ARGV[1] is the TTL; existing blobs are kept at least that long.
+PUT_BLOBS_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local refs = tonumber(ARGV[2])
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        if redis.call('TTL', KEYS[i]) < ttl then
+            redis.call('EXPIRE', KEYS[i], ttl)
+        end
+    else
+        redis.call('SET', KEYS[i], ARGV[i + 1], 'EX', ttl)
+    end
+    redis.call('HINCRBY', KEYS[1], KEYS[i], refs)
+end
+return #KEYS - 1
+"""
+
+# Drop one reference to each blob (KEYS[2..]), deleting blobs left unreferenced
+RELEASE_BLOBS_SCRIPT = """
+local deleted = 0
+for i = 2, #KEYS do
+    if redis.call('HINCRBY', KEYS[1], KEYS[i], -1) <= 0 then
+        redis.call('HDEL', KEYS[1], KEYS[i])
+        deleted = deleted + redis.call('DEL', KEYS[i])
+    end
+end
+return deleted
+"""
+
+# Pubsub channel telling other workers to drop entries from their L1 cache
+CACHE_INVALIDATION_CHANNEL = "tia_cache_invalidate"
+# Set of ids of bulk batches submitted but not yet ingested
+PENDING_BATCHES_KEY = "tia:batches:pending"
+
+# Seconds the invalidation listener waits for a message before polling again
+INVALIDATION_POLL_TIMEOUT = 30.0
+
+# Per namespace: key pattern to delete when clearing, pattern of the keys counted
+# in stats, and the sorted set indexing those keys by expiry time
+CACHE_NAMESPACES = {
+    "sections": ("tia:section:*", "tia:section:*", "tia:index:sections"),
+    "reports": ("tia:report:*", "tia:report:*", "tia:index:reports"),
+    "jobs": ("tia:job:*", "tia:job:*", "tia:index:jobs"),
+}
+
+# Keys fetched per SCAN call and deleted per UNLINK call
+SCAN_BATCH_SIZE = 1000
+UNLINK_BATCH_SIZE = 500
+
+# "redis", or "disk" for single-node deployments without Redis (see storage.py)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis").lower()
+# Also keep sections and reports on local disk, behind Redis
+DISK_CACHE_L2 = os.getenv("DISK_CACHE_L2", "false").lower() == "true"
+
+# In-memory fallback (used while Redis is unreachable): byte budget, and how
+# often to retry Redis in the background (doubling, with jitter, up to the max)
+MEMORY_FALLBACK_MAX_BYTES = int(os.getenv("MEMORY_FALLBACK_MAX_BYTES", str(256 * 1024 * 1024)))
+REDIS_RECONNECT_INTERVAL = float(os.getenv("REDIS_RECONNECT_INTERVAL", "5"))
+REDIS_RECONNECT_MAX_INTERVAL = float(os.getenv("REDIS_RECONNECT_MAX_INTERVAL", "60"))
+
+# Job statuses that never change once set, so are safe to hold in L1
+TERMINAL_JOB_STATUSES = ("finished", "failed")
+
+# Job hash fields read together by get_job_state, and fields stored as JSON
+JOB_STATE_FIELDS = ("status", "result", "error")
+JSON_JOB_FIELDS = ("result", "input", "cost")
+
 class RedisCache:
     """Redis caching implementation with async support"""
     
     def __init__(self):
-        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        self.redis_url = normalize_redis_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
         self.redis = None
-        self.pubsub = None
+        # One pubsub connection shared by every subscriber in this process
+        self.shared_pubsub = None
+        self.rate_limit_script = None
+        self.release_lock_script = None
+        self.put_blobs_script = None
+        self.release_blobs_script = None
         self.default_ttl = 60 * 60 * 24 * 7  # 7 days default TTL
         self.section_ttl = 60 * 60 * 24 * 30  # 30 days for sections
         self.initialized = False
+        
+        # In-process L1 in front of Redis for values that don't change once written
+        self.local_cache = LocalCache() if L1_CACHE else None
+        self.instance_id = uuid.uuid4().hex
+        self._invalidation_task = None
+        
+        # Background PING of the connection pool
+        self._health_task = None
+        self.health = {"healthy": None, "last_ping_ms": None, "consecutive_failures": 0, "failures": 0}
+        
+        # Store used instead of Redis: an in-memory fallback if Redis is
+        # unreachable, or a DiskStore with the disk backend
+        self.backend = CACHE_BACKEND
+        self.disk_cache_path = DISK_CACHE_PATH
+        self.memory_cache = None
+        # On-disk L2 behind Redis (DISK_CACHE_L2)
+        self.disk_cache = None
+        self.memory_inflight = {}
+        self._reconnect_task = None
     
     async def initialize(self):
         """Initialize Redis connection"""
-        url = os.getenv("REDIS_URL")
-        print(f"DEBUG: RAW REDIS_URL = {url!r}")
-        logger.info(f"🔍 REDIS_URL = {url!r}")
-
-        # optional fallback if someone forgot the scheme
-        if url and not url.startswith(("redis://","rediss://","unix://")):
-            url = "redis://" + url
-            print(f"DEBUG: Prefixed REDIS_URL = {url!r}")
-
-        # now make the real connection
-        self._conn = redis.Redis.from_url(url, decode_responses=True)
-        await self._conn.ping()
-        print("DEBUG: Redis ping OK")
-
+        if self.backend == "disk":
+            if not self.initialized:
+                self._setup_disk_backend()
+            return
+        
         if self.initialized:
             return
             
+        if DISK_CACHE_L2 and not self.disk_cache:
+            self.disk_cache = DiskStore(path=self.disk_cache_path, ttl=self.section_ttl)
+        
         try:
-            logger.info(f"Connecting to Redis at {self.redis_url}")
-            self.redis = redis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-            self.pubsub = self.redis.pubsub()
-            
-            # Test connection
-            await self.redis.ping()
-            logger.info("Redis connection established")
+            await self._connect()
             self.initialized = True
         except Exception as e:
             logger.error(f"Redis connection failed: {str(e)}")
             # Fallback to in-memory cache if Redis is unavailable
             self._setup_memory_fallback()
     
+    async def _connect(self):
+        """Connect to Redis and register scripts; self.redis is only set once the ping succeeds"""
+        logger.info(f"Connecting to Redis at {self.redis_url}")
+        # One managed pool for commands and pubsub. Payloads are binary, so
+        # responses stay bytes and are decoded per value
+        client = build_client(self.redis_url)
+        try:
+            # Test connection
+            await client.ping()
+        except Exception:
+            await client.aclose()
+            raise
+        
+        self.shared_pubsub = SharedPubSub(client)
+        self.rate_limit_script = client.register_script(RATE_LIMIT_SCRIPT)
+        self.release_lock_script = client.register_script(RELEASE_LOCK_SCRIPT)
+        self.put_blobs_script = client.register_script(PUT_BLOBS_SCRIPT)
+        self.release_blobs_script = client.register_script(RELEASE_BLOBS_SCRIPT)
+        self.redis = client
+        self.health.update(healthy=True, consecutive_failures=0)
+        logger.info("Redis connection established")
+        
+        self._health_task = asyncio.create_task(self._monitor_health())
+        if self.local_cache:
+            self._invalidation_task = asyncio.create_task(self._listen_for_invalidations())
+    
     def _setup_memory_fallback(self):
-        """Set up in-memory cache fallback if Redis is unavailable"""
+        """Set up in-memory cache fallback if Redis is unavailable, and keep retrying Redis"""
         logger.warning("Using in-memory cache fallback (data will not persist)")
-        self.memory_cache = {
-            "sections": {},  # Cache for individual sections
-            "reports": {},   # Cache for complete reports
-            "jobs": {},      # Cache for job status and results
-            "hashes": {},    # Mapping of report hashes to results
-        }
+        # One LRU for every namespace (keys prefixed "sections:", "jobs:", ...),
+        # bounded by size; entries expire like their Redis counterparts
+        self.memory_cache = LocalCache(max_bytes=MEMORY_FALLBACK_MAX_BYTES, ttl=self.default_ttl)
+        self.initialized = True
+        if not self._reconnect_task:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+    
+    def _setup_disk_backend(self):
+        """Keep everything in the on-disk store (single node, no Redis)"""
+        logger.info(f"Using on-disk cache at {self.disk_cache_path}")
+        self.memory_cache = DiskStore(path=self.disk_cache_path, ttl=self.default_ttl)
         self.initialized = True
     
+    async def _reconnect(self):
+        """Retry Redis with jittered exponential backoff, then switch back to it"""
+        attempt = 0
+        try:
+            while not self.redis:
+                await asyncio.sleep(backoff_delay(attempt, REDIS_RECONNECT_INTERVAL, REDIS_RECONNECT_MAX_INTERVAL))
+                try:
+                    await self._connect()
+                except Exception as e:
+                    attempt += 1
+                    logger.warning(f"Redis still unavailable ({str(e)}), retry {attempt}")
+            
+            migrated = await self._migrate_memory_jobs()
+            logger.info(f"Reconnected to Redis, left in-memory fallback ({migrated} jobs moved to Redis)")
+            self.memory_cache = None
+        finally:
+            self._reconnect_task = None
+    
+    async def _monitor_health(self):
+        """
+        PING Redis periodically. On failure, drop idle pooled connections (they
+        are likely dead) and check again with jittered backoff until it answers,
+        so stale sockets are replaced before requests run into them.
+        """
+        while self.redis:
+            failures = self.health["consecutive_failures"]
+            await asyncio.sleep(
+                backoff_delay(failures - 1, REDIS_BACKOFF_BASE, REDIS_HEALTH_CHECK_PERIOD) if failures
+                else REDIS_HEALTH_CHECK_PERIOD
+            )
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.redis.ping(), REDIS_SOCKET_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.health["healthy"] = False
+                self.health["consecutive_failures"] += 1
+                self.health["failures"] += 1
+                logger.warning(f"Redis health check failed ({self.health['consecutive_failures']} in a row): {str(e)}")
+                try:
+                    await self.redis.connection_pool.disconnect(inuse_connections=False)
+                except Exception as e:
+                    logger.debug(f"Error resetting Redis connections: {str(e)}")
+                continue
+            
+            if failures:
+                logger.info(f"Redis healthy again after {failures} failed health checks")
+            self.health.update(
+                healthy=True,
+                consecutive_failures=0,
+                last_ping_ms=(time.perf_counter() - start) * 1000
+            )
+    
+    def get_redis_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool occupancy, wait times and health check state"""
+        if not self.redis:
+            return {"connected": False}
+        pool = self.redis.connection_pool
+        stats = pool.get_stats() if hasattr(pool, "get_stats") else {}
+        pubsub = self.shared_pubsub.get_stats() if self.shared_pubsub else {}
+        return {"connected": True, **stats, "pubsub": pubsub, "health": dict(self.health)}
+    
+    async def _migrate_memory_jobs(self) -> int:
+        """
+        Copy jobs tracked in memory to Redis so their clients can keep polling.
+        Fields already in Redis were written after the switch, so are kept.
+        """
+        migrated = 0
+        for key, job in self.memory_cache.items("jobs:"):
+            job_id = key[len("jobs:"):]
+            try:
+                existing = {_decode_text(field) for field in await self.redis.hkeys(f"tia:job:{job_id}")}
+                fields = {field: value for field, value in job.items() if value is not None and field not in existing}
+                if fields:
+                    await self._update_job(job_id, fields)
+                    migrated += 1
+            except Exception as e:
+                logger.error(f"Error moving job {job_id} to Redis: {str(e)}")
+        return migrated
+    
+    def _memory_get(self, namespace: str, key: str) -> Optional[Any]:
+        return self.memory_cache.get(f"{namespace}:{key}")
+    
+    def _memory_set(self, namespace: str, key: str, value: Any, time_to_live: int = None):
+        if not time_to_live:
+            time_to_live = self.section_ttl if namespace == "sections" else self.default_ttl
+        self.memory_cache.set(f"{namespace}:{key}", value, approximate_size(value), time_to_live)
+    
+    def _disk_set(self, key: str, value: Any, time_to_live: int):
+        """Write through to the on-disk L2, if enabled (a failure only costs a later miss)"""
+        if not self.disk_cache:
+            return
+        try:
+            self.disk_cache.set(key, value, ttl=time_to_live)
+        except Exception as e:
+            logger.error(f"Error writing to disk cache: {str(e)}")
+    
+    def _disk_get(self, key: str) -> Optional[Any]:
+        if not self.disk_cache:
+            return None
+        try:
+            return self.disk_cache.get(key)
+        except Exception as e:
+            logger.error(f"Error reading disk cache: {str(e)}")
+            return None
+    
+    def get_disk_cache_stats(self) -> Dict[str, Any]:
+        """Get on-disk L2 usage and hit counts"""
+        if not self.disk_cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.disk_cache.get_stats()}
+    
+    def get_memory_fallback_stats(self) -> Dict[str, Any]:
+        """Get in-memory fallback (or disk backend) usage, per namespace, and eviction counts"""
+        if not self.memory_cache:
+            return {"active": False}
+        return {
+            "active": True,
+            "backend": "disk" if isinstance(self.memory_cache, DiskStore) else "memory",
+            **self.memory_cache.get_stats(),
+            "namespaces": {
+                namespace: self.memory_cache.count(f"{namespace}:")
+                for namespace in ("sections", "reports", "hashes", "jobs", "lsh")
+            },
+            "inflight_locks": len(self.memory_inflight)
+        }
+    
     async def close(self):
         """Close Redis connection"""
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        for store in (self.memory_cache, self.disk_cache):
+            if isinstance(store, DiskStore):
+                store.close()
+        if self._invalidation_task:
+            self._invalidation_task.cancel()
+            self._invalidation_task = None
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        if self.shared_pubsub:
+            await self.shared_pubsub.close()
+            self.shared_pubsub = None
         if self.redis:
-            await self.redis.close()
+            # Also disconnects the pool, which the client owns
+            await self.redis.aclose()
             logger.info("Redis connection closed")
     
     async def _ensure_initialized(self):
@@ -90,6 +510,238 @@ class RedisCache:
         if not self.initialized:
             await self.initialize()
     
+    # L1 cache
+    
+    def _local_get(self, key: str) -> Optional[Any]:
+        if not self.local_cache:
+            return None
+        return self.local_cache.get(key)
+    
+    def _local_set(self, key: str, value: Any, size: int):
+        if self.local_cache:
+            self.local_cache.set(key, value, size)
+    
+    async def _invalidate(self, keys: List[str] = None, prefixes: List[str] = None):
+        """Drop keys from the L1 cache here and in every other worker"""
+        if not self.local_cache:
+            return
+        
+        for key in keys or []:
+            self.local_cache.delete(key)
+        for prefix in prefixes or []:
+            self.local_cache.clear(prefix)
+        
+        message = json.dumps({"origin": self.instance_id, "keys": keys or [], "prefixes": prefixes or []})
+        try:
+            await self.redis.publish(CACHE_INVALIDATION_CHANNEL, message)
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {str(e)}")
+    
+    async def _listen_for_invalidations(self):
+        """Apply invalidations published by other workers until cancelled"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                # Anything published while we weren't listening may be stale now
+                self.local_cache.clear()
+                while True:
+                    # Poll with an explicit timeout: a quiet channel is normal, whereas
+                    # listen() would hit the pool's socket timeout and raise
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True,
+                        timeout=INVALIDATION_POLL_TIMEOUT
+                    )
+                    if message is None or message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data.get("origin") == self.instance_id:
+                        continue
+                    for key in data.get("keys", []):
+                        self.local_cache.delete(key)
+                    for prefix in data.get("prefixes", []):
+                        self.local_cache.clear(prefix)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed, resubscribing: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    def get_local_cache_stats(self) -> Dict[str, Any]:
+        """Get L1 cache hit/miss counts"""
+        if not self.local_cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.local_cache.get_stats()}
+    
+    # Namespace indexes (for stats without KEYS)
+    
+    def _index(self, pipe, namespace: str, key: str, time_to_live: int):
+        """Queue adding key to its namespace index on a pipeline, pruning expired entries"""
+        index_key = CACHE_NAMESPACES[namespace][2]
+        now = time.time()
+        pipe.zadd(index_key, {key: now + time_to_live})
+        pipe.zremrangebyscore(index_key, "-inf", now)
+    
+    async def rebuild_cache_indexes(self) -> Dict[str, int]:
+        """
+        Rebuild the namespace indexes from the keyspace with SCAN, e.g. for keys
+        written before the indexes existed. Returns keys indexed per namespace.
+        """
+        await self._ensure_initialized()
+        
+        if not self.redis:
+            return {}
+        
+        counts = {}
+        for namespace, (_, pattern, index_key) in CACHE_NAMESPACES.items():
+            counts[namespace] = 0
+            batch = []
+            async for key in self.redis.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    counts[namespace] += await self._index_existing(index_key, batch)
+                    batch = []
+            if batch:
+                counts[namespace] += await self._index_existing(index_key, batch)
+        
+        logger.info(f"Rebuilt cache indexes: {counts}")
+        return counts
+    
+    async def _index_existing(self, index_key: str, keys: List[str]) -> int:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(key)
+            ttls = await pipe.execute()
+        
+        now = time.time()
+        # Keys without an expiry (-1) are indexed as never expiring; vanished ones (-2) skipped
+        members = {
+            key: now + ttl if ttl >= 0 else float("inf")
+            for key, ttl in zip(keys, ttls) if ttl != -2
+        }
+        if members:
+            await self.redis.zadd(index_key, members)
+        return len(members)
+    
+    async def _unlink_matching(self, pattern: str, holds_manifests: bool = False, hash_field: Optional[str] = None) -> int:
+        """
+        Delete keys matching pattern in batches, without blocking Redis. If the
+        keys hold blob manifests (in hash_field for hashes), their blob
+        references are released first.
+        """
+        deleted = 0
+        batch = []
+        
+        async def unlink(keys: List[bytes]) -> int:
+            if holds_manifests:
+                await self._release_blobs(await self._collect_manifests(keys, hash_field))
+            return await self.redis.unlink(*keys)
+        
+        async for key in self.redis.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= UNLINK_BATCH_SIZE:
+                deleted += await unlink(batch)
+                batch = []
+        if batch:
+            deleted += await unlink(batch)
+        return deleted
+    
+    # Content-addressed blobs
+    
+    async def _put_blobs(self, texts: Dict[str, str], time_to_live: int, holders: int = 1) -> BlobManifest:
+        """Store texts as blobs, counting holders new references to each, and return their manifest"""
+        manifest = BlobManifest((name, blob_digest(text)) for name, text in texts.items())
+        blobs = {f"tia:blob:{digest}": texts[name] for name, digest in manifest.items()}
+        if blobs:
+            await self.put_blobs_script(
+                keys=[BLOB_REFS_KEY, *blobs],
+                args=[time_to_live, holders, *(encode_payload(text) for text in blobs.values())]
+            )
+        return manifest
+    
+    async def _release_blobs(self, manifests: List[BlobManifest]) -> int:
+        """Drop one reference per manifest to each of its blobs; returns blobs deleted"""
+        keys = []
+        for manifest in manifests:
+            keys.extend({f"tia:blob:{digest}" for digest in manifest.values()})
+        
+        deleted = 0
+        for start in range(0, len(keys), UNLINK_BATCH_SIZE):
+            deleted += await self.release_blobs_script(keys=[BLOB_REFS_KEY, *keys[start:start + UNLINK_BATCH_SIZE]])
+        return deleted
+    
+    async def _encode_report(self, result: Any, time_to_live: int, holders: int = 1) -> bytes:
+        """Encode a report (section -> text) as a blob manifest; other values as JSON"""
+        if isinstance(result, dict) and result and all(isinstance(value, str) for value in result.values()):
+            return encode_payload(await self._put_blobs(result, time_to_live, holders))
+        return encode_payload(result)
+    
+    async def _resolve(self, value: Any) -> Any:
+        """Replace a manifest with the text of its blobs (one MGET); other values pass through"""
+        if not isinstance(value, BlobManifest):
+            return value
+        
+        digests = list(value.values())
+        if not digests:
+            return {}
+        blobs = await self.redis.mget([f"tia:blob:{digest}" for digest in digests])
+        if any(blob is None for blob in blobs):
+            logger.warning("Cache entry references missing blobs, treating it as a miss")
+            return None
+        
+        texts = {digest: decode_payload(blob) for digest, blob in zip(digests, blobs)}
+        return {name: texts[digest] for name, digest in value.items()}
+    
+    async def _collect_manifests(self, keys: List[bytes], hash_field: Optional[str] = None) -> List[BlobManifest]:
+        """Read the manifests held by keys (string values, or a field of hashes)"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                if hash_field:
+                    pipe.hget(key, hash_field)
+                else:
+                    pipe.get(key)
+            # Keys of another type (e.g. entries in an older layout) just hold no manifest
+            values = await pipe.execute(raise_on_error=False)
+        return self._manifests_in(values)
+    
+    @staticmethod
+    def _manifests_in(values: List[Any]) -> List[BlobManifest]:
+        """The blob manifests among stored values (anything else is skipped)"""
+        manifests = []
+        for value in values:
+            if isinstance(value, bytes):
+                try:
+                    value = decode_payload(value)
+                except Exception:
+                    continue
+                if isinstance(value, BlobManifest):
+                    manifests.append(value)
+        return manifests
+    
+    async def collect_blob_garbage(self) -> Dict[str, int]:
+        """
+        Remove reference counts for blobs that no longer exist (e.g. expired
+        with their holders), using HSCAN so Redis isn't blocked.
+        """
+        await self._ensure_initialized()
+        
+        if not self.redis:
+            return {}
+        
+        checked = removed = 0
+        async for key, _ in self.redis.hscan_iter(BLOB_REFS_KEY, count=SCAN_BATCH_SIZE):
+            checked += 1
+            if not await self.redis.exists(key):
+                removed += await self.redis.hdel(BLOB_REFS_KEY, key)
+        
+        logger.info(f"Blob GC checked {checked} reference counts, removed {removed}")
+        return {"checked": checked, "removed": removed}
+    
     # Section caching
     
     async def get_section(self, section: str, cache_key: str) -> Optional[str]:
@@ -99,10 +751,20 @@ class RedisCache:
         try:
             if self.redis:
                 section_key = f"tia:section:{section}:{cache_key}"
-                return await self.redis.get(section_key)
+                content = self._local_get(section_key)
+                if content is None:
+                    content = decode_payload(await self.redis.get(section_key))
+                    if isinstance(content, BlobManifest):
+                        content = ((await self._resolve(content)) or {}).get(section)
+                    if not content:
+                        # Long-tail sections may outlive Redis memory
+                        content = self._disk_get(section_key)
+                    if content:
+                        self._local_set(section_key, content, len(content))
+                return content
             else:
                 # Memory fallback
-                return self.memory_cache["sections"].get(f"{section}:{cache_key}")
+                return self._memory_get("sections", f"{section}:{cache_key}")
         except Exception as e:
             logger.error(f"Error retrieving cached section: {str(e)}")
             return None
@@ -117,152 +779,377 @@ class RedisCache:
         try:
             if self.redis:
                 section_key = f"tia:section:{section}:{cache_key}"
-                return await self.redis.setex(section_key, time_to_live, content)
+                manifest = await self._put_blobs({section: content}, time_to_live)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    # Swap in the new manifest and get the one it replaces (a
+                    # regenerated section can differ), whose references go
+                    pipe.set(section_key, encode_payload(manifest), ex=time_to_live, get=True)
+                    self._index(pipe, "sections", section_key, time_to_live)
+                    replaced = (await pipe.execute())[0]
+                if replaced is not None:
+                    await self._release_blobs(self._manifests_in([replaced]))
+                    await self._invalidate(keys=[section_key])
+                self._local_set(section_key, content, len(content))
+                self._disk_set(section_key, content, time_to_live)
+                return True
             else:
                 # Memory fallback
-                self.memory_cache["sections"][f"{section}:{cache_key}"] = content
+                self._memory_set("sections", f"{section}:{cache_key}", content, time_to_live)
                 return True
         except Exception as e:
             logger.error(f"Error caching section: {str(e)}")
             return False
     
-    # Job status and results
+    # Job state
+    #
+    # Each job is one hash (tia:job:{id}) with a single TTL. Fields: status,
+    # result, error, input and cost; result/input/cost hold JSON. Sections of a
+    # job still in progress are kept alongside, in tia:jobsections:{id} (a prefix
+    # of its own, so they never match the tia:job:* pattern of job hashes).
     
-    async def set_job_status(self, job_id: str, status: str) -> bool:
-        """Set job status"""
+    async def _update_job(
+        self,
+        job_id: str,
+        fields: Dict[str, Any],
+        time_to_live: int = None,
+        report: Optional[Tuple[str, Dict[str, Any]]] = None
+    ) -> bool:
+        """
+        Write job fields, and optionally a (report_hash, result) entry, in one
+        MULTI/EXEC so readers never see part of a transition.
+        """
+        if not time_to_live:
+            time_to_live = self.default_ttl
+        
+        if not self.redis:
+            # Memory fallback
+            # (re-stored rather than updated in place, so its size is recounted)
+            job = dict(self._memory_get("jobs", job_id) or {})
+            job.update(fields)
+            self._memory_set("jobs", job_id, job, time_to_live)
+            if fields.get("status") in TERMINAL_JOB_STATUSES:
+                self.memory_cache.delete(f"job_sections:{job_id}")
+            if report:
+                self._memory_set("hashes", report[0], report[1], time_to_live)
+            return True
+        
+        job_key = f"tia:job:{job_id}"
+        # The result's blobs are written first so no manifest points at missing text;
+        # when a report entry shares the manifest, its reference is counted too
+        shares_result = bool(report) and "result" in fields
+        mapping = {}
+        for field, value in fields.items():
+            if field == "result":
+                blob_ttl = max(time_to_live, self.default_ttl) if shares_result else time_to_live
+                mapping[field] = await self._encode_report(value, blob_ttl, 2 if shares_result else 1)
+            elif field in JSON_JOB_FIELDS:
+                mapping[field] = encode_payload(value)
+            else:
+                mapping[field] = value
+        report_data = None
+        if report:
+            report_data = mapping["result"] if shares_result else await self._encode_report(report[1], self.default_ttl)
+        invalidated = []
+        
+        # Positions in the transaction of the values being replaced, whose
+        # blob references are released once it has run
+        replaced_at = []
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if "result" in mapping:
+                replaced_at.append(len(pipe))
+                pipe.hget(job_key, "result")
+            pipe.hset(job_key, mapping=mapping)
+            pipe.expire(job_key, time_to_live)
+            self._index(pipe, "jobs", job_key, time_to_live)
+            if fields.get("status") in TERMINAL_JOB_STATUSES:
+                # The result (or error) supersedes the sections kept for late subscribers
+                pipe.unlink(f"tia:jobsections:{job_id}")
+            if report:
+                report_key = f"tia:report:{report[0]}"
+                replaced_at.append(len(pipe))
+                pipe.set(report_key, report_data, ex=self.default_ttl, get=True)
+                self._index(pipe, "reports", report_key, self.default_ttl)
+                invalidated.append(report_key)
+            results = await pipe.execute()
+        await self._release_blobs(self._manifests_in([results[index] for index in replaced_at]))
+        
+        # Only final job state is held in L1, so only changes to it need announcing
+        if fields.get("status") in TERMINAL_JOB_STATUSES or "result" in fields or "error" in fields:
+            invalidated.append(job_key)
+        if invalidated:
+            await self._invalidate(keys=invalidated)
+        if report:
+            self._disk_set(f"tia:report:{report[0]}", report[1], self.default_ttl)
+        return True
+    
+    async def start_job(self, job_id: str, input_data: Dict[str, Any], status: str = "processing") -> bool:
+        """Record a job's input and mark it started"""
         await self._ensure_initialized()
         
         try:
-            if self.redis:
-                return await self.redis.setex(f"tia:job:{job_id}:status", self.default_ttl, status)
-            else:
-                # Memory fallback
-                if job_id not in self.memory_cache["jobs"]:
-                    self.memory_cache["jobs"][job_id] = {}
-                self.memory_cache["jobs"][job_id]["status"] = status
-                return True
+            return await self._update_job(job_id, {"status": status, "input": input_data})
         except Exception as e:
-            logger.error(f"Error setting job status: {str(e)}")
+            logger.error(f"Error starting job: {str(e)}")
             return False
     
-    async def get_job_status(self, job_id: str) -> Optional[str]:
-        """Get job status"""
+    async def finish_job(
+        self,
+        job_id: str,
+        result: Dict[str, Any],
+        report_hash: Optional[str] = None,
+        time_to_live: int = None
+    ) -> bool:
+        """Store a job's result and mark it finished, caching it under report_hash if given"""
+        await self._ensure_initialized()
+        
+        try:
+            report = (report_hash, result) if report_hash else None
+            return await self._update_job(job_id, {"status": "finished", "result": result}, time_to_live, report)
+        except Exception as e:
+            logger.error(f"Error finishing job: {str(e)}")
+            return False
+    
+    async def fail_job(self, job_id: str, error: str) -> bool:
+        """Store a job's error and mark it failed"""
+        await self._ensure_initialized()
+        
+        try:
+            return await self._update_job(job_id, {"status": "failed", "error": error})
+        except Exception as e:
+            logger.error(f"Error failing job: {str(e)}")
+            return False
+    
+    async def get_job_state(self, job_id: str) -> Dict[str, Any]:
+        """Get a job's status, result and error in one read (all None if the job is unknown)"""
         await self._ensure_initialized()
         
         try:
             if self.redis:
-                return await self.redis.get(f"tia:job:{job_id}:status")
+                job_key = f"tia:job:{job_id}"
+                state = self._local_get(job_key)
+                if state is None:
+                    values = await self.redis.hmget(job_key, JOB_STATE_FIELDS)
+                    status, result, error = values
+                    state = {
+                        "status": _decode_text(status),
+                        "result": await self._resolve(decode_payload(result, legacy_json=True)),
+                        "error": _decode_text(error)
+                    }
+                    # Only final state is cached; in-progress jobs must be re-read
+                    if state["status"] in TERMINAL_JOB_STATUSES:
+                        self._local_set(job_key, state, approximate_size(state))
+                
+                # Copy so callers can't modify the cached value
+                state = dict(state)
+                if state["result"]:
+                    state["result"] = dict(state["result"])
+                return state
             else:
                 # Memory fallback
-                return self.memory_cache["jobs"].get(job_id, {}).get("status")
+                job = self._memory_get("jobs", job_id) or {}
+                return {field: job.get(field) for field in JOB_STATE_FIELDS}
         except Exception as e:
-            logger.error(f"Error getting job status: {str(e)}")
-            return None
+            logger.error(f"Error getting job state: {str(e)}")
+            return dict.fromkeys(JOB_STATE_FIELDS)
     
-    async def set_job_result(self, job_id: str, result: Dict[str, Any], time_to_live: int = None) -> bool:
-        """Cache job result"""
+    async def _get_job_field(self, job_id: str, field: str) -> Optional[Any]:
+        """Get one job field not covered by get_job_state"""
         await self._ensure_initialized()
         
-        if not time_to_live:
-            time_to_live = self.default_ttl
-            
         try:
-            result_json = json.dumps(result)
             if self.redis:
-                return await self.redis.setex(f"tia:job:{job_id}:result", time_to_live, result_json)
+                value = await self.redis.hget(f"tia:job:{job_id}", field)
+                if field in JSON_JOB_FIELDS:
+                    return decode_payload(value, legacy_json=True)
+                return _decode_text(value)
             else:
                 # Memory fallback
-                if job_id not in self.memory_cache["jobs"]:
-                    self.memory_cache["jobs"][job_id] = {}
-                self.memory_cache["jobs"][job_id]["result"] = result
-                return True
+                return (self._memory_get("jobs", job_id) or {}).get(field)
         except Exception as e:
-            logger.error(f"Error caching job result: {str(e)}")
+            logger.error(f"Error retrieving job {field}: {str(e)}")
+            return None
+    
+    async def _set_job_field(self, job_id: str, field: str, value: Any, time_to_live: int = None) -> bool:
+        """Set one job field"""
+        await self._ensure_initialized()
+        
+        try:
+            return await self._update_job(job_id, {field: value}, time_to_live)
+        except Exception as e:
+            logger.error(f"Error setting job {field}: {str(e)}")
             return False
     
-    async def get_job_result(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """Get cached job result"""
+    async def delete_job(self, job_id: str) -> bool:
+        """Delete a job, e.g. one queued and then superseded before it ran"""
         await self._ensure_initialized()
         
         try:
             if self.redis:
-                result_json = await self.redis.get(f"tia:job:{job_id}:result")
-                if result_json:
-                    return json.loads(result_json)
-                return None
+                job_key = f"tia:job:{job_id}"
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.hget(job_key, "result")
+                    pipe.unlink(job_key, f"tia:jobsections:{job_id}")
+                    pipe.zrem(CACHE_NAMESPACES["jobs"][2], job_key)
+                    result = (await pipe.execute())[0]
+                await self._release_blobs(self._manifests_in([result]))
+                await self._invalidate(keys=[job_key])
             else:
                 # Memory fallback
-                return self.memory_cache["jobs"].get(job_id, {}).get("result")
+                self.memory_cache.delete(f"jobs:{job_id}")
+                self.memory_cache.delete(f"job_sections:{job_id}")
+            return True
         except Exception as e:
-            logger.error(f"Error retrieving job result: {str(e)}")
-            return None
+            logger.error(f"Error deleting job: {str(e)}")
+            return False
     
-    async def set_job_error(self, job_id: str, error: str) -> bool:
-        """Cache job error"""
+    async def add_job_section(self, job_id: str, section: str, content: str) -> bool:
+        """
+        Record a section of an in-progress job (tia:jobsections:{id}), so clients
+        that subscribe to its updates late can catch up. Dropped once the job ends.
+        """
         await self._ensure_initialized()
         
         try:
             if self.redis:
-                return await self.redis.setex(f"tia:job:{job_id}:error", self.default_ttl, error)
+                sections_key = f"tia:jobsections:{job_id}"
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.hset(sections_key, section, content)
+                    pipe.expire(sections_key, self.default_ttl)
+                    await pipe.execute()
             else:
                 # Memory fallback
-                if job_id not in self.memory_cache["jobs"]:
-                    self.memory_cache["jobs"][job_id] = {}
-                self.memory_cache["jobs"][job_id]["error"] = error
-                return True
+                sections = dict(self._memory_get("job_sections", job_id) or {})
+                sections[section] = content
+                self._memory_set("job_sections", job_id, sections)
+            return True
         except Exception as e:
-            logger.error(f"Error caching job error: {str(e)}")
+            logger.error(f"Error recording job section: {str(e)}")
             return False
     
-    async def get_job_error(self, job_id: str) -> Optional[str]:
-        """Get cached job error"""
+    async def get_job_sections(self, job_id: str) -> Dict[str, str]:
+        """Get the sections an in-progress job has completed so far"""
         await self._ensure_initialized()
         
         try:
             if self.redis:
-                return await self.redis.get(f"tia:job:{job_id}:error")
+                sections = await self.redis.hgetall(f"tia:jobsections:{job_id}")
+                return {_decode_text(section): _decode_text(content) for section, content in sections.items()}
             else:
                 # Memory fallback
-                return self.memory_cache["jobs"].get(job_id, {}).get("error")
+                return dict(self._memory_get("job_sections", job_id) or {})
         except Exception as e:
-            logger.error(f"Error retrieving job error: {str(e)}")
-            return None
+            logger.error(f"Error retrieving job sections: {str(e)}")
+            return {}
+    
+    async def set_job_status(self, job_id: str, status: str) -> bool:
+        """Set job status"""
+        return await self._set_job_field(job_id, "status", status)
+    
+    async def get_job_status(self, job_id: str) -> Optional[str]:
+        """Get job status"""
+        return (await self.get_job_state(job_id))["status"]
+    
+    async def set_job_result(self, job_id: str, result: Dict[str, Any], time_to_live: int = None) -> bool:
+        """Cache job result"""
+        return await self._set_job_field(job_id, "result", result, time_to_live)
+    
+    async def get_job_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached job result"""
+        return (await self.get_job_state(job_id))["result"]
+    
+    async def set_job_error(self, job_id: str, error: str) -> bool:
+        """Cache job error"""
+        return await self._set_job_field(job_id, "error", error)
+    
+    async def get_job_error(self, job_id: str) -> Optional[str]:
+        """Get cached job error"""
+        return (await self.get_job_state(job_id))["error"]
     
     async def set_job_input(self, job_id: str, input_data: Dict[str, Any]) -> bool:
         """Cache job input data"""
+        return await self._set_job_field(job_id, "input", input_data)
+    
+    async def get_job_input(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached job input data"""
+        return await self._get_job_field(job_id, "input")
+    
+    async def set_job_cost(self, job_id: str, cost: Dict[str, Any]) -> bool:
+        """Cache job token usage and cost breakdown"""
+        return await self._set_job_field(job_id, "cost", cost)
+    
+    async def get_job_cost(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached job cost breakdown"""
+        return await self._get_job_field(job_id, "cost")
+    
+    # Bulk (Batch API) submissions
+    
+    async def set_batch(self, batch_id: str, batch: Dict[str, Any]) -> bool:
+        """
+        Cache a bulk batch record (job ids and pre-cached sections). Batches not
+        yet ingested are listed in tia:batches:pending, so polling can resume
+        after a restart.
+        """
         await self._ensure_initialized()
         
         try:
-            input_json = json.dumps(input_data)
             if self.redis:
-                return await self.redis.setex(f"tia:job:{job_id}:input", self.default_ttl, input_json)
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.setex(f"tia:batch:{batch_id}", self.default_ttl, encode_payload(batch))
+                    if batch.get("ingested"):
+                        pipe.srem(PENDING_BATCHES_KEY, batch_id)
+                    else:
+                        pipe.sadd(PENDING_BATCHES_KEY, batch_id)
+                    await pipe.execute()
+                return True
             else:
                 # Memory fallback
-                if job_id not in self.memory_cache["jobs"]:
-                    self.memory_cache["jobs"][job_id] = {}
-                self.memory_cache["jobs"][job_id]["input"] = input_data
+                self._memory_set("reports", f"batch:{batch_id}", batch)
                 return True
         except Exception as e:
-            logger.error(f"Error caching job input: {str(e)}")
+            logger.error(f"Error caching batch: {str(e)}")
             return False
     
-    async def get_job_input(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """Get cached job input data"""
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get a bulk batch record"""
         await self._ensure_initialized()
         
         try:
             if self.redis:
-                input_json = await self.redis.get(f"tia:job:{job_id}:input")
-                if input_json:
-                    return json.loads(input_json)
-                return None
+                return decode_payload(await self.redis.get(f"tia:batch:{batch_id}"), legacy_json=True)
             else:
                 # Memory fallback
-                return self.memory_cache["jobs"].get(job_id, {}).get("input")
+                return self._memory_get("reports", f"batch:{batch_id}")
         except Exception as e:
-            logger.error(f"Error retrieving job input: {str(e)}")
+            logger.error(f"Error retrieving batch: {str(e)}")
             return None
     
+    async def get_pending_batches(self) -> List[str]:
+        """Ids of batches submitted but not yet ingested"""
+        await self._ensure_initialized()
+        
+        try:
+            if self.redis:
+                batch_ids = sorted(_decode_text(batch_id) for batch_id in await self.redis.smembers(PENDING_BATCHES_KEY))
+                # Drop batches whose record expired; nothing is left to ingest them into
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for batch_id in batch_ids:
+                        pipe.exists(f"tia:batch:{batch_id}")
+                    exists = await pipe.execute()
+                expired = [batch_id for batch_id, found in zip(batch_ids, exists) if not found]
+                if expired:
+                    await self.redis.srem(PENDING_BATCHES_KEY, *expired)
+                return [batch_id for batch_id, found in zip(batch_ids, exists) if found]
+            else:
+                # Memory fallback
+                return [
+                    key[len("reports:batch:"):]
+                    for key, batch in self.memory_cache.items("reports:batch:")
+                    if not batch.get("ingested")
+                ]
+        except Exception as e:
+            logger.error(f"Error listing pending batches: {str(e)}")
+            return []
+    
     # Report hashing for similar report detection
     
     async def set_report_hash(self, report_hash: str, result: Dict[str, Any]) -> bool:
@@ -270,12 +1157,21 @@ class RedisCache:
         await self._ensure_initialized()
         
         try:
-            result_json = json.dumps(result)
             if self.redis:
-                return await self.redis.setex(f"tia:report:{report_hash}", self.default_ttl, result_json)
+                report_key = f"tia:report:{report_hash}"
+                report_data = await self._encode_report(result, self.default_ttl)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(report_key, report_data, ex=self.default_ttl, get=True)
+                    self._index(pipe, "reports", report_key, self.default_ttl)
+                    replaced = (await pipe.execute())[0]
+                # The replaced entry's blob references go with it
+                await self._release_blobs(self._manifests_in([replaced]))
+                await self._invalidate(keys=[report_key])
+                self._disk_set(report_key, result, self.default_ttl)
+                return True
             else:
                 # Memory fallback
-                self.memory_cache["hashes"][report_hash] = result
+                self._memory_set("hashes", report_hash, result)
                 return True
         except Exception as e:
             logger.error(f"Error caching report hash: {str(e)}")
@@ -287,44 +1183,47 @@ class RedisCache:
         
         try:
             if self.redis:
-                result_json = await self.redis.get(f"tia:report:{report_hash}")
-                if result_json:
-                    return json.loads(result_json)
-                return None
+                return await self._get_json_cached(f"tia:report:{report_hash}")
             else:
                 # Memory fallback
-                return self.memory_cache["hashes"].get(report_hash)
+                return self._memory_get("hashes", report_hash)
         except Exception as e:
             logger.error(f"Error retrieving report by hash: {str(e)}")
             return None
     
+    async def _get_json_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        """Read a JSON object through the L1 cache, which holds it already parsed"""
+        value = self._local_get(key)
+        if value is None:
+            value = await self._resolve(decode_payload(await self.redis.get(key), legacy_json=True))
+            if not value:
+                value = self._disk_get(key)
+            if not value:
+                return None
+            self._local_set(key, value, approximate_size(value))
+        # Shallow copy so callers can't modify the cached value
+        return dict(value)
+    
     async def get_similar_report(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Check if a similar report exists in cache.
-        Uses exact hash matching and fuzzy matching based on key fields.
+        Uses exact hash matching and fuzzy matching based on key fields
+        of the canonical request.
         """
         await self._ensure_initialized()
         
         try:
             # Try exact hash match first
-            exact_hash = hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
-            exact_match = await self.get_report_by_hash(exact_hash)
+            exact_match = await self.get_report_by_hash(report_hash(data))
             if exact_match:
                 logger.info("Found exact cache match for report")
                 return exact_match
             
             # Try fuzzy hash match (only project details and key fields)
-            fuzzy_data = {
-                "project_title": data.get("project_details", {}).get("project_title", ""),
-                "site_address": data.get("project_details", {}).get("site_address", ""),
-                "development_type": data.get("project_details", {}).get("development_type", ""),
-                "council": data.get("project_details", {}).get("council", "")
-            }
-            
-            if not any(fuzzy_data.values()):  # If no key fields, don't try fuzzy match
+            fuzzy_hash = fuzzy_report_hash(data)
+            if not fuzzy_hash:  # If no key fields, don't try fuzzy match
                 return None
                 
-            fuzzy_hash = hashlib.md5(json.dumps(fuzzy_data, sort_keys=True).encode()).hexdigest()
             fuzzy_match = await self.get_report_by_hash(fuzzy_hash)
             if fuzzy_match:
                 logger.info("Found fuzzy cache match for report")
@@ -335,6 +1234,90 @@ class RedisCache:
             logger.error(f"Error checking for similar report: {str(e)}")
             return None
     
+    # Near-duplicate (LSH) index
+    
+    async def add_similarity_entry(
+        self,
+        scope: str,
+        bands: List[str],
+        entry_id: str,
+        signature: bytes,
+        time_to_live: int = None
+    ) -> bool:
+        """Store an entry's signature and add it to one LSH bucket per band"""
+        await self._ensure_initialized()
+        
+        if not time_to_live:
+            time_to_live = self.section_ttl
+        
+        try:
+            if self.redis:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.setex(f"tia:lsh:sig:{entry_id}", time_to_live, signature)
+                    for band in bands:
+                        bucket_key = f"tia:lsh:{scope}:{band}"
+                        pipe.sadd(bucket_key, entry_id)
+                        pipe.expire(bucket_key, time_to_live)
+                    await pipe.execute()
+                return True
+            else:
+                # Memory fallback
+                self._memory_set("lsh", f"sig:{entry_id}", signature, time_to_live)
+                for band in bands:
+                    bucket_key = f"{scope}:{band}"
+                    members = list(self._memory_get("lsh", bucket_key) or ())
+                    if entry_id not in members:
+                        members.append(entry_id)
+                    self._memory_set("lsh", bucket_key, members, time_to_live)
+                return True
+        except Exception as e:
+            logger.error(f"Error adding similarity entry: {str(e)}")
+            return False
+    
+    async def find_similarity_candidates(self, scope: str, bands: List[str], limit: int = 50) -> Dict[str, bytes]:
+        """
+        Get signatures of entries sharing at least one LSH bucket, most shared
+        buckets first, up to limit entries.
+        """
+        await self._ensure_initialized()
+        
+        try:
+            if self.redis:
+                bucket_keys = [f"tia:lsh:{scope}:{band}" for band in bands]
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for bucket_key in bucket_keys:
+                        pipe.smembers(bucket_key)
+                    buckets = await pipe.execute()
+            else:
+                # Memory fallback
+                buckets = [self._memory_get("lsh", f"{scope}:{band}") or () for band in bands]
+            
+            shared = {}
+            for members in buckets:
+                for member in members:
+                    entry_id = _decode_text(member)
+                    shared[entry_id] = shared.get(entry_id, 0) + 1
+            candidates = sorted(shared, key=shared.get, reverse=True)[:limit]
+            if not candidates:
+                return {}
+            
+            if not self.redis:
+                signatures = {entry_id: self._memory_get("lsh", f"sig:{entry_id}") for entry_id in candidates}
+                return {entry_id: value for entry_id, value in signatures.items() if value is not None}
+            
+            values = await self.redis.mget([f"tia:lsh:sig:{entry_id}" for entry_id in candidates])
+            expired = [entry_id for entry_id, value in zip(candidates, values) if value is None]
+            if expired:
+                # Buckets outlive the entries in them; drop ones whose signature expired
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for bucket_key in bucket_keys:
+                        pipe.srem(bucket_key, *expired)
+                    await pipe.execute()
+            return {entry_id: value for entry_id, value in zip(candidates, values) if value is not None}
+        except Exception as e:
+            logger.error(f"Error finding similarity candidates: {str(e)}")
+            return {}
+    
     # Redis PubSub for streaming updates
     
     async def publish(self, channel: str, message: str) -> int:
@@ -352,6 +1335,121 @@ class RedisCache:
             logger.error(f"Error publishing to Redis: {str(e)}")
             return 0
     
+    # In-flight generation locks (single-flight across workers)
+    
+    async def acquire_inflight(self, kind: str, key: str, owner: str, time_to_live: int = 600) -> Optional[str]:
+        """
+        Claim the in-flight lock for a generation.
+        Returns None if owner now holds it, otherwise the current holder.
+        """
+        await self._ensure_initialized()
+        
+        try:
+            if self.redis:
+                lock_key = f"tia:inflight:{kind}:{key}"
+                if await self.redis.set(lock_key, owner, nx=True, ex=time_to_live):
+                    return None
+                holder = _decode_text(await self.redis.get(lock_key))
+                # Holder may have finished in between; treat as free
+                return holder if holder and holder != owner else None
+            else:
+                # Memory fallback
+                holder = self.memory_inflight.setdefault(f"{kind}:{key}", owner)
+                return holder if holder != owner else None
+        except Exception as e:
+            logger.error(f"Error acquiring in-flight lock: {str(e)}")
+            return None
+    
+    async def get_inflight(self, kind: str, key: str) -> Optional[str]:
+        """Get the holder of an in-flight lock, if any"""
+        await self._ensure_initialized()
+        
+        try:
+            if self.redis:
+                return _decode_text(await self.redis.get(f"tia:inflight:{kind}:{key}"))
+            else:
+                # Memory fallback
+                return self.memory_inflight.get(f"{kind}:{key}")
+        except Exception as e:
+            logger.error(f"Error reading in-flight lock: {str(e)}")
+            return None
+    
+    async def release_inflight(self, kind: str, key: str, owner: str) -> bool:
+        """Release an in-flight lock held by owner and notify anyone waiting on it"""
+        await self._ensure_initialized()
+        
+        try:
+            if self.redis:
+                released = await self.release_lock_script(keys=[f"tia:inflight:{kind}:{key}"], args=[owner])
+                if released:
+                    await self.redis.publish(f"tia_inflight:{kind}:{key}", "released")
+                return bool(released)
+            else:
+                # Memory fallback
+                if self.memory_inflight.get(f"{kind}:{key}") == owner:
+                    del self.memory_inflight[f"{kind}:{key}"]
+                    return True
+                return False
+        except Exception as e:
+            logger.error(f"Error releasing in-flight lock: {str(e)}")
+            return False
+    
+    async def subscribe(self, channel: str) -> Optional[asyncio.Queue]:
+        """
+        Get a queue receiving the data of each message published on channel,
+        delivered over the process's shared pubsub (None without Redis)
+        """
+        await self._ensure_initialized()
+        
+        if not self.redis:
+            return None
+        
+        try:
+            return await self.shared_pubsub.subscribe(channel)
+        except Exception as e:
+            logger.error(f"Error subscribing to {channel}: {str(e)}")
+            return None
+    
+    async def unsubscribe(self, queue: Optional[asyncio.Queue], channel: str):
+        """Stop delivering channel to a queue from subscribe()"""
+        if not queue or not self.shared_pubsub:
+            return
+        
+        try:
+            await self.shared_pubsub.unsubscribe(queue, channel)
+        except Exception as e:
+            logger.error(f"Error unsubscribing from {channel}: {str(e)}")
+    
+    # Distributed rate limiting
+    
+    async def acquire_rate_budget(
+        self,
+        model: str,
+        rpm: int,
+        tpm: int,
+        tokens: int,
+        requests: int = 1
+    ) -> Optional[float]:
+        """
+        Try to take request and token budget for a model from the shared buckets.
+        Returns seconds to wait before retrying (0 if granted), or None if
+        Redis is unavailable and the caller should limit in-process.
+        """
+        await self._ensure_initialized()
+        
+        if not self.redis or not self.rate_limit_script:
+            return None
+        
+        try:
+            wait = await self.rate_limit_script(
+                keys=[f"tia:ratelimit:{model}:rpm", f"tia:ratelimit:{model}:tpm"],
+                args=[rpm, rpm / 60, tpm, tpm / 60, requests, tokens]
+            )
+            return float(wait)
+        except Exception as e:
+            logger.error(f"Error acquiring rate limit budget: {str(e)}")
+            return None
+    
     # Cache statistics and management
     
     async def get_cache_stats(self) -> Dict[str, Any]:
@@ -360,33 +1458,43 @@ class RedisCache:
         
         try:
             stats = {
-                "type": "redis" if self.redis else "memory",
+                "type": "redis" if self.redis else "disk" if self.backend == "disk" else "memory",
                 "sections": 0,
                 "reports": 0,
-                "jobs": 0
+                "jobs": 0,
+                "local_cache": self.get_local_cache_stats(),
+                "disk_cache": self.get_disk_cache_stats()
             }
             
             if self.redis:
-                # Get counts from Redis
-                sections = await self.redis.keys("tia:section:*")
-                stats["sections"] = len(sections)
-                
-                reports = await self.redis.keys("tia:report:*")
-                stats["reports"] = len(reports)
-                
-                jobs = await self.redis.keys("tia:job:*:status")
-                stats["jobs"] = len(jobs)
+                # Count unexpired entries in each namespace index
+                now = time.time()
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for _, _, index_key in CACHE_NAMESPACES.values():
+                        pipe.zcount(index_key, now, "+inf")
+                    pipe.hlen(BLOB_REFS_KEY)
+                    counts = await pipe.execute()
+                stats.update(zip([*CACHE_NAMESPACES, "blobs"], counts))
             else:
-                # Get counts from memory cache
-                stats["sections"] = len(self.memory_cache["sections"])
-                stats["reports"] = len(self.memory_cache["reports"])
-                stats["jobs"] = len(self.memory_cache["jobs"])
+                # Get counts from memory cache; reports are held by hash
+                # ("reports" there holds batches)
+                prefixes = {"sections": "sections:", "reports": "hashes:", "jobs": "jobs:"}
+                for namespace, prefix in prefixes.items():
+                    stats[namespace] = self.memory_cache.count(prefix)["entries"]
+                stats["memory_fallback"] = self.get_memory_fallback_stats()
             
             return stats
         except Exception as e:
             logger.error(f"Error getting cache stats: {str(e)}")
             return {"error": str(e)}
     
+    async def _clear_store(self, store, prefix: str = ""):
+        """Clear a LocalCache or DiskStore; a DiskStore scans its table, so off the event loop"""
+        if isinstance(store, DiskStore):
+            await asyncio.to_thread(store.clear, prefix)
+        else:
+            store.clear(prefix)
+    
     async def clear_cache(self, cache_type: str = "all") -> Dict[str, Any]:
         """Clear cache of specified type"""
         await self._ensure_initialized()
@@ -395,25 +1503,42 @@ class RedisCache:
             result = {"cleared": True, "type": cache_type}
             
             if self.redis:
-                if cache_type == "all" or cache_type == "sections":
-                    await self.redis.delete(*await self.redis.keys("tia:section:*"))
+                for namespace, (pattern, _, index_key) in CACHE_NAMESPACES.items():
+                    if cache_type == "all" or cache_type == namespace:
+                        result[namespace] = await self._unlink_matching(
+                            pattern,
+                            holds_manifests=True,
+                            hash_field="result" if namespace == "jobs" else None
+                        )
+                        await self.redis.unlink(index_key)
+                        if namespace == "jobs":
+                            await self._unlink_matching("tia:jobsections:*")
                 
-                if cache_type == "all" or cache_type == "reports":
-                    await self.redis.delete(*await self.redis.keys("tia:report:*"))
+                if cache_type == "all":
+                    # Also drop blobs whose holders expired without releasing them
+                    result["blobs"] = await self._unlink_matching("tia:blob:*")
+                    await self.redis.unlink(BLOB_REFS_KEY)
                 
-                if cache_type == "all" or cache_type == "jobs":
-                    await self.redis.delete(*await self.redis.keys("tia:job:*"))
+                prefixes = {"sections": ["tia:section:"], "reports": ["tia:report:"], "jobs": ["tia:job:"]}
+                await self._invalidate(prefixes=prefixes.get(cache_type, ["tia:"]))
+                if self.disk_cache:
+                    for prefix in prefixes.get(cache_type, ["tia:"]):
+                        await self._clear_store(self.disk_cache, prefix)
             else:
                 # Clear memory cache
-                if cache_type == "all" or cache_type == "sections":
-                    self.memory_cache["sections"] = {}
+                if cache_type == "all":
+                    await self._clear_store(self.memory_cache)
+                
+                if cache_type == "sections":
+                    await self._clear_store(self.memory_cache, "sections:")
                 
-                if cache_type == "all" or cache_type == "reports":
-                    self.memory_cache["reports"] = {}
-                    self.memory_cache["hashes"] = {}
+                if cache_type == "reports":
+                    await self._clear_store(self.memory_cache, "reports:")
+                    await self._clear_store(self.memory_cache, "hashes:")
                 
-                if cache_type == "all" or cache_type == "jobs":
-                    self.memory_cache["jobs"] = {}
+                if cache_type == "jobs":
+                    await self._clear_store(self.memory_cache, "jobs:")
+                    await self._clear_store(self.memory_cache, "job_sections:")
             
             return result
         except Exception as e:
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Input canonicalization for TIA Generator.
+Requests are normalized once on arrival (Unicode, quotes, whitespace,
+missing/None fields, field order) so inputs that differ only cosmetically
+share cache keys and report hashes.
+
+Usage: python canonicalization.py corpus.jsonl
+    Reports exact cache hit rates on a recorded corpus of requests (one JSON
+    request per line) with raw and with canonical keys.
+"""
+
+import re
+import sys
+import json
+import hashlib
+import logging
+import unicodedata
+from typing import Dict, Any, Optional
+
+import orjson
+from dotenv import load_dotenv
+
+from models import TIARequest
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.canonicalization")
+
+# Typographic variants NFKC leaves alone, and invisible characters to drop
+_CHARACTER_MAP = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u2032": "'",
+    "\u201c": '"', "\u201d": '"', "\u201e": '"', "\u201f": '"', "\u2033": '"',
+    "\u2010": "-", "\u2011": "-", "\u2012": "-", "\u2013": "-", "\u2014": "-", "\u2212": "-",
+    "\u200b": None, "\u200c": None, "\u200d": None, "\u2060": None, "\ufeff": None,
+})
+
+# Fields whose case carries no meaning (e.g. "City of Sydney" vs "city of sydney").
+# They keep their case for generation and are only folded in keys and hashes.
+CASE_INSENSITIVE_FIELDS = {
+    ("project_details", "development_type"),
+    ("project_details", "zoning"),
+    ("project_details", "pptn"),
+    ("project_details", "council"),
+}
+
+
+def canonicalize_text(value: Any) -> str:
+    """Normalize Unicode, quotes, dashes, line endings and whitespace; None becomes ''"""
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = str(value)
+
+    value = unicodedata.normalize("NFKC", value).translate(_CHARACTER_MAP)
+    value = value.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t\f\v]+", " ", line).strip() for line in value.split("\n")]
+    # Keep paragraph breaks, but no more than one blank line in a row
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _model_schema(model) -> Dict[str, Any]:
+    """Field name -> nested schema (for sub-models) or None, in declaration order"""
+    schema = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        schema[name] = _model_schema(annotation) if hasattr(annotation, "model_fields") else None
+    return schema
+
+REQUEST_SCHEMA = _model_schema(TIARequest)
+
+
+def _canonicalize_object(data: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    result = {}
+    for name, subschema in schema.items():
+        value = data.get(name)
+        if subschema is not None:
+            result[name] = _canonicalize_object(value if isinstance(value, dict) else {}, subschema)
+        else:
+            result[name] = canonicalize_text(value)
+
+    # Fields outside the model are kept (canonicalized) after the known ones
+    for name in sorted(set(data) - set(schema)):
+        value = data[name]
+        result[name] = _canonicalize_object(value, {}) if isinstance(value, dict) else canonicalize_text(value)
+    return result
+
+
+def canonicalize_request(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical form of a TIA request: every model field present (missing and
+    None as ''), text normalized, fields in model order. Idempotent.
+    """
+    return _canonicalize_object(data or {}, REQUEST_SCHEMA)
+
+
+def fold_case(value: str) -> str:
+    """Case-insensitive form of a text value, for keys"""
+    return value.casefold()
+
+
+def stable_hash(value: Any) -> str:
+    """Fast, order-independent hash of a JSON-compatible value"""
+    return hashlib.blake2b(
+        orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS),
+        digest_size=16
+    ).hexdigest()
+
+
+def report_hash(data: Dict[str, Any]) -> str:
+    """Hash identifying a full (canonical) report request"""
+    key_data = {group: dict(fields) if isinstance(fields, dict) else fields for group, fields in data.items()}
+    for group, field in CASE_INSENSITIVE_FIELDS:
+        if isinstance(key_data.get(group), dict) and isinstance(key_data[group].get(field), str):
+            key_data[group][field] = fold_case(key_data[group][field])
+    return stable_hash(key_data)
+
+
+def fuzzy_report_hash(data: Dict[str, Any]) -> Optional[str]:
+    """Hash of a request's identifying project fields only (None if they're all empty)"""
+    project_details = data.get("project_details") or {}
+    key_data = {
+        "project_title": project_details.get("project_title") or "",
+        "site_address": project_details.get("site_address") or "",
+        "development_type": fold_case(project_details.get("development_type") or ""),
+        "council": fold_case(project_details.get("council") or "")
+    }
+    if not any(key_data.values()):
+        return None
+    return stable_hash(key_data)
+
+
+def _main(path: str):
+    """Compare exact hit rates of raw and canonical keys over a recorded corpus"""
+    from tia_generator import extract_sections, get_cache_key
+
+    def raw_hash(value: Any) -> str:
+        # How keys were computed before canonicalization
+        return hashlib.md5(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                requests.append(json.loads(line))
+
+    seen = {"raw_reports": set(), "canonical_reports": set(), "raw_sections": set(), "canonical_sections": set()}
+    hits = dict.fromkeys(seen, 0)
+    sections_total = 0
+
+    def lookup(kind: str, key: str):
+        if key in seen[kind]:
+            hits[kind] += 1
+        seen[kind].add(key)
+
+    for data in requests:
+        canonical = canonicalize_request(data)
+        lookup("raw_reports", raw_hash(data))
+        lookup("canonical_reports", report_hash(canonical))
+
+        raw_sections = extract_sections(data)
+        canonical_sections = extract_sections(canonical)
+        raw_context = {k: v for k, v in raw_sections.items() if k.startswith("_")}
+        canonical_context = {k: v for k, v in canonical_sections.items() if k.startswith("_")}
+        for section, content in canonical_sections.items():
+            if section.startswith("_") or not content:
+                continue
+            sections_total += 1
+            raw_content = raw_sections.get(section) or ""
+            lookup("raw_sections", raw_hash({
+                "section": section,
+                "content": raw_content,
+                "project_title": raw_context.get("_project_title", ""),
+                "development_type": raw_context.get("_development_type", ""),
+                "council": raw_context.get("_council", "")
+            }))
+            lookup("canonical_sections", get_cache_key(section, content, canonical_context))
+
+    def rate(kind: str, total: int) -> float:
+        return hits[kind] / total if total else 0
+
+    print(json.dumps({
+        "requests": len(requests),
+        "sections": sections_total,
+        "report_hit_rate": {"raw": rate("raw_reports", len(requests)), "canonical": rate("canonical_reports", len(requests))},
+        "section_hit_rate": {"raw": rate("raw_sections", sections_total), "canonical": rate("canonical_sections", sections_total)},
+        "distinct_reports": {"raw": len(seen["raw_reports"]), "canonical": len(seen["canonical_reports"])},
+        "distinct_sections": {"raw": len(seen["raw_sections"]), "canonical": len(seen["canonical_sections"])}
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    _main(sys.argv[1])
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Per-model circuit breakers with automatic failover for TIA Generator.
+Breakers are fed by the API call and failure metrics; while a model's
+breaker is open its sections are routed to a configured fallback model.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional
+from collections import deque
+
+import openai
+from dotenv import load_dotenv
+
+from model_selection import DEFAULT_MODEL, FAST_MODEL
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.circuit")
+
+# Breaker settings
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # Failures in window to open
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))  # Before a half-open probe
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "60"))  # Slow calls count as failures
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+# A probe that hasn't reported back within this long (e.g. its call was cancelled) frees its slot
+CIRCUIT_PROBE_TIMEOUT_SECONDS = float(os.getenv("CIRCUIT_PROBE_TIMEOUT_SECONDS", str(CIRCUIT_SLOW_CALL_SECONDS)))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+def _load_fallback_models() -> Dict[str, str]:
+    """Build the model -> fallback table, applying CIRCUIT_FALLBACK_MODELS (JSON) overrides"""
+    fallbacks = {}
+    if FAST_MODEL != DEFAULT_MODEL:
+        fallbacks = {DEFAULT_MODEL: FAST_MODEL, FAST_MODEL: DEFAULT_MODEL}
+
+    overrides = os.getenv("CIRCUIT_FALLBACK_MODELS")
+    if overrides:
+        try:
+            fallbacks.update(json.loads(overrides))
+        except ValueError as e:
+            logger.error(f"Invalid CIRCUIT_FALLBACK_MODELS, using defaults: {str(e)}")
+
+    return fallbacks
+
+FALLBACK_MODELS = _load_fallback_models()
+
+
+def is_service_failure(error: BaseException) -> bool:
+    """
+    Whether an API error says the model is unhealthy: timeouts, connection
+    errors and 5xx. Bad requests and rate limits are the caller's problem.
+    """
+    # APITimeoutError is an APIConnectionError
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one model"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+        half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES,
+        probe_timeout: float = CIRCUIT_PROBE_TIMEOUT_SECONDS
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_timeout = probe_timeout
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._failures = deque()
+        self._probes = 0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str, reason: str = ""):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit for {self.name}: {self.state} -> {state} {reason}".rstrip())
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.times_opened += 1
+        if state != CLOSED:
+            self._probes = 0
+        else:
+            self._failures.clear()
+
+    def allow_request(self) -> bool:
+        """Whether a call may be sent to this model now"""
+        with self._lock:
+            if self.state == OPEN and time.time() - self.opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN, "(probing)")
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes and time.time() - self._probe_started >= self.probe_timeout:
+                    logger.warning(f"Circuit for {self.name}: probe never reported back, probing again")
+                    self._probes = 0
+                if self._probes < self.half_open_probes:
+                    self._probes += 1
+                    self._probe_started = time.time()
+                    return True
+            return False
+
+    def is_available(self) -> bool:
+        """Like allow_request, but without using up a half-open probe"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.time() - self.opened_at >= self.open_seconds
+            return True
+
+    def record_success(self, duration: float):
+        """Record a completed call; slow calls count as failures"""
+        if duration > self.slow_call_seconds:
+            self.record_failure(f"slow call ({duration:.1f}s)")
+            return
+
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED, "(probe succeeded)")
+
+    def release_probe(self):
+        """Hand back a half-open probe whose call ended without a verdict on the model"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self, error: str = ""):
+        """Record a failed call"""
+        with self._lock:
+            now = time.time()
+            if self.state == HALF_OPEN:
+                self._transition(OPEN, f"(probe failed: {error})")
+                return
+
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window_seconds:
+                self._failures.popleft()
+
+            if self.state == CLOSED and len(self._failures) >= self.failure_threshold:
+                self._transition(OPEN, f"({len(self._failures)} failures in {self.window_seconds:.0f}s)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state"""
+        return {
+            "state": self.state,
+            "recent_failures": len(self._failures),
+            "times_opened": self.times_opened,
+            "opened_at": self.opened_at or None,
+            "fallback": FALLBACK_MODELS.get(self.name)
+        }
+
+
+class CircuitBreakerRegistry:
+    """Holds one breaker per model and routes around open ones"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._failovers = 0
+
+    def get(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(model)
+        return self._breakers[model]
+
+    def get_fallback(self, model: str) -> Optional[str]:
+        return FALLBACK_MODELS.get(model)
+
+    def is_available(self, model: str) -> bool:
+        return self.get(model).is_available()
+
+    def route(self, model: str) -> str:
+        """
+        Get the model a call should go to: the requested model if its breaker
+        allows it, otherwise its fallback (if that one allows it too; a
+        half-open fallback takes calls only as its probes)
+        """
+        if self.get(model).allow_request():
+            return model
+
+        fallback = self.get_fallback(model)
+        if fallback and self.get(fallback).allow_request():
+            self._failovers += 1
+            logger.info(f"Circuit open for {model}, routing to {fallback}")
+            return fallback
+
+        # Nowhere better to go; let the call try the original model
+        return model
+
+    # Metrics listener hooks
+
+    def on_api_call(self, model: str, duration: float):
+        self.get(model).record_success(duration)
+
+    def on_api_failure(self, model: str, error: str, service_fault: bool = True):
+        if service_fault:
+            self.get(model).record_failure(error)
+        else:
+            self.get(model).release_probe()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "failovers": self._failovers,
+            "models": {model: breaker.get_stats() for model, breaker in self._breakers.items()}
+        }
+
+
+# Shared breakers for this process, fed by metrics.record_api_call / record_api_failure
+circuit_breakers = CircuitBreakerRegistry()
+metrics.register_api_listener(circuit_breakers.on_api_call, circuit_breakers.on_api_failure)
+metrics.register_metrics_provider("circuit_breakers", circuit_breakers.get_stats)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Adaptive concurrency control for TIA Generator.
+Implements an AIMD (additive increase, multiplicative decrease) limiter
+for OpenAI API calls that grows while the provider is healthy and backs
+off when we are throttled or latency spikes.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextvars import ContextVar
+from typing import Dict, Any
+from collections import deque
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.concurrency")
+
+# Limiter settings
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "5"))  # Initial limit
+CONCURRENCY_MIN = int(os.getenv("CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.getenv("CONCURRENCY_MAX", "32"))
+# Limit grows by this much per full window of successful calls
+CONCURRENCY_INCREASE_STEP = float(os.getenv("CONCURRENCY_INCREASE_STEP", "1"))
+CONCURRENCY_DECREASE_FACTOR = float(os.getenv("CONCURRENCY_DECREASE_FACTOR", "0.5"))
+# A call slower than baseline * tolerance counts as a latency spike
+CONCURRENCY_LATENCY_TOLERANCE = float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
+# Don't grow while the recent error rate is above this
+CONCURRENCY_ERROR_RATE_THRESHOLD = float(os.getenv("CONCURRENCY_ERROR_RATE_THRESHOLD", "0.1"))
+# Minimum seconds between two decreases, so one burst of 429s only cuts once
+CONCURRENCY_DECREASE_COOLDOWN = float(os.getenv("CONCURRENCY_DECREASE_COOLDOWN", "5"))
+
+# Priority of the calls made from the current task (lower is served first
+# when calls have to queue for a slot)
+request_priority: ContextVar[int] = ContextVar("request_priority", default=0)
+
+# Weight of new samples in the latency baseline (EWMA)
+_BASELINE_ALPHA = 0.1
+# Samples needed before latency spikes are acted upon
+_BASELINE_MIN_SAMPLES = 10
+
+
+class PriorityWaitQueue:
+    """
+    Default wait queue for AdaptiveConcurrencyLimiter: request_priority
+    order, first come first served within a priority. Any queue with the
+    same push / pop / discard / len interface can be plugged in instead.
+    """
+
+    def __init__(self):
+        self._heap = []  # (priority, sequence, waiter)
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, waiter):
+        heapq.heappush(self._heap, (request_priority.get(), next(self._sequence), waiter))
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2]
+
+    def discard(self, waiter):
+        """Remove a waiter if it is still queued"""
+        remaining = [entry for entry in self._heap if entry[2] is not waiter]
+        if len(remaining) != len(self._heap):
+            self._heap = remaining
+            heapq.heapify(self._heap)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Async limiter whose capacity adapts using AIMD.
+
+    Use as an async context manager around a call, then report the outcome
+    with on_success(), on_throttle() or on_error(). Queued callers are
+    woken in the order of the wait queue (PriorityWaitQueue by default).
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = CONCURRENCY_LIMIT,
+        min_limit: int = CONCURRENCY_MIN,
+        max_limit: int = CONCURRENCY_MAX,
+        increase_step: float = CONCURRENCY_INCREASE_STEP,
+        decrease_factor: float = CONCURRENCY_DECREASE_FACTOR,
+        latency_tolerance: float = CONCURRENCY_LATENCY_TOLERANCE,
+        error_rate_threshold: float = CONCURRENCY_ERROR_RATE_THRESHOLD,
+        decrease_cooldown: float = CONCURRENCY_DECREASE_COOLDOWN,
+        queue = None
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+        self.decrease_cooldown = decrease_cooldown
+
+        self.in_flight = 0
+        self._waiters = queue if queue is not None else PriorityWaitQueue()
+        self._latency_baselines: Dict[str, Dict[str, float]] = {}
+        self._recent_outcomes = deque(maxlen=50)  # True = success
+        self._last_decrease = 0.0
+
+        # Counters for metrics
+        self.increases = 0
+        self.decreases = 0
+        self.throttles = 0
+        self.latency_spikes = 0
+
+    # Slot management
+
+    async def acquire(self):
+        """Wait for a free slot"""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.push(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was granted just as we were cancelled; hand it on
+                self.release()
+            else:
+                self._waiters.discard(waiter)
+            raise
+
+    def release(self):
+        """Release a slot and wake waiters that now fit under the limit"""
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.pop()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    # Feedback
+
+    def on_success(self, latency: float, key: str = "default"):
+        """Report a successful call; grows the limit unless latency spiked"""
+        self._recent_outcomes.append(True)
+
+        baseline = self._latency_baselines.setdefault(key, {"value": latency, "samples": 0})
+        spiked = (
+            baseline["samples"] >= _BASELINE_MIN_SAMPLES
+            and latency > baseline["value"] * self.latency_tolerance
+        )
+        baseline["value"] += _BASELINE_ALPHA * (latency - baseline["value"])
+        baseline["samples"] += 1
+
+        if spiked:
+            self.latency_spikes += 1
+            self._decrease(f"latency spike ({latency:.2f}s, baseline {baseline['value']:.2f}s)")
+            return
+
+        if self._error_rate() > self.error_rate_threshold or self.limit >= self.max_limit:
+            return
+
+        # Additive increase: +increase_step per window of `limit` successes
+        self.limit = min(self.max_limit, self.limit + self.increase_step / self.limit)
+        self.increases += 1
+        self._wake_waiters()
+
+    def on_throttle(self):
+        """Report a rate-limit response; cuts the limit multiplicatively"""
+        self._recent_outcomes.append(False)
+        self.throttles += 1
+        self._decrease("rate limited")
+
+    def on_error(self):
+        """Report a non-throttle failure; holds growth while errors are frequent"""
+        self._recent_outcomes.append(False)
+
+    def _decrease(self, reason: str):
+        now = time.time()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+
+        previous = self.limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+        self.decreases += 1
+        logger.warning(f"Concurrency limit reduced {previous:.1f} -> {self.limit:.1f}: {reason}")
+
+    def _error_rate(self) -> float:
+        if not self._recent_outcomes:
+            return 0.0
+        return self._recent_outcomes.count(False) / len(self._recent_outcomes)
+
+    # Metrics
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get live limiter state"""
+        return {
+            "limit": int(self.limit),
+            "limit_exact": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "error_rate": self._error_rate(),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "throttles": self.throttles,
+            "latency_spikes": self.latency_spikes,
+            "latency_baselines": {
+                key: round(baseline["value"], 3) for key, baseline in self._latency_baselines.items()
+            }
+        }
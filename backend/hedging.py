@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Hedged requests for TIA Generator.
+When a call runs past the model's recent latency percentile, an identical
+backup request is sent and whichever finishes first wins. A budget caps
+the extra load hedging can add.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Callable, Awaitable
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.hedging")
+
+# Hedging settings
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "").lower() == "true"
+# Latency percentile (from recent calls to the same model) after which to hedge
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# Maximum extra calls as a fraction of primary calls
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+# Calls needed for a model before its percentile is trusted
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+
+class HedgePolicy:
+    """Decides when to hedge and keeps hedges within budget"""
+
+    def __init__(
+        self,
+        enabled: bool = HEDGE_REQUESTS,
+        percentile: float = HEDGE_PERCENTILE,
+        budget: float = HEDGE_BUDGET,
+        min_samples: int = HEDGE_MIN_SAMPLES
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self._stats = defaultdict(lambda: {
+            "primaries": 0, "hedges": 0, "hedge_wins": 0, "skipped_budget": 0,
+            # Tokens spent on losing requests (estimated where a loser was cancelled)
+            "overhead_prompt_tokens": 0, "overhead_completion_tokens": 0, "overhead_estimated": 0
+        })
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait on the primary before hedging, or None if not enough history"""
+        return metrics.get_api_latency_percentile(model, self.percentile, min_samples=self.min_samples)
+
+    def _within_budget(self) -> bool:
+        primaries = sum(stats["primaries"] for stats in self._stats.values())
+        hedges = sum(stats["hedges"] for stats in self._stats.values())
+        return hedges < primaries * self.budget
+
+    async def call(
+        self,
+        model: str,
+        request: Callable[[], Awaitable[Any]],
+        can_hedge: Optional[Callable[[], Awaitable[bool]]] = None,
+        on_loser: Optional[Callable[[Optional[Any]], None]] = None,
+        on_hedge: Optional[Callable[[], None]] = None
+    ) -> Any:
+        """
+        Run request(), hedging with a second identical request if it is slow.
+
+        Args:
+            model: Model the request is sent to (selects the latency history)
+            request: Factory creating a new request coroutine on each call
+            can_hedge: Optional async check run before hedging (e.g. rate limit budget)
+            on_loser: Called once a hedged race is won, with the losing request's
+                result if it also completed, or None if it was cancelled
+            on_hedge: Called when the backup request is sent
+        """
+        self._stats[model]["primaries"] += 1
+        delay = self.hedge_delay(model) if self.enabled else None
+        if delay is None:
+            return await request()
+
+        primary = asyncio.ensure_future(request())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            if not self._within_budget() or (can_hedge and not await can_hedge()):
+                self._stats[model]["skipped_budget"] += 1
+                return await primary
+
+            logger.info(f"Hedging {model} request after {delay:.2f}s")
+            self._stats[model]["hedges"] += 1
+            if on_hedge:
+                on_hedge()
+            hedge = asyncio.ensure_future(request())
+            pending = {primary, hedge}
+            error = None
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats[model]["hedge_wins"] += 1
+                        loser = primary if task is hedge else hedge
+                        # The loser is billed too, even though it's about to be cut off
+                        if on_loser and not loser.done():
+                            on_loser(None)
+                        elif on_loser and loser.exception() is None:
+                            on_loser(loser.result())
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the loser, or whatever is still running if we were cancelled
+            # ourselves, so no request is left spending a slot unowned
+            for task in (primary, hedge):
+                if task and not task.done():
+                    task.cancel()
+
+    def record_overhead(self, model: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+        """Record tokens spent on a losing hedged request"""
+        stats = self._stats[model]
+        stats["overhead_prompt_tokens"] += prompt_tokens
+        stats["overhead_completion_tokens"] += completion_tokens
+        stats["overhead_estimated"] += estimated
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedging metrics"""
+        primaries = sum(stats["primaries"] for stats in self._stats.values())
+        hedges = sum(stats["hedges"] for stats in self._stats.values())
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "primaries": primaries,
+            "hedges": hedges,
+            "hedge_rate": hedges / primaries if primaries > 0 else 0,
+            "models": {model: dict(stats) for model, stats in self._stats.items()}
+        }
+
+
+# Shared policy for this process
+hedge_policy = HedgePolicy()
+metrics.register_metrics_provider("hedging", hedge_policy.get_stats)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Output-length prediction for TIA Generator.
+Learns, per section, how many completion tokens a section takes for a given
+input length, so max_tokens can be sized per call instead of reserving a
+fixed worst case against the rate limits.
+"""
+
+import os
+import math
+import logging
+import statistics
+from typing import Dict, Any, Optional
+from collections import defaultdict, deque
+
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.length")
+
+# Prediction settings
+LENGTH_PREDICTION = os.getenv("LENGTH_PREDICTION", "true").lower() == "true"
+# Observations a section needs before its prediction is used
+LENGTH_MIN_SAMPLES = int(os.getenv("LENGTH_MIN_SAMPLES", "10"))
+# Observations kept per section
+LENGTH_HISTORY = int(os.getenv("LENGTH_HISTORY", "200"))
+# Relative headroom added to the predicted length...
+LENGTH_MARGIN = float(os.getenv("LENGTH_MARGIN", "0.25"))
+# ...plus this many standard deviations of the prediction error
+LENGTH_ERROR_STDS = float(os.getenv("LENGTH_ERROR_STDS", "2"))
+LENGTH_MIN_TOKENS = int(os.getenv("LENGTH_MIN_TOKENS", "150"))
+LENGTH_MAX_TOKENS = int(os.getenv("LENGTH_MAX_TOKENS", "2000"))
+
+
+class OutputLengthPredictor:
+    """Per-section least-squares fit of completion tokens against input length"""
+
+    def __init__(
+        self,
+        enabled: bool = LENGTH_PREDICTION,
+        min_samples: int = LENGTH_MIN_SAMPLES,
+        history: int = LENGTH_HISTORY,
+        margin: float = LENGTH_MARGIN,
+        error_stds: float = LENGTH_ERROR_STDS,
+        min_tokens: int = LENGTH_MIN_TOKENS,
+        max_tokens: int = LENGTH_MAX_TOKENS
+    ):
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.margin = margin
+        self.error_stds = error_stds
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self._samples = defaultdict(lambda: deque(maxlen=history))
+        self._models = {}
+        self._stats = defaultdict(lambda: {"predicted": 0, "truncated": 0, "continuations": 0})
+
+    def observe(self, section: str, input_chars: int, completion_tokens: int, truncated: bool = False):
+        """
+        Record how many completion tokens a section took in total (including
+        any continuations) for an input of input_chars characters. A reply
+        still truncated at max_tokens is counted but not fitted: its true
+        length is unknown, only that it is longer.
+        """
+        if truncated:
+            self._stats[section]["truncated"] += 1
+            return
+        if completion_tokens <= 0:
+            return
+        self._samples[section].append((input_chars, completion_tokens))
+        self._models.pop(section, None)
+
+    def record_continuation(self, section: str):
+        """Record a continuation call made after a length-truncated reply"""
+        self._stats[section]["continuations"] += 1
+
+    def _fit(self, section: str) -> Optional[Dict[str, float]]:
+        if section in self._models:
+            return self._models[section]
+
+        samples = list(self._samples[section])
+        if len(samples) < self.min_samples:
+            return None
+
+        xs = [x for x, _ in samples]
+        ys = [y for _, y in samples]
+        mean_x, mean_y = statistics.mean(xs), statistics.mean(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / variance if variance > 0 else 0.0
+        # Longer input never means less to write; guard against noisy fits
+        slope = max(slope, 0.0)
+        intercept = mean_y - slope * mean_x
+        residuals = [y - (intercept + slope * x) for x, y in samples]
+
+        model = {
+            "slope": slope,
+            "intercept": intercept,
+            "error_std": statistics.pstdev(residuals),
+            "samples": len(samples)
+        }
+        self._models[section] = model
+        return model
+
+    def predict(self, section: str, input_chars: int, default: int) -> int:
+        """
+        Get max_tokens for a section: the predicted length plus the safety
+        margin, or default until the section has enough history
+        """
+        model = self._fit(section) if self.enabled else None
+        if model is None:
+            return default
+
+        predicted = model["intercept"] + model["slope"] * input_chars
+        limit = predicted * (1 + self.margin) + self.error_stds * model["error_std"]
+        limit = int(min(max(math.ceil(limit), self.min_tokens), self.max_tokens))
+
+        self._stats[section]["predicted"] += 1
+        logger.debug(f"Predicted max_tokens {limit} for {section} ({input_chars} chars, default {default})")
+        return limit
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get predictor metrics"""
+        sections = {}
+        for section, samples in self._samples.items():
+            model = self._fit(section)
+            sections[section] = {
+                "samples": len(samples),
+                "slope": round(model["slope"], 4) if model else None,
+                "intercept": round(model["intercept"], 1) if model else None,
+                "error_std": round(model["error_std"], 1) if model else None,
+                **self._stats[section]
+            }
+        return {"enabled": self.enabled, "sections": sections}
+
+
+# Shared predictor for this process
+length_predictor = OutputLengthPredictor()
+metrics.register_metrics_provider("length_prediction", length_predictor.get_stats)
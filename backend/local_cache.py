@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+In-process LRU cache with a byte budget and TTL for TIA Generator.
+Used as an L1 in front of Redis for data that never changes once written
+(section contents, finished job results), and as the store behind the
+in-memory fallback when Redis is unavailable.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.local-cache")
+
+# L1 cache settings
+L1_CACHE = os.getenv("L1_CACHE", "true").lower() == "true"
+L1_CACHE_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", "300"))
+
+
+def approximate_size(value: Any) -> int:
+    """Rough in-memory size of a decoded value, for cache byte budgets"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + approximate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(approximate_size(item) for item in value)
+    return 8
+
+
+class LocalCache:
+    """
+    LRU cache bounded by the total size of its values, with per-entry expiry.
+    Sizes are supplied by the caller (e.g. the length of the serialized value).
+    """
+
+    def __init__(self, max_bytes: int = L1_CACHE_MAX_BYTES, ttl: float = L1_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+
+        # Counters for metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, _, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None):
+        """Store a value, evicting least recently used entries to stay within budget"""
+        if size > self.max_bytes:
+            # Never worth flushing the whole cache for one value
+            self.delete(key)
+            return
+
+        self._remove(key)
+        self._entries[key] = (value, size, time.monotonic() + (ttl or self.ttl))
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        """Remove a key; returns whether it was present"""
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        self.invalidations += 1
+        return True
+
+    def clear(self, prefix: str = "") -> int:
+        """Remove every key starting with prefix (all keys by default)"""
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def items(self, prefix: str = "") -> List[Tuple[str, Any]]:
+        """Unexpired (key, value) pairs whose key starts with prefix, oldest first"""
+        now = time.monotonic()
+        return [
+            (key, value) for key, (value, _, expires_at) in self._entries.items()
+            if expires_at > now and key.startswith(prefix)
+        ]
+
+    def count(self, prefix: str = "") -> Dict[str, int]:
+        """Number and total size of unexpired entries whose key starts with prefix"""
+        now = time.monotonic()
+        entries = 0
+        size = 0
+        for key, (_, entry_size, expires_at) in self._entries.items():
+            if expires_at > now and key.startswith(prefix):
+                entries += 1
+                size += entry_size
+        return {"entries": entries, "bytes": size}
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache usage and hit/miss counts"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups > 0 else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
@@ -5,15 +5,16 @@ This replaces the Flask app with an async-focused FastAPI implementation.
 """
 
 import os
+import json
 import time
 import uuid
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
 from pydantic import BaseModel
@@ -23,11 +24,18 @@ from dotenv import load_dotenv
 from tia_generator import (
     generate_tia_report, 
     generate_tia_report_progressive,
-    validate_input_data
+    validate_input_data,
+    get_report_hash
 )
 from caching import RedisCache
 from document_generator import generate_docx
 from models import TIARequest, TIAResponse, ErrorResponse, JobStatus
+from rate_limiting import rate_limiter
+from batch_generation import submit_bulk_jobs, start_polling, resume_pending_batches, stop_polling
+from singleflight import claim_report
+from streaming import DELTA_MESSAGE_TYPE
+from canonicalization import canonicalize_request
+import openai_client
 import metrics
 
 # Load environment variables
@@ -42,18 +50,28 @@ logger = logging.getLogger("tia-generator")
 
 # Initialize Redis cache
 redis_cache = RedisCache()
+metrics.register_metrics_provider("local_cache", redis_cache.get_local_cache_stats)
+metrics.register_metrics_provider("memory_fallback", redis_cache.get_memory_fallback_stats)
+metrics.register_metrics_provider("disk_cache", redis_cache.get_disk_cache_stats)
+metrics.register_metrics_provider("redis_pool", redis_cache.get_redis_pool_stats)
 
 # Startup and shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: initialize cache and metrics
+    # Startup: initialize cache, metrics and the shared OpenAI client
     await redis_cache.initialize()
+    rate_limiter.configure(redis_cache)
     metrics.init_metrics()
+    await openai_client.init_client()
+    # Batches submitted before a restart are still running at the provider
+    await resume_pending_batches(redis_cache)
     logger.info("TIA Generator backend initialized")
     
     yield
     
     # Shutdown: close connections
+    await stop_polling()
+    await openai_client.close_client()
     await redis_cache.close()
     logger.info("TIA Generator backend shutdown complete")
 
@@ -92,12 +110,22 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 @app.post("/generate-tia", response_model=Dict[str, str])
-async def create_tia_job(request: TIARequest, background_tasks: BackgroundTasks):
+async def create_tia_job(
+    request: TIARequest,
+    background_tasks: BackgroundTasks,
+    x_tenant_id: Optional[str] = Header(None),
+    x_work_class: str = Header("interactive")
+):
     """
-    Enqueue a TIA generation job (standard method)
+    Enqueue a TIA generation job (standard method).
+    X-Tenant-ID and X-Work-Class (interactive or bulk) set how the job's
+    API calls are scheduled against other jobs.
     """
+    # Canonicalize once; every cache key and hash below derives from this
+    data = canonicalize_request(request.dict())
+    
     # Validate input data
-    validation_errors = validate_input_data(request.dict())
+    validation_errors = validate_input_data(data)
     if validation_errors:
         logger.warning(f"Input validation errors: {validation_errors}")
         return JSONResponse(
@@ -109,30 +137,51 @@ async def create_tia_job(request: TIARequest, background_tasks: BackgroundTasks)
     job_id = str(uuid.uuid4())
     
     # Check cache for similar request
-    cache_hit = await redis_cache.get_similar_report(request.dict())
+    cache_hit = await redis_cache.get_similar_report(data)
     if cache_hit:
         logger.info(f"Cache hit for similar report, using cached result with job_id: {job_id}")
-        await redis_cache.set_job_result(job_id, cache_hit, time_to_live=3600*24*7)
-        await redis_cache.set_job_status(job_id, "finished")
+        await redis_cache.finish_job(job_id, cache_hit, time_to_live=3600*24*7)
         return {"job_id": job_id, "status": "cached"}
     
+    # Queue the job before claiming, so a request attaching to this one never
+    # finds it without a status
+    await redis_cache.set_job_status(job_id, "queued")
+    
+    # Attach to an identical report that is already being generated
+    owner_job_id = await claim_report(redis_cache, "report", get_report_hash(data), job_id)
+    if owner_job_id:
+        logger.info(f"Identical report in progress, attaching to job {owner_job_id}")
+        await redis_cache.delete_job(job_id)
+        return {"job_id": owner_job_id, "status": "attached"}
+    
     # If no cache hit, queue the job for processing
     background_tasks.add_task(
         generate_tia_report,
         job_id=job_id,
-        data=request.dict(),
-        redis_cache=redis_cache
+        data=data,
+        redis_cache=redis_cache,
+        tenant=x_tenant_id,
+        work_class=x_work_class
     )
     
     return {"job_id": job_id}
 
 @app.post("/generate-tia-streaming", response_model=Dict[str, str])
-async def create_tia_streaming_job(request: TIARequest, background_tasks: BackgroundTasks):
+async def create_tia_streaming_job(
+    request: TIARequest,
+    background_tasks: BackgroundTasks,
+    x_tenant_id: Optional[str] = Header(None),
+    x_work_class: str = Header("interactive")
+):
     """
     Enqueue a TIA generation job with progressive streaming results
+    (X-Tenant-ID / X-Work-Class as for /generate-tia)
     """
+    # Canonicalize once; every cache key and hash below derives from this
+    data = canonicalize_request(request.dict())
+    
     # Validate input data
-    validation_errors = validate_input_data(request.dict())
+    validation_errors = validate_input_data(data)
     if validation_errors:
         return JSONResponse(
             status_code=400,
@@ -142,91 +191,168 @@ async def create_tia_streaming_job(request: TIARequest, background_tasks: Backgr
     # Generate job ID
     job_id = str(uuid.uuid4())
     
-    # Initialize job status
+    # Initialize job status before claiming, so a request attaching to this one
+    # never finds it without a status
     await redis_cache.set_job_status(job_id, "queued")
     
+    # Attach to an identical streaming report that is already being generated
+    owner_job_id = await claim_report(redis_cache, "report_stream", get_report_hash(data), job_id)
+    if owner_job_id:
+        logger.info(f"Identical streaming report in progress, attaching to job {owner_job_id}")
+        await redis_cache.delete_job(job_id)
+        return {"job_id": owner_job_id, "status": "attached"}
+    
     # Queue the job for progressive processing
     background_tasks.add_task(
         generate_tia_report_progressive,
         job_id=job_id,
-        data=request.dict(),
-        redis_cache=redis_cache
+        data=data,
+        redis_cache=redis_cache,
+        tenant=x_tenant_id,
+        work_class=x_work_class
     )
     
     return {"job_id": job_id}
 
+@app.post("/generate-tia-batch")
+async def create_tia_batch(requests: List[TIARequest]):
+    """
+    Enqueue many TIA generation jobs as one offline batch (cheaper, slower).
+    Jobs report status "queued_batch" until the batch completes.
+    """
+    jobs = {}
+    for index, request in enumerate(requests):
+        data = canonicalize_request(request.dict())
+        validation_errors = validate_input_data(data)
+        if validation_errors:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Invalid input data in request {index}", "details": validation_errors}
+            )
+        jobs[str(uuid.uuid4())] = data
+    
+    batch_id = await submit_bulk_jobs(jobs, redis_cache)
+    
+    # Poll the batch and fan results back into the jobs once it completes. This
+    # outlives the request; if the process restarts, polling resumes at startup
+    start_polling(batch_id, redis_cache)
+    
+    return {"batch_id": batch_id, "job_ids": list(jobs)}
+
 @app.get("/job-status/{job_id}", response_model=JobStatus)
 async def get_job_status(job_id: str):
     """
     Get the status of a TIA generation job
     """
-    # Check if job exists
-    status = await redis_cache.get_job_status(job_id)
+    # Check if job exists (status, result and error come back in one read)
+    state = await redis_cache.get_job_state(job_id)
+    status = state["status"]
     if not status:
         raise HTTPException(status_code=404, detail="Job not found")
     
     # If job is finished, return the result
     if status == "finished":
-        result = await redis_cache.get_job_result(job_id)
+        result = state["result"]
         if not result:
             return {"status": "missing", "error": "Result not found"}
         return {"status": "finished", "result": result}
     
     # If job failed, return the error
     if status == "failed":
-        error = await redis_cache.get_job_error(job_id)
-        return {"status": "failed", "error": error or "Unknown error"}
+        return {"status": "failed", "error": state["error"] or "Unknown error"}
     
     # Otherwise return the current status
     return {"status": status}
 
+@app.get("/job-cost/{job_id}")
+async def get_job_cost(job_id: str):
+    """
+    Get the token usage and cost breakdown of a TIA generation job
+    """
+    cost = await redis_cache.get_job_cost(job_id)
+    if not cost:
+        raise HTTPException(status_code=404, detail="Job cost not found")
+    return cost
+
 @app.get("/stream-sections/{job_id}")
 async def stream_job_sections(job_id: str):
     """
     Stream TIA sections as they are generated
     """
     async def event_generator():
-        pubsub = redis_cache.pubsub
-        await pubsub.subscribe(f"tia_updates:{job_id}")
+        channel = f"tia_updates:{job_id}"
+        updates = await redis_cache.subscribe(channel)
         
         try:
+            # Sections completed before we subscribed (e.g. when this client was
+            # attached to a job another request started). Read before the job
+            # state, so anything completed in between arrives as an update
+            sent = await redis_cache.get_job_sections(job_id)
+            
             # First check if job is already complete
-            status = await redis_cache.get_job_status(job_id)
-            if status == "finished":
-                result = await redis_cache.get_job_result(job_id)
+            state = await redis_cache.get_job_state(job_id)
+            if state["status"] == "finished":
+                result = state["result"]
                 if result:
                     for key, value in result.items():
                         yield f"data: {{\"{key}\": {json.dumps(value)}}}\n\n"
                     yield f"data: {{\"status\": \"complete\"}}\n\n"
                     return
             
+            for key, value in sent.items():
+                yield f"data: {{\"{key}\": {json.dumps(value)}}}\n\n"
+            
             # Otherwise stream updates as they arrive
             while True:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                if message is not None:
-                    data = message["data"]
+                data = None
+                if updates:
+                    try:
+                        data = await asyncio.wait_for(updates.get(), 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(1.0)
+                
+                if data is not None:
                     if isinstance(data, bytes):
                         data = data.decode("utf-8")
+                    update = json.loads(data)
+                    
+                    # Token deltas are relayed as their own event type so clients
+                    # can append partial text without mistaking it for a section
+                    if update.get("type") == DELTA_MESSAGE_TYPE:
+                        yield f"event: section_delta\ndata: {data}\n\n"
+                        continue
+                    
+                    # Skip sections already replayed
+                    if update.keys() <= sent.keys():
+                        continue
+                    
                     yield f"data: {data}\n\n"
+                    sent.update(update)
                     
-                    # Check if this was the completion message
-                    if '"status": "complete"' in data:
+                    # Check if this was the completion or failure message
+                    if update.get("status") in ("complete", "failed"):
                         break
+                    continue
                 
                 # Check if job failed or completed while we were waiting
-                status = await redis_cache.get_job_status(job_id)
-                if status == "failed":
-                    error = await redis_cache.get_job_error(job_id)
-                    yield f"data: {{\"status\": \"failed\", \"error\": {json.dumps(error or 'Unknown error')}}}\n\n"
+                state = await redis_cache.get_job_state(job_id)
+                if state["status"] == "failed":
+                    yield f"data: {{\"status\": \"failed\", \"error\": {json.dumps(state['error'] or 'Unknown error')}}}\n\n"
+                    break
+                if state["status"] == "finished":
+                    # The completion message was missed; send what we haven't from the result
+                    for key, value in (state["result"] or {}).items():
+                        if key not in sent:
+                            yield f"data: {{\"{key}\": {json.dumps(value)}}}\n\n"
+                    yield f"data: {{\"status\": \"complete\"}}\n\n"
                     break
                 
                 # Add heartbeat to keep connection alive
                 yield f"data: {{\"heartbeat\": {time.time()}}}\n\n"
-                
-                # Sleep briefly to prevent tight loop
-                await asyncio.sleep(0.1)
         finally:
-            await pubsub.unsubscribe(f"tia_updates:{job_id}")
+            await redis_cache.unsubscribe(updates, channel)
     
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
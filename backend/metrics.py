@@ -5,15 +5,18 @@ Tracks API calls, generation times, cache performance, etc.
 """
 
 import time
+import logging
 import threading
 import statistics
-from typing import Dict, Any, List, Optional
-from collections import defaultdict, deque
+from typing import Dict, Any, List, Tuple, Optional, Callable
+from collections import defaultdict, deque, OrderedDict
 
 # Thread-local storage for request timing
 import threading
 _thread_local = threading.local()
 
+logger = logging.getLogger("tia-generator.metrics")
+
 # In-memory metrics storage
 # Using deque with maxlen to avoid unlimited growth
 _api_calls = defaultdict(lambda: deque(maxlen=1000))
@@ -25,6 +28,22 @@ _cache_misses = defaultdict(int)
 _request_times = defaultdict(lambda: deque(maxlen=1000))
 _progressive_updates = defaultdict(int)
 _report_generation_times = deque(maxlen=1000)
+_section_token_usage = defaultdict(lambda: deque(maxlen=1000))
+_report_costs = deque(maxlen=1000)
+_stream_deltas = defaultdict(lambda: {"messages": 0, "chars": 0})
+_time_to_first_content = defaultdict(lambda: deque(maxlen=100))
+_section_batches = {"batches": 0, "sections": 0, "fallbacks": 0}
+# Token usage per in-progress job, bounded so abandoned jobs can't leak
+_job_usage = OrderedDict()
+_MAX_TRACKED_JOBS = 1000
+# Adaptive model routing decisions (recent log plus per-section counts)
+_routing_decisions = deque(maxlen=200)
+_routing_counts = defaultdict(lambda: defaultdict(int))
+
+# Live gauges reported by other modules (connection pools, limiters, etc.)
+_metrics_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+# Callbacks told about each API call / failure (e.g. circuit breakers)
+_api_listeners: List[Tuple[Callable[[str, float], None], Callable[[str, str, bool], None]]] = []
 
 # Lock for thread-safe updates
 _metrics_lock = threading.RLock()
@@ -33,22 +52,115 @@ def init_metrics():
     """Initialize metrics system"""
     pass
 
-def record_api_call(model: str, duration: float, tokens: int):
-    """Record an API call to OpenAI"""
+def register_metrics_provider(name: str, provider: Callable[[], Dict[str, Any]]):
+    """Register a callable whose output is included in get_all_metrics under name"""
+    with _metrics_lock:
+        _metrics_providers[name] = provider
+
+def register_api_listener(on_call: Callable[[str, float], None], on_failure: Callable[[str, str, bool], None]):
+    """
+    Register callbacks run on every record_api_call(model, duration) /
+    record_api_failure(model, error, service_fault)
+    """
+    with _metrics_lock:
+        _api_listeners.append((on_call, on_failure))
+
+def _notify_api_listeners(index: int, model: str, *values: Any):
+    for listener in list(_api_listeners):
+        try:
+            listener[index](model, *values)
+        except Exception as e:
+            logger.error(f"API metrics listener failed: {str(e)}")
+
+def record_api_call(
+    model: str,
+    duration: float,
+    tokens: int,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0
+):
+    """
+    Record an API call to OpenAI (tokens is the total reported by the API,
+    cached_tokens the prompt tokens served from the provider's prefix cache)
+    """
     with _metrics_lock:
         _api_calls[model].append({
             "timestamp": time.time(),
             "duration": duration,
-            "tokens": tokens
+            "tokens": tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens
         })
+    _notify_api_listeners(0, model, duration)
 
-def record_api_failure(model: str, error: str):
-    """Record an API call failure"""
+def record_token_usage(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    section: Optional[str] = None,
+    job_id: Optional[str] = None,
+    batch: bool = False,
+    hedged: bool = False
+):
+    """
+    Record token usage from an API response against its section and job
+    (batch: the response came from the Batch API, which is priced lower;
+    hedged: the call sent a backup request)
+    """
+    entry = {
+        "timestamp": time.time(),
+        "model": model,
+        "section": section,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "batch": batch,
+        "hedged": hedged
+    }
+    with _metrics_lock:
+        if section:
+            _section_token_usage[section].append(entry)
+        
+        if job_id:
+            if job_id not in _job_usage:
+                _job_usage[job_id] = {"calls": []}
+                while len(_job_usage) > _MAX_TRACKED_JOBS:
+                    _job_usage.popitem(last=False)
+            _job_usage[job_id]["calls"].append(entry)
+
+def job_was_hedged(job_id: str) -> bool:
+    """Whether any call recorded for a job sent a hedged backup request"""
+    with _metrics_lock:
+        return any(call.get("hedged") for call in _job_usage.get(job_id, {"calls": []})["calls"])
+
+def pop_job_usage(job_id: str) -> Dict[str, Any]:
+    """Remove and return the token usage recorded for a job"""
+    with _metrics_lock:
+        return _job_usage.pop(job_id, {"calls": []})
+
+def record_report_cost(cost: float, prompt_tokens: int, completion_tokens: int):
+    """Record the cost of a full report"""
+    with _metrics_lock:
+        _report_costs.append({
+            "timestamp": time.time(),
+            "cost": cost,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens
+        })
+
+def record_api_failure(model: str, error: str, service_fault: bool = True):
+    """
+    Record an API call failure. service_fault is False for errors caused by the
+    request rather than the service (bad requests, rate limits)
+    """
     with _metrics_lock:
         _api_failures[model].append({
             "timestamp": time.time(),
-            "error": error
+            "error": error,
+            "service_fault": service_fault
         })
+    _notify_api_listeners(1, model, error, service_fault)
 
 def record_section_generation(section: str, duration: float):
     """Record generation time for a section"""
@@ -83,14 +195,83 @@ def record_progressive_update(section: str):
     with _metrics_lock:
         _progressive_updates[section] += 1
 
-def record_full_report_generation(duration: float, section_count: int):
-    """Record time to generate a full report"""
+def record_section_batch(section_count: int, fallback_count: int):
+    """Record a multi-section batched request and how many sections fell back to single calls"""
+    with _metrics_lock:
+        _section_batches["batches"] += 1
+        _section_batches["sections"] += section_count
+        _section_batches["fallbacks"] += fallback_count
+
+def record_stream_delta(section: str, chars: int):
+    """Record a batch of streamed token deltas published for a section"""
+    with _metrics_lock:
+        _stream_deltas[section]["messages"] += 1
+        _stream_deltas[section]["chars"] += chars
+
+def record_time_to_first_content(section: str, duration: float):
+    """Record time from starting a section to publishing its first streamed text"""
+    with _metrics_lock:
+        _time_to_first_content[section].append(duration)
+
+def record_full_report_generation(duration: float, section_count: int, hedged: bool = False):
+    """Record time to generate a full report (hedged: whether any of its calls were hedged)"""
     with _metrics_lock:
         _report_generation_times.append({
             "timestamp": time.time(),
             "duration": duration,
-            "section_count": section_count
+            "section_count": section_count,
+            "hedged": hedged
+        })
+
+def get_api_latency_percentile(model: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+    """Get a latency percentile (0-1) of recent calls to a model, or None without enough samples"""
+    with _metrics_lock:
+        durations = sorted(call["duration"] for call in _api_calls.get(model, []))
+    
+    if len(durations) < max(1, min_samples):
+        return None
+    
+    index = min(int(len(durations) * percentile), len(durations) - 1)
+    return durations[index]
+
+def get_model_performance(model: str, window: int = 100) -> Dict[str, Any]:
+    """Summarise the most recent calls to a model: latency, failure rate and tokens per call"""
+    with _metrics_lock:
+        calls = list(_api_calls.get(model, []))[-window:]
+        failures = list(_api_failures.get(model, []))
+    
+    # Only count failures from the period the call window covers
+    since = calls[0]["timestamp"] if calls else 0
+    failure_count = len([f for f in failures if f["timestamp"] >= since])
+    attempts = len(calls) + failure_count
+    
+    return {
+        "calls": len(calls),
+        "avg_latency": statistics.mean([c["duration"] for c in calls]) if calls else None,
+        "failure_rate": failure_count / attempts if attempts > 0 else 0,
+        "avg_prompt_tokens": statistics.mean([c["prompt_tokens"] for c in calls]) if calls else 0,
+        "avg_completion_tokens": statistics.mean([c["completion_tokens"] for c in calls]) if calls else 0
+    }
+
+def record_routing_decision(section: str, model: str, reason: str, candidates: Dict[str, Any]):
+    """Record a model routing decision for auditing"""
+    with _metrics_lock:
+        _routing_decisions.append({
+            "timestamp": time.time(),
+            "section": section,
+            "model": model,
+            "reason": reason,
+            "candidates": candidates
         })
+        _routing_counts[section][model] += 1
+
+def get_routing_metrics() -> Dict[str, Any]:
+    """Get model routing counts per section and the most recent decisions"""
+    with _metrics_lock:
+        return {
+            "sections": {section: dict(counts) for section, counts in _routing_counts.items()},
+            "recent_decisions": list(_routing_decisions)[-50:]
+        }
 
 def calculate_stats(values: List[float]) -> Dict[str, float]:
     """Calculate statistics for a list of values"""
@@ -101,11 +282,13 @@ def calculate_stats(values: List[float]) -> Dict[str, float]:
             "max": 0,
             "avg": 0,
             "median": 0,
-            "p95": 0
+            "p95": 0,
+            "p99": 0
         }
     
     sorted_values = sorted(values)
     p95_index = int(len(sorted_values) * 0.95)
+    p99_index = int(len(sorted_values) * 0.99)
     
     return {
         "count": len(values),
@@ -113,7 +296,8 @@ def calculate_stats(values: List[float]) -> Dict[str, float]:
         "max": max(values),
         "avg": statistics.mean(values),
         "median": statistics.median(values),
-        "p95": sorted_values[p95_index if p95_index < len(sorted_values) else -1]
+        "p95": sorted_values[p95_index if p95_index < len(sorted_values) else -1],
+        "p99": sorted_values[p99_index if p99_index < len(sorted_values) else -1]
     }
 
 def get_api_call_metrics() -> Dict[str, Any]:
@@ -125,12 +309,26 @@ def get_api_call_metrics() -> Dict[str, Any]:
         for model, calls in _api_calls.items():
             durations = [call["duration"] for call in calls]
             tokens = [call["tokens"] for call in calls]
+            prompt_tokens = [call.get("prompt_tokens", 0) for call in calls]
+            completion_tokens = [call.get("completion_tokens", 0) for call in calls]
+            total_prompt_tokens = sum(prompt_tokens)
+            total_cached_tokens = sum(call.get("cached_tokens", 0) for call in calls)
             
             metrics[model] = {
                 "calls": len(calls),
                 "durations": calculate_stats(durations),
                 "tokens": calculate_stats(tokens),
-                "failures": len(_api_failures.get(model, []))
+                "prompt_tokens": calculate_stats(prompt_tokens),
+                "completion_tokens": calculate_stats(completion_tokens),
+                "failures": len(_api_failures.get(model, [])),
+                # Provider-side prefix caching: share of prompt tokens served from cache,
+                # and latency of calls with and without a cache hit
+                "prompt_cache": {
+                    "cached_tokens": total_cached_tokens,
+                    "hit_rate": total_cached_tokens / total_prompt_tokens if total_prompt_tokens > 0 else 0,
+                    "durations_cached": calculate_stats([c["duration"] for c in calls if c.get("cached_tokens", 0) > 0]),
+                    "durations_uncached": calculate_stats([c["duration"] for c in calls if c.get("cached_tokens", 0) == 0])
+                }
             }
             
         # Overall metrics
@@ -185,6 +383,8 @@ def get_section_generation_metrics() -> Dict[str, Any]:
                 "total_cache_hits": 0,
                 "times": {"count": 0, "min": 0, "max": 0, "avg": 0, "median": 0, "p95": 0}
             }
+        
+        metrics["batching"] = dict(_section_batches)
             
         return metrics
 
@@ -220,19 +420,28 @@ def get_report_generation_metrics() -> Dict[str, Any]:
         times = [report["duration"] for report in _report_generation_times]
         section_counts = [report["section_count"] for report in _report_generation_times]
         
+        # Split by whether the report hedged any call, so tail latency can be
+        # compared with and without hedging
+        by_hedging = {
+            "hedged": calculate_stats([r["duration"] for r in _report_generation_times if r.get("hedged")]),
+            "unhedged": calculate_stats([r["duration"] for r in _report_generation_times if not r.get("hedged")])
+        }
+        
         if times:
             return {
                 "count": len(times),
                 "times": calculate_stats(times),
                 "section_counts": calculate_stats(section_counts),
-                "reports_per_minute": 60 / calculate_stats(times)["avg"] if calculate_stats(times)["avg"] > 0 else 0
+                "reports_per_minute": 60 / calculate_stats(times)["avg"] if calculate_stats(times)["avg"] > 0 else 0,
+                "by_hedging": by_hedging
             }
         else:
             return {
                 "count": 0,
                 "times": {"count": 0, "min": 0, "max": 0, "avg": 0, "median": 0, "p95": 0},
                 "section_counts": {"count": 0, "min": 0, "max": 0, "avg": 0, "median": 0, "p95": 0},
-                "reports_per_minute": 0
+                "reports_per_minute": 0,
+                "by_hedging": by_hedging
             }
 
 def get_cache_metrics() -> Dict[str, Any]:
@@ -263,23 +472,84 @@ def get_cache_metrics() -> Dict[str, Any]:
             
         return metrics
 
+def get_streaming_metrics() -> Dict[str, Any]:
+    """Get metrics for token streaming"""
+    with _metrics_lock:
+        sections = {
+            section: {
+                **_stream_deltas.get(section, {"messages": 0, "chars": 0}),
+                "time_to_first_content": calculate_stats(list(_time_to_first_content.get(section, [])))
+            }
+            for section in set(_stream_deltas) | set(_time_to_first_content)
+        }
+        return {
+            "delta_messages": sum(deltas["messages"] for deltas in _stream_deltas.values()),
+            "delta_chars": sum(deltas["chars"] for deltas in _stream_deltas.values()),
+            "sections": sections,
+            "time_to_first_content": calculate_stats(
+                [duration for durations in _time_to_first_content.values() for duration in durations]
+            )
+        }
+
+def get_token_usage_metrics() -> Dict[str, Any]:
+    """Get metrics for token usage per section and cost per report"""
+    with _metrics_lock:
+        metrics = {"sections": {}}
+        
+        for section, usage in _section_token_usage.items():
+            metrics["sections"][section] = {
+                "calls": len(usage),
+                "prompt_tokens": calculate_stats([u["prompt_tokens"] for u in usage]),
+                "completion_tokens": calculate_stats([u["completion_tokens"] for u in usage])
+            }
+        
+        costs = [report["cost"] for report in _report_costs]
+        metrics["report_cost"] = calculate_stats(costs)
+        metrics["report_tokens"] = calculate_stats(
+            [report["prompt_tokens"] + report["completion_tokens"] for report in _report_costs]
+        )
+        metrics["total_cost"] = sum(costs)
+        
+        return metrics
+
+def get_provider_metrics() -> Dict[str, Any]:
+    """Get metrics from registered providers"""
+    with _metrics_lock:
+        providers = dict(_metrics_providers)
+    
+    metrics = {}
+    for name, provider in providers.items():
+        try:
+            metrics[name] = provider()
+        except Exception as e:
+            metrics[name] = {"error": str(e)}
+    
+    return metrics
+
 def get_all_metrics() -> Dict[str, Any]:
     """Get all metrics"""
-    return {
+    all_metrics = {
         "api_calls": get_api_call_metrics(),
         "section_generation": get_section_generation_metrics(),
         "request_times": get_request_time_metrics(),
         "report_generation": get_report_generation_metrics(),
         "cache": get_cache_metrics(),
+        "token_usage": get_token_usage_metrics(),
+        "streaming": get_streaming_metrics(),
+        "routing": get_routing_metrics(),
         "timestamp": time.time()
     }
+    all_metrics.update(get_provider_metrics())
+    return all_metrics
 
 def reset_metrics():
     """Reset all metrics"""
     with _metrics_lock:
         global _api_calls, _api_failures, _section_generation_times, _section_failures
         global _cache_hits, _cache_misses, _request_times, _progressive_updates
-        global _report_generation_times
+        global _report_generation_times, _section_token_usage, _report_costs, _job_usage
+        global _stream_deltas, _time_to_first_content, _section_batches
+        global _routing_decisions, _routing_counts
         
         _api_calls = defaultdict(lambda: deque(maxlen=1000))
         _api_failures = defaultdict(lambda: deque(maxlen=100))
@@ -289,4 +559,12 @@ def reset_metrics():
         _cache_misses = defaultdict(int)
         _request_times = defaultdict(lambda: deque(maxlen=1000))
         _progressive_updates = defaultdict(int)
-        _report_generation_times = deque(maxlen=1000)
\ No newline at end of file
+        _report_generation_times = deque(maxlen=1000)
+        _section_token_usage = defaultdict(lambda: deque(maxlen=1000))
+        _report_costs = deque(maxlen=1000)
+        _job_usage = OrderedDict()
+        _stream_deltas = defaultdict(lambda: {"messages": 0, "chars": 0})
+        _time_to_first_content = defaultdict(lambda: deque(maxlen=100))
+        _section_batches = {"batches": 0, "sections": 0, "fallbacks": 0}
+        _routing_decisions = deque(maxlen=200)
+        _routing_counts = defaultdict(lambda: defaultdict(int))
\ No newline at end of file
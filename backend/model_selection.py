@@ -5,7 +5,13 @@ Restricts to cost‑capped chat models: gpt‑4.1‑mini and gpt‑3.5‑turbo.
 """
 
 import os
+import json
+import random
 import logging
+from typing import Dict, Any, Optional
+
+import metrics
+from pricing import calculate_cost
 
 # Configure logging
 logger = logging.getLogger("tia-generator.models")
@@ -39,12 +45,127 @@ FAST_MODEL_SECTIONS = {
     "other_loading_waste",
 }
 
+# Adaptive routing: choose among models meeting a section's quality floor
+# using live latency, failure and token metrics instead of the fixed split
+ADAPTIVE_ROUTING     = os.getenv("ADAPTIVE_ROUTING", "").lower() == "true"
+# Fraction of decisions that explore a random eligible model
+ROUTING_EXPLORATION  = float(os.getenv("ROUTING_EXPLORATION", "0.1"))
+# Calls a model needs in the window before its metrics are trusted
+ROUTING_MIN_SAMPLES  = int(os.getenv("ROUTING_MIN_SAMPLES", "10"))
+# Recent calls per model considered
+ROUTING_WINDOW       = int(os.getenv("ROUTING_WINDOW", "100"))
+# Seconds of latency one USD is worth when trading latency against cost
+ROUTING_COST_WEIGHT  = float(os.getenv("ROUTING_COST_WEIGHT", "100"))
+
+
+def _load_json_env(name: str) -> Dict[str, Any]:
+    value = os.getenv(name)
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError as e:
+        logger.error(f"Invalid {name}, ignoring: {str(e)}")
+        return {}
+
+# Quality rank per model (higher is better), e.g. MODEL_QUALITY='{"gpt-4o": 3}'
+MODEL_QUALITY = {FAST_MODEL: 1, DEFAULT_MODEL: 2}
+MODEL_QUALITY.update(_load_json_env("MODEL_QUALITY"))
+
+# Operator-set quality floors per section, as a rank or a model name,
+# e.g. SECTION_QUALITY_FLOORS='{"parking_justification": "gpt-4.1-mini"}'
+SECTION_QUALITY_FLOORS = _load_json_env("SECTION_QUALITY_FLOORS")
+
+
+def get_quality_floor(section: str, content_length: int) -> int:
+    """
+    Minimum model quality rank for a section: the operator-set floor if any,
+    otherwise the rank of the model the static rules would insist on.
+    """
+    if section in SECTION_QUALITY_FLOORS:
+        floor = SECTION_QUALITY_FLOORS[section]
+        return MODEL_QUALITY.get(floor, 0) if isinstance(floor, str) else int(floor)
+
+    if section in HIGH_COMPLEXITY_SECTIONS or content_length > COMPLEXITY_THRESHOLD:
+        return MODEL_QUALITY.get(HIGH_QUALITY_MODEL, 0)
+
+    return min(MODEL_QUALITY.values())
+
+
+class ModelRouter:
+    """
+    Constrained epsilon-greedy bandit over the models meeting a section's
+    quality floor. Each model is scored by its expected latency (inflated by
+    its failure rate) plus its expected cost per call; the lowest score wins.
+    """
+
+    def __init__(
+        self,
+        exploration: float = ROUTING_EXPLORATION,
+        min_samples: int = ROUTING_MIN_SAMPLES,
+        window: int = ROUTING_WINDOW,
+        cost_weight: float = ROUTING_COST_WEIGHT
+    ):
+        self.exploration = exploration
+        self.min_samples = min_samples
+        self.window = window
+        self.cost_weight = cost_weight
+
+    def score(self, model: str) -> Optional[Dict[str, float]]:
+        """Expected cost of a call to model, or None without enough history"""
+        performance = metrics.get_model_performance(model, window=self.window)
+        if performance["calls"] < self.min_samples:
+            return None
+
+        # Failed attempts are retried, so they stretch the expected latency
+        latency = performance["avg_latency"] / max(1 - performance["failure_rate"], 0.05)
+        cost = calculate_cost(
+            model,
+            int(performance["avg_prompt_tokens"]),
+            int(performance["avg_completion_tokens"])
+        )
+        return {
+            "latency": round(latency, 3),
+            "cost": round(cost, 6),
+            "failure_rate": round(performance["failure_rate"], 3),
+            "score": round(latency + self.cost_weight * cost, 4)
+        }
+
+    def choose(self, section: str, content_length: int) -> str:
+        """Pick a model for a section and record the decision"""
+        floor = get_quality_floor(section, content_length)
+        eligible = sorted(model for model, quality in MODEL_QUALITY.items() if quality >= floor)
+        if not eligible:
+            eligible = [HIGH_QUALITY_MODEL]
+
+        candidates = {model: self.score(model) for model in eligible}
+        unexplored = [model for model, score in candidates.items() if score is None]
+
+        if len(eligible) == 1:
+            model, reason = eligible[0], "only model meeting quality floor"
+        elif unexplored:
+            model, reason = random.choice(unexplored), "exploring (not enough samples)"
+        elif random.random() < self.exploration:
+            model, reason = random.choice(eligible), "exploring"
+        else:
+            model = min(eligible, key=lambda m: candidates[m]["score"])
+            reason = "lowest expected latency and cost"
+
+        logger.info(f"Routing '{section}' ({content_length} chars, floor {floor}) to {model}: {reason} {candidates}")
+        metrics.record_routing_decision(section, model, reason, candidates)
+        return model
+
+
+# Shared router for this process
+model_router = ModelRouter()
+
 
 def select_model_for_section(section: str, content_length: int) -> str:
     """
     Choose between gpt-4.1-mini and gpt-3.5-turbo based on section complexity.
 
     - FORCE_DEFAULT_MODEL: always DEFAULT_MODEL
+    - ADAPTIVE_ROUTING: model_router picks among models meeting the section's quality floor
     - If section in HIGH_COMPLEXITY_SECTIONS or content_length > threshold: HIGH_QUALITY_MODEL
     - If section in FAST_MODEL_SECTIONS and content_length <= threshold: FAST_MODEL
     - Otherwise: DEFAULT_MODEL
@@ -54,6 +175,10 @@ def select_model_for_section(section: str, content_length: int) -> str:
         logger.info(f"FORCE_DEFAULT_MODEL: using {DEFAULT_MODEL} for '{section}'")
         return DEFAULT_MODEL
 
+    # Learned routing from live metrics
+    if ADAPTIVE_ROUTING:
+        return model_router.choose(section, content_length)
+
     # 2. High-complexity or long content
     if section in HIGH_COMPLEXITY_SECTIONS or content_length > COMPLEXITY_THRESHOLD:
         logger.info(f"High complexity: using {HIGH_QUALITY_MODEL} for '{section}' ({content_length} chars)")
@@ -104,7 +104,7 @@ class ErrorResponse(BaseModel):
 
 class JobStatus(BaseModel):
     """Job status model"""
-    status: str = Field(..., description="Status of the job (queued, processing, finished, failed)")
+    status: str = Field(..., description="Status of the job (queued, queued_batch, processing, finished, failed)")
     error: Optional[str] = Field(None, description="Error message if job failed")
     result: Optional[Dict[str, Any]] = Field(None, description="Result of the job if finished")
 
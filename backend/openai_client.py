@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Shared OpenAI client for TIA Generator.
+Keeps one long-lived AsyncOpenAI client per process so HTTP connections
+are pooled and reused across sections and jobs.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.openai")
+
+# HTTP connection pool settings
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "120"))
+# Number of connections to open at startup (0 disables warm-up)
+OPENAI_WARMUP_CONNECTIONS = int(os.getenv("OPENAI_WARMUP_CONNECTIONS", "5"))
+
+_client: Optional[AsyncOpenAI] = None
+_http_client: Optional[httpx.AsyncClient] = None
+_requests_sent = 0
+
+
+async def _count_request(request: httpx.Request):
+    """httpx event hook counting requests sent through the shared pool"""
+    global _requests_sent
+    _requests_sent += 1
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client used by the OpenAI SDK"""
+    limits = httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(OPENAI_REQUEST_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        event_hooks={"request": [_count_request]},
+    )
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Get the shared AsyncOpenAI client.
+    Created lazily if init_client() has not run (e.g. in RQ workers or scripts).
+    """
+    global _client, _http_client
+    if _client is None:
+        _http_client = _build_http_client()
+        _client = AsyncOpenAI(
+            api_key=openai.api_key or os.getenv("OPENAI_API_KEY"),
+            http_client=_http_client,
+        )
+        logger.info(
+            f"Created shared OpenAI client (max_connections={OPENAI_MAX_CONNECTIONS}, "
+            f"keepalive={OPENAI_MAX_KEEPALIVE_CONNECTIONS})"
+        )
+    return _client
+
+
+async def warm_up(connections: int = OPENAI_WARMUP_CONNECTIONS) -> int:
+    """
+    Open connections ahead of the first real request.
+    Issues concurrent lightweight GET /models calls so the TCP+TLS handshakes
+    happen at startup; the connections then sit idle in the keepalive pool.
+    Returns the number of successful warm-up requests.
+    """
+    if connections <= 0:
+        return 0
+
+    client = get_client()
+    url = f"{str(client.base_url).rstrip('/')}/models"
+    headers = {"Authorization": f"Bearer {client.api_key}"}
+
+    async def _ping() -> bool:
+        try:
+            response = await _http_client.get(url, headers=headers)
+            return response.status_code < 500
+        except Exception as e:
+            logger.warning(f"OpenAI connection warm-up failed: {str(e)}")
+            return False
+
+    results = await asyncio.gather(*[_ping() for _ in range(connections)])
+    warmed = sum(1 for ok in results if ok)
+    logger.info(f"Warmed up {warmed}/{connections} OpenAI connections")
+    return warmed
+
+
+async def init_client():
+    """Create the shared client and warm up its connection pool"""
+    try:
+        get_client()
+    except openai.OpenAIError as e:
+        # Don't block startup; calls will fail (and be reported) per section instead
+        logger.error(f"Could not create OpenAI client: {str(e)}")
+        return
+    await warm_up()
+
+
+async def close_client():
+    """Close the shared client and its connection pool"""
+    global _client, _http_client
+    if _client is not None:
+        await _client.close()
+        logger.info("Shared OpenAI client closed")
+    _client = None
+    _http_client = None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Get utilisation statistics for the shared HTTP connection pool"""
+    stats = {
+        "initialized": _client is not None,
+        "max_connections": OPENAI_MAX_CONNECTIONS,
+        "max_keepalive_connections": OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": OPENAI_KEEPALIVE_EXPIRY,
+        "requests_sent": _requests_sent,
+        "active_connections": 0,
+        "idle_connections": 0,
+        "active_requests": 0,
+        "queued_requests": 0,
+        "utilisation": 0,
+    }
+
+    if _http_client is None:
+        return stats
+
+    # httpx does not expose pool state publicly, so read it from httpcore
+    pool = getattr(getattr(_http_client, "_transport", None), "_pool", None)
+    if pool is None:
+        return stats
+
+    try:
+        connections = list(getattr(pool, "_connections", []))
+        requests = list(getattr(pool, "_requests", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        queued = sum(1 for request in requests if request.is_queued())
+
+        stats["active_connections"] = len(connections) - idle
+        stats["idle_connections"] = idle
+        stats["active_requests"] = len(requests) - queued
+        stats["queued_requests"] = queued
+        stats["utilisation"] = stats["active_connections"] / OPENAI_MAX_CONNECTIONS if OPENAI_MAX_CONNECTIONS > 0 else 0
+    except Exception as e:
+        logger.debug(f"Could not read HTTP pool state: {str(e)}")
+
+    return stats
+
+
+metrics.register_metrics_provider("openai_http_pool", get_pool_stats)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Model pricing and per-job cost accounting for TIA Generator.
+Turns recorded token usage into a cost breakdown per report.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Any
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.pricing")
+
+# USD per 1M tokens: {"model": {"prompt": x, "completion": y}}
+DEFAULT_MODEL_PRICES = {
+    "gpt-4.1": {"prompt": 2.00, "completion": 8.00},
+    "gpt-4.1-mini": {"prompt": 0.40, "completion": 1.60},
+    "gpt-4.1-nano": {"prompt": 0.10, "completion": 0.40},
+    "gpt-4o": {"prompt": 2.50, "completion": 10.00},
+    "gpt-4o-mini": {"prompt": 0.15, "completion": 0.60},
+    "gpt-3.5-turbo": {"prompt": 0.50, "completion": 1.50},
+}
+
+def _load_price_table() -> Dict[str, Dict[str, float]]:
+    """Load the price table, applying overrides from OPENAI_PRICE_TABLE (JSON)"""
+    prices = {model: dict(price) for model, price in DEFAULT_MODEL_PRICES.items()}
+
+    overrides = os.getenv("OPENAI_PRICE_TABLE")
+    if overrides:
+        try:
+            for model, price in json.loads(overrides).items():
+                prices[model] = {
+                    "prompt": float(price.get("prompt", 0)),
+                    "completion": float(price.get("completion", 0))
+                }
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Invalid OPENAI_PRICE_TABLE, using defaults: {str(e)}")
+
+    return prices
+
+MODEL_PRICES = _load_price_table()
+
+# Batch API requests are billed at this fraction of the synchronous price
+BATCH_PRICE_MULTIPLIER = float(os.getenv("BATCH_PRICE_MULTIPLIER", "0.5"))
+
+def get_model_price(model: str) -> Dict[str, float]:
+    """
+    Get the price entry for a model.
+    Dated snapshots (e.g. gpt-4.1-mini-2025-04-14) fall back to their base model.
+    """
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+
+    # Longest matching prefix wins so gpt-4.1-mini doesn't resolve to gpt-4.1
+    for known in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(known):
+            return MODEL_PRICES[known]
+
+    logger.warning(f"No price configured for model {model}, costing at 0")
+    return {"prompt": 0.0, "completion": 0.0}
+
+def calculate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+    """Calculate the USD cost of a call (batch: made through the Batch API)"""
+    price = get_model_price(model)
+    cost = (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1_000_000
+    return cost * BATCH_PRICE_MULTIPLIER if batch else cost
+
+def build_cost_breakdown(usage: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a per-model and per-section cost breakdown for a job.
+
+    Args:
+        usage: Job usage as returned by metrics.pop_job_usage
+
+    Returns:
+        Breakdown with token totals and USD cost per model, per section and overall
+    """
+    breakdown = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_cost": 0.0,
+        "models": {},
+        "sections": {}
+    }
+
+    for call in usage.get("calls", []):
+        model = call["model"]
+        section = call.get("section") or "_unknown"
+        prompt_tokens = call["prompt_tokens"]
+        completion_tokens = call["completion_tokens"]
+        cost = calculate_cost(model, prompt_tokens, completion_tokens, batch=call.get("batch", False))
+
+        for bucket in (
+            breakdown["models"].setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}),
+            breakdown["sections"].setdefault(section, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}),
+        ):
+            bucket["calls"] += 1
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["completion_tokens"] += completion_tokens
+            bucket["cost"] += cost
+
+        breakdown["prompt_tokens"] += prompt_tokens
+        breakdown["completion_tokens"] += completion_tokens
+        breakdown["total_cost"] += cost
+
+    return breakdown
@@ -4,72 +4,286 @@ Optimized prompt engineering for TIA report generation.
 Contains specialized prompts for each section to improve quality and response time.
 """
 
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+# Report-wide writing guide at the start of every request's system prompt. It is
+# identical for all sections and projects and longer than the provider's
+# 1024-token minimum, so every call shares a cacheable prefix.
+_BASE_SYSTEM_PROMPT = """You are an expert traffic engineer with extensive experience in preparing Traffic Impact Assessment reports. You write in clear, professional Australian English using proper technical terminology.
+
+You are writing one part of a Traffic Impact Assessment (TIA) report that will accompany a planning permit or development application lodged with a local council or state planning authority. The report is read by council traffic engineers, statutory planners, objectors and, where a decision is contested, by a planning tribunal. Every section must therefore be accurate, measured and defensible, and must read as the work of a single author across the whole report. The rules below apply to every section of every report.
+
+WRITING STYLE
+- Use Australian English spelling throughout: metre, kilometre, centre, organisation, analyse, utilise, licence (noun), license (verb), kerb, tyre, programme only where it is part of a proper name.
+- Write in the third person and in a formal, impersonal register. Refer to "the site", "the subject site", "the proposal", "the development" and "the applicant". Do not use "I", "we", "you" or "our".
+- Prefer the present tense to describe existing conditions ("Smith Street is a collector road") and the future tense to describe the proposal ("the development will provide 30 car parking spaces").
+- Write in complete paragraphs of connected prose. Use numbered or bulleted lists only where the section presents a set of discrete items, such as statutory requirements, a breakdown of spaces, or reasons supporting a parking reduction.
+- Do not use markdown headings, bold or italic text, tables drawn with characters, or emoji. The report template supplies the section headings, so do not repeat the heading or add a title.
+- Do not open with filler such as "This section will discuss" or "In this section". Begin directly with substantive content.
+- Keep sentences concise. Avoid marketing language and value judgements such as "stunning", "world-class" or "perfect". A TIA assesses impacts; it does not promote the development.
+
+FACTS AND ACCURACY
+- Use only the facts supplied in the project details and the content to expand, plus widely known, stable facts about Australian standards and practice. Never invent addresses, road names, bus or tram route numbers, traffic volumes, survey results, dates, floor areas, space counts or council decisions.
+- Where a figure that the section would normally contain has not been supplied, write the sentence so that it does not depend on that figure, or use a clear placeholder in square brackets, for example [number of spaces] or [AM peak hour volume], so the engineer can complete it. Never present a guessed value as fact.
+- Keep every figure consistent with the rest of the report: the number of dwellings, floor areas, parking spaces, bicycle spaces and traffic movements must match wherever they are repeated.
+- When the supplied content contradicts itself, prefer the most specific figure and do not draw attention to the inconsistency in the report text.
+- Do not state that a survey, site inspection, swept path assessment or SIDRA analysis was carried out unless the content says so.
+
+UNITS, NUMBERS AND TERMINOLOGY
+- Use SI units with a space between number and unit except for the metre abbreviation attached to dimensions as is customary in Australian practice: 5.4m, 2.6m x 4.9m, 500m2 or 500 square metres, 50km/h, 1:8 gradient.
+- Write numbers below ten in words in running text (three spaces) unless they are measurements, percentages or part of a calculation. Use numerals for ten and above, and use commas as thousands separators (5,000 vehicles per day).
+- Express times using the 24-hour clock or am/pm consistently within a section, and describe peak periods as "the AM peak hour" and "the PM peak hour".
+- Describe traffic as "vehicle movements" or "trips", in vehicles per day (vpd) or vehicles per hour (vph), distinguishing inbound and outbound movements where directional splits are given.
+- Use "car parking spaces", "accessible spaces", "visitor spaces", "staff spaces" and "bicycle parking spaces" rather than loose terms such as "bays" or "spots", except "loading bay", which is the accepted term.
+- Refer to roads by their full names and, where known, their classification (arterial road, collector road, local street) and the road authority responsible for them.
+- Use "crossover" or "vehicle crossing" for a driveway across the footpath, "accessway" for a driveway within the site, and "aisle" for the circulation space between rows of parking.
+
+STANDARDS AND POLICY
+- Refer to standards and guidelines by their correct titles and numbers. Off-street car parking design is governed by AS/NZS 2890.1 (off-street car parking), AS 2890.2 (off-street commercial vehicle facilities), AS 2890.3 (bicycle parking) and AS/NZS 2890.6 (off-street parking for people with disabilities). Austroads Guides to Traffic Management and Road Design are the national references for road and intersection design.
+- Statutory parking rates come from the relevant planning scheme or development control plan for the council concerned. In Victoria these include Clause 52.06 (car parking) and Clause 52.34 (bicycle facilities) of the planning scheme; in New South Wales, the council's development control plan and the Transport for NSW Guide to Traffic Generating Developments. Cite the instrument that applies to the stated council, and do not cite an instrument from another state.
+- Where the supplied content names a specific clause, table or guideline, cite it exactly as given.
+- Traffic generation estimates should be attributed to a recognised source, such as the Transport for NSW guide and its updated surveys, or first-principles rates agreed with council, and should state the rate applied.
+
+STRUCTURE AND REASONING
+- Lead with the most important statement for the section, then give the supporting detail. For assessment sections, state the requirement, then the proposed provision, then the comparison and conclusion.
+- When a proposal falls short of a requirement, acknowledge the shortfall plainly and then set out the reasons it is acceptable, such as access to public transport, walking and cycling catchments, shared use of spaces across different peak times, on-street parking availability, or car ownership data. Do not overstate these reasons.
+- Conclusions must follow from the information presented. Use measured language such as "is considered acceptable", "is not expected to have a detrimental impact" or "is expected to operate satisfactorily".
+- Recommendations and conditions, such as a Green Travel Plan, a car parking management plan or a waste management plan, should be stated as recommendations, not as commitments by the applicant, unless the content says the applicant has committed to them.
+
+OUTPUT
+- Return only the text of the requested section, ready to be placed in the report under its heading. Do not include notes to the engineer, explanations of what you have done, or any text outside the section itself.
+- Match the length to the section: short descriptive sections are usually one paragraph; assessment sections may need several paragraphs or a short list.
+"""
+
+# Section-specific system prompts, appended to the base prompt after the shared guide
+_SECTION_SYSTEM_PROMPTS = {
+    "introduction_purpose": "You are generating the Introduction section which explains the purpose and scope of the assessment.",
+
+    "existing_conditions_site_location": "You are generating the Site Location section which describes the physical location and surroundings of the site.",
+
+    "existing_conditions_land_use": "You are generating the Existing Land Use section which describes the current use and layout of the site.",
+
+    "existing_conditions_road_network": "You are generating the Road Network section which describes the surrounding road network, including classifications, speed limits, and traffic conditions.",
+
+    "existing_conditions_public_transport": "You are generating the Public Transport section which describes available public transport options near the site.",
+
+    "proposal_description": "You are generating the Proposal Description section which outlines the proposed development in detail.",
+
+    "proposal_facilities": "You are generating the Facilities section which describes the facilities included in the proposed development.",
+
+    "proposal_parking": "You are generating the Parking Arrangement section which describes the proposed parking layout and access arrangements.",
+
+    "parking_existing_provision": "You are generating the Existing Parking Provision section which details the current parking available on site.",
+
+    "parking_proposed_provision": "You are generating the Proposed Parking Provision section which details the number and types of parking spaces to be provided.",
+
+    "parking_rates_calculations": "You are generating the Parking Rates and Calculations section which analyzes applicable parking requirements and calculations.",
+
+    "parking_expected_patrons": "You are generating the Expected Patrons section which estimates the number and patterns of visitors to the site.",
+
+    "parking_justification": "You are generating the Parking Justification section which provides the rationale for the proposed parking provision.",
+
+    "parking_design_dimensions": "You are generating the Parking Dimensions section which details the physical dimensions and layout of parking spaces.",
+
+    "parking_design_compliance": "You are generating the Parking Compliance section which analyzes compliance with relevant standards and regulations.",
+
+    "other_bicycle_parking": "You are generating the Bicycle Parking section which addresses bicycle parking requirements and provisions.",
+
+    "other_loading_waste": "You are generating the Loading and Waste section which details arrangements for loading areas and waste collection.",
+
+    "other_traffic_generation": "You are generating the Traffic Generation section which estimates traffic generation from the development.",
+
+    "conclusion_summary": "You are generating the Conclusion section which summarizes key findings and recommendations.",
+}
+
+_DEFAULT_SYSTEM_PROMPT = "You are generating a section of a Traffic Impact Assessment report."
+
+# Section-specific prompts with examples and structure guidance
+_SECTION_PROMPTS = {
+    "introduction_purpose": {
+        "instruction": "Write a professional introduction section for a Traffic Impact Assessment report.",
+        "format": "A clear, concise paragraph explaining the purpose and scope of the assessment.",
+        "example": "This Traffic Impact Assessment has been prepared to evaluate the traffic impacts associated with the proposed [development type] at [location]. The assessment aims to analyze the existing traffic conditions, estimate the traffic generation of the development, and assess the adequacy of the proposed parking and access arrangements.",
+        "guidance": "Include the purpose of the report, the development it relates to, and any specific requirements or standards being addressed."
+    },
+
+    "existing_conditions_site_location": {
+        "instruction": "Write a detailed site location description for a Traffic Impact Assessment report.",
+        "format": "A descriptive paragraph about the site's location, including notable landmarks and surrounding features.",
+        "example": "The subject site is located at 123 Main Street in the suburb of Richmond. It is situated approximately 5km east of the Melbourne CBD and is bounded by Smith Street to the east, Jones Road to the north, and residential properties to the south and west.",
+        "guidance": "Describe the physical location, nearby landmarks, and surrounding streets and properties."
+    },
+
+    "existing_conditions_land_use": {
+        "instruction": "Write a description of the existing land use and layout of the site.",
+        "format": "A paragraph describing the current use, structures, and layout of the site.",
+        "example": "The site currently contains a single-storey commercial building with a floor area of approximately 500m². The building was previously used as a retail shop and has been vacant for the past six months. The site has an existing crossover on Smith Street providing access to a small car park with 6 parking spaces at the rear of the property.",
+        "guidance": "Include details about existing buildings, current use, site layout, and existing access arrangements."
+    },
+
+    "existing_conditions_road_network": {
+        "instruction": "Write a comprehensive description of the surrounding road network.",
+        "format": "Multiple paragraphs describing surrounding roads, their classification, traffic conditions, and relevant features.",
+        "example": "Smith Street is a collector road with a single traffic lane in each direction and parallel parking on both sides. It has a posted speed limit of 50km/h and carries approximately 5,000 vehicles per day. The road primarily serves local traffic and provides access to the commercial precinct.",
+        "guidance": "Include road classifications, speed limits, traffic volumes, intersection controls, and any notable traffic issues in the area."
+    },
+
+    "existing_conditions_public_transport": {
+        "instruction": "Write a description of the public transport options near the site.",
+        "format": "A paragraph describing nearby public transport services, stops, and frequencies.",
+        "example": "The site is well-served by public transport, with bus route 456 operating along Smith Street with stops directly in front of the site. This service operates at 15-minute intervals during peak periods and 30-minute intervals during off-peak periods, providing connections to Richmond Station and the CBD.",
+        "guidance": "Include nearby bus routes, train stations, tram lines, service frequencies, and walking distances to stops/stations."
+    },
+
+    "proposal_description": {
+        "instruction": "Write a comprehensive description of the proposed development.",
+        "format": "Multiple paragraphs describing the development type, size, and key features.",
+        "example": "The proposal involves the construction of a four-storey mixed-use development comprising ground floor retail and three levels of residential apartments above. The development will include 2 retail tenancies with a combined floor area of 400m² and 20 residential apartments (8 one-bedroom and 12 two-bedroom units).",
+        "guidance": "Include details about building height, floor area, number of units/tenancies, and primary functions."
+    },
+
+    "proposal_facilities": {
+        "instruction": "Write a description of the facilities included in the proposed development.",
+        "format": "A paragraph detailing the amenities and facilities within the development.",
+        "example": "The development will include a communal rooftop garden of 150m² for residents, a ground floor lobby with secure access, bicycle storage for 30 bicycles, and a waste storage area. Each apartment will have private balconies ranging from 8-12m² in size.",
+        "guidance": "Include details about common areas, recreational facilities, service areas, and other amenities."
+    },
+
+    "proposal_parking": {
+        "instruction": "Write a description of the proposed parking arrangement.",
+        "format": "A paragraph explaining the parking layout, access, and allocation.",
+        "example": "Parking for the development will be provided in a basement level car park accessed via a 6.0m wide ramp from Smith Street. The car park will contain 30 parking spaces, including 25 resident spaces, 3 visitor spaces, and 2 retail staff spaces. The car park layout includes 28 standard spaces and 2 accessible spaces located near the lift.",
+        "guidance": "Include the number of spaces, their allocation, access arrangements, and layout configuration."
+    },
+
+    "parking_existing_provision": {
+        "instruction": "Write a description of the existing parking provision on the site.",
+        "format": "A paragraph describing current parking availability on the site.",
+        "example": "The site currently contains 6 at-grade parking spaces located at the rear of the existing building. These spaces are accessed via a single crossover from Smith Street and were previously used by staff and customers of the retail premises.",
+        "guidance": "Include the number of existing spaces, their configuration, and how they were used."
+    },
+
+    "parking_proposed_provision": {
+        "instruction": "Write a description of the proposed parking provision.",
+        "format": "A detailed paragraph explaining the number and allocation of parking spaces.",
+        "example": "The development proposes a total of 30 car parking spaces located within the basement car park. These spaces will be allocated as 25 resident spaces (1 space per apartment plus 5 additional spaces), 3 visitor spaces, and 2 retail staff spaces. No customer parking is proposed for the retail component.",
+        "guidance": "Include a clear breakdown of parking numbers by user type and any special provisions."
+    },
+
+    "parking_rates_calculations": {
+        "instruction": "Write an analysis of applicable parking rates and calculations.",
+        "format": "Multiple paragraphs showing statutory requirements, calculations, and resulting parking numbers.",
+        "example": "According to Clause 52.06 of the Yarra Planning Scheme, the statutory parking requirement for the development is as follows:\n\n- Dwellings: 1 space per 1-2 bedroom dwelling (20 spaces) and 0.1 visitor spaces per dwelling (2 spaces)\n- Retail: 4 spaces per 100m² of leasable floor area (16 spaces)\n\nThis results in a total statutory requirement of 38 spaces (22 residential and 16 retail).",
+        "guidance": "Include the relevant planning scheme requirements, calculate the statutory requirement, and compare to the proposed provision."
+    },
+
+    "parking_expected_patrons": {
+        "instruction": "Write an analysis of expected patron numbers and patterns.",
+        "format": "A paragraph estimating visitor numbers and their arrival/departure patterns.",
+        "example": "The retail tenancies are expected to generate approximately 100 customer visits per day, with peak activity occurring between 12pm and 2pm on weekdays and 10am to 4pm on weekends. The majority of customers (approximately 70%) are expected to arrive by foot or public transport, given the site's location within an established commercial strip and proximity to public transport.",
+        "guidance": "Include estimates of visitor numbers, peak times, and mode share assumptions."
+    },
+
+    "parking_justification": {
+        "instruction": "Write a justification for the proposed parking provision.",
+        "format": "Multiple paragraphs providing rationale for the parking numbers with supporting evidence.",
+        "example": "The proposed parking provision of 30 spaces represents a shortfall of 8 spaces against the statutory requirement. However, this reduction is considered appropriate for the following reasons:\n\n1. The site has excellent access to public transport, with high-frequency bus services directly in front of the site and a train station within 500m.\n\n2. Recent parking surveys conducted in the area indicate that on-street parking utilization is typically below 70% during business hours, with approximately 20 spaces consistently available within 200m of the site.",
+        "guidance": "Provide a clear rationale for the proposed parking, especially if there's a shortfall against requirements. Include relevant factors like public transport accessibility, existing parking availability, and car ownership trends."
+    },
+
+    "parking_design_dimensions": {
+        "instruction": "Write a description of parking space dimensions and layout.",
+        "format": "A technical paragraph detailing dimensions of parking spaces, aisles, and access ways.",
+        "example": "The proposed car park will provide standard parking spaces with dimensions of 2.6m x 4.9m, which complies with the minimum requirements. Accessible spaces will be 2.4m wide with an adjacent shared area of 2.4m, resulting in a total width of 4.8m. The central aisle width is 6.1m, allowing for efficient two-way traffic flow and complying with the minimum 6.0m requirement for two-way aisles.",
+        "guidance": "Include specific dimensions for spaces, aisles, ramps, headroom clearance, and other relevant measurements."
+    },
+
+    "parking_design_compliance": {
+        "instruction": "Write an analysis of the parking design's compliance with standards.",
+        "format": "Multiple paragraphs assessing compliance with relevant design standards.",
+        "example": "The proposed car park layout has been assessed against the requirements of Clause 52.06-9 of the Planning Scheme and Australian Standard AS2890.1:2004, and is found to comply with these requirements in the following ways:\n\n1. All spaces meet or exceed the minimum dimensions of 2.6m x 4.9m for user class 1A (residents).\n\n2. The aisle width of 6.1m exceeds the minimum 5.8m required for 90-degree parking.\n\n3. The 1:5 gradient of the entry ramp transitions to 1:8 at the bottom, providing suitable transitions in accordance with AS2890.1.",
+        "guidance": "Reference specific standards (e.g., Planning Scheme clauses, Australian Standards) and assess compliance with each relevant requirement."
+    },
+
+    "other_bicycle_parking": {
+        "instruction": "Write a description of bicycle parking requirements and provision.",
+        "format": "A paragraph detailing bicycle parking requirements, provision, and facilities.",
+        "example": "Under Clause 52.34 of the Planning Scheme, the development requires 4 resident bicycle spaces, 2 visitor bicycle spaces, and 1 employee bicycle space for the retail component. The proposal exceeds these requirements by providing 30 bicycle parking spaces in a secure room at ground level, comprising 25 resident spaces and 5 visitor/staff spaces. Additionally, 4 visitor bicycle hoops will be installed on the Smith Street frontage.",
+        "guidance": "Include statutory requirements, proposed provision, and details of bicycle parking facilities and access arrangements."
+    },
+
+    "other_loading_waste": {
+        "instruction": "Write a description of loading and waste collection arrangements.",
+        "format": "A paragraph explaining loading zones and waste collection procedures.",
+        "example": "A dedicated loading bay (3.5m x 7.5m) will be provided adjacent to the retail tenancies, accessed from the rear laneway. This bay is designed to accommodate small to medium rigid vehicles (up to 6.4m in length) and will be available for deliveries between 7am and 7pm daily. Waste collection will occur from a designated collection point at the rear of the property, with bins being transported from the waste storage room to the collection area by the building manager on collection days.",
+        "guidance": "Include details about loading bay dimensions, types of vehicles accommodated, waste collection points, and management procedures."
+    },
+
+    "other_traffic_generation": {
+        "instruction": "Write an analysis of expected traffic generation.",
+        "format": "Multiple paragraphs with traffic estimates, peak hour impacts, and distribution.",
+        "example": "The proposed development is expected to generate approximately 120 vehicle movements per day, comprising 80 movements from the residential component and 40 movements from the retail component. During the AM peak hour (8-9am), the development is expected to generate 12 movements (10 outbound, 2 inbound), while during the PM peak hour (5-6pm), it is expected to generate 15 movements (5 outbound, 10 inbound).\n\nBased on existing traffic patterns in the area, it is estimated that 60% of traffic will access the site from/to Smith Street, with the remaining 40% using Jones Road.",
+        "guidance": "Include daily traffic generation, peak hour movements (with directional split), and distribution patterns. Reference industry standards or databases used for estimates."
+    },
+
+    "conclusion_summary": {
+        "instruction": "Write a conclusion summarizing the key findings of the Traffic Impact Assessment.",
+        "format": "A comprehensive paragraph summarizing findings and recommendations.",
+        "example": "Based on the assessment conducted, it is concluded that the proposed development can be accommodated within the existing road network without significant adverse impacts on traffic operation or safety. The proposed parking provision, while below the statutory requirement, is considered appropriate given the site's excellent access to public transport and the availability of on-street parking in the vicinity. The car park design complies with relevant standards, and appropriate arrangements have been made for loading, waste collection, and bicycle parking. It is recommended that a Green Travel Plan be implemented to further encourage sustainable transport modes among residents and staff.",
+        "guidance": "Summarize key findings regarding traffic impact, parking adequacy, compliance with standards, and any recommendations or mitigation measures."
+    }
+}
+
+_DEFAULT_PROMPT = {
+    "instruction": "Write a section for a Traffic Impact Assessment report.",
+    "format": "A well-structured paragraph providing professional analysis.",
+    "example": "This section should contain technical information relevant to the traffic assessment.",
+    "guidance": "Include relevant technical details and professional analysis."
+}
+
+_RESPONSE_INSTRUCTION = "Your response should contain only the formatted text for this section with no additional explanations or metadata."
+
+def _compile_prompt(definition: Dict[str, str], system_prompt: str) -> Mapping[str, str]:
+    """
+    Compile a section's templates once: the system prompt and the static,
+    project-independent part of the user prompt (with and without the example).
+    The shared guide opens every system prompt, so all requests share its
+    prefix; the section's own static text follows, then project content.
+    """
+    task = f"TASK: {definition['instruction']}\n\nEXPECTED FORMAT: {definition['format']}\n\n"
+    guidance = f"GUIDANCE: {definition['guidance']}\n\n{_RESPONSE_INSTRUCTION}\n\n"
+    
+    return MappingProxyType({
+        **definition,
+        "system": f"{_BASE_SYSTEM_PROMPT}\n{system_prompt}",
+        "prefix": task + guidance,
+        "prefix_with_example": task + f"EXAMPLE: {definition['example']}\n\n" + guidance
+    })
+
+# Immutable registry of compiled section prompts, built once at import
+PROMPT_REGISTRY: Mapping[str, Mapping[str, str]] = MappingProxyType({
+    section: _compile_prompt(definition, _SECTION_SYSTEM_PROMPTS.get(section, _DEFAULT_SYSTEM_PROMPT))
+    for section, definition in _SECTION_PROMPTS.items()
+})
+DEFAULT_PROMPT = _compile_prompt(_DEFAULT_PROMPT, _DEFAULT_SYSTEM_PROMPT)
 
 def get_section_system_prompt(section: str) -> str:
     """
     Get the system prompt for a specific section.
     These system prompts help guide the model to generate appropriate content.
     """
-    base_prompt = "You are an expert traffic engineer with extensive experience in preparing Traffic Impact Assessment reports. "
-    base_prompt += "You write in clear, professional Australian English using proper technical terminology. "
-    
-    section_prompts = {
-        "introduction_purpose": base_prompt + "You are generating the Introduction section which explains the purpose and scope of the assessment.",
-        
-        "existing_conditions_site_location": base_prompt + "You are generating the Site Location section which describes the physical location and surroundings of the site.",
-        
-        "existing_conditions_land_use": base_prompt + "You are generating the Existing Land Use section which describes the current use and layout of the site.",
-        
-        "existing_conditions_road_network": base_prompt + "You are generating the Road Network section which describes the surrounding road network, including classifications, speed limits, and traffic conditions.",
-        
-        "existing_conditions_public_transport": base_prompt + "You are generating the Public Transport section which describes available public transport options near the site.",
-        
-        "proposal_description": base_prompt + "You are generating the Proposal Description section which outlines the proposed development in detail.",
-        
-        "proposal_facilities": base_prompt + "You are generating the Facilities section which describes the facilities included in the proposed development.",
-        
-        "proposal_parking": base_prompt + "You are generating the Parking Arrangement section which describes the proposed parking layout and access arrangements.",
-        
-        "parking_existing_provision": base_prompt + "You are generating the Existing Parking Provision section which details the current parking available on site.",
-        
-        "parking_proposed_provision": base_prompt + "You are generating the Proposed Parking Provision section which details the number and types of parking spaces to be provided.",
-        
-        "parking_rates_calculations": base_prompt + "You are generating the Parking Rates and Calculations section which analyzes applicable parking requirements and calculations.",
-        
-        "parking_expected_patrons": base_prompt + "You are generating the Expected Patrons section which estimates the number and patterns of visitors to the site.",
-        
-        "parking_justification": base_prompt + "You are generating the Parking Justification section which provides the rationale for the proposed parking provision.",
-        
-        "parking_design_dimensions": base_prompt + "You are generating the Parking Dimensions section which details the physical dimensions and layout of parking spaces.",
-        
-        "parking_design_compliance": base_prompt + "You are generating the Parking Compliance section which analyzes compliance with relevant standards and regulations.",
-        
-        "other_bicycle_parking": base_prompt + "You are generating the Bicycle Parking section which addresses bicycle parking requirements and provisions.",
-        
-        "other_loading_waste": base_prompt + "You are generating the Loading and Waste section which details arrangements for loading areas and waste collection.",
-        
-        "other_traffic_generation": base_prompt + "You are generating the Traffic Generation section which estimates traffic generation from the development.",
-        
-        "conclusion_summary": base_prompt + "You are generating the Conclusion section which summarizes key findings and recommendations.",
-    }
-    
-    return section_prompts.get(
-        section, 
-        base_prompt + "You are generating a section of a Traffic Impact Assessment report."
-    )
+    return PROMPT_REGISTRY.get(section, DEFAULT_PROMPT)["system"]
 
-def get_optimized_prompt(section: str, content: str, **context) -> str:
+def get_prompt_structure(section: str) -> Mapping[str, str]:
     """
-    Generate optimized prompts for each section of the TIA report.
-    
-    Args:
-        section: The section identifier
-        content: The user input content for this section
-        context: Additional context like project_title, site_address, etc.
-    
-    Returns:
-        An optimized prompt designed for this specific section
+    Get the compiled instruction, format, example and guidance for a section.
+    """
+    return PROMPT_REGISTRY.get(section, DEFAULT_PROMPT)
+
+def get_context_header(**context) -> str:
+    """
+    Build the project context header shared by all section prompts.
     """
     # Get project context
     project_title = context.get("project_title", "")
@@ -91,164 +305,89 @@ def get_optimized_prompt(section: str, content: str, **context) -> str:
     if context_header:
         context_header += "\n"
     
-    # Section-specific prompts with examples and structure guidance
-    prompts = {
-        "introduction_purpose": {
-            "instruction": "Write a professional introduction section for a Traffic Impact Assessment report.",
-            "format": "A clear, concise paragraph explaining the purpose and scope of the assessment.",
-            "example": "This Traffic Impact Assessment has been prepared to evaluate the traffic impacts associated with the proposed [development type] at [location]. The assessment aims to analyze the existing traffic conditions, estimate the traffic generation of the development, and assess the adequacy of the proposed parking and access arrangements.",
-            "guidance": "Include the purpose of the report, the development it relates to, and any specific requirements or standards being addressed."
-        },
-        
-        "existing_conditions_site_location": {
-            "instruction": "Write a detailed site location description for a Traffic Impact Assessment report.",
-            "format": "A descriptive paragraph about the site's location, including notable landmarks and surrounding features.",
-            "example": "The subject site is located at 123 Main Street in the suburb of Richmond. It is situated approximately 5km east of the Melbourne CBD and is bounded by Smith Street to the east, Jones Road to the north, and residential properties to the south and west.",
-            "guidance": "Describe the physical location, nearby landmarks, and surrounding streets and properties."
-        },
-        
-        "existing_conditions_land_use": {
-            "instruction": "Write a description of the existing land use and layout of the site.",
-            "format": "A paragraph describing the current use, structures, and layout of the site.",
-            "example": "The site currently contains a single-storey commercial building with a floor area of approximately 500m². The building was previously used as a retail shop and has been vacant for the past six months. The site has an existing crossover on Smith Street providing access to a small car park with 6 parking spaces at the rear of the property.",
-            "guidance": "Include details about existing buildings, current use, site layout, and existing access arrangements."
-        },
-        
-        "existing_conditions_road_network": {
-            "instruction": "Write a comprehensive description of the surrounding road network.",
-            "format": "Multiple paragraphs describing surrounding roads, their classification, traffic conditions, and relevant features.",
-            "example": "Smith Street is a collector road with a single traffic lane in each direction and parallel parking on both sides. It has a posted speed limit of 50km/h and carries approximately 5,000 vehicles per day. The road primarily serves local traffic and provides access to the commercial precinct.",
-            "guidance": "Include road classifications, speed limits, traffic volumes, intersection controls, and any notable traffic issues in the area."
-        },
-        
-        "existing_conditions_public_transport": {
-            "instruction": "Write a description of the public transport options near the site.",
-            "format": "A paragraph describing nearby public transport services, stops, and frequencies.",
-            "example": "The site is well-served by public transport, with bus route 456 operating along Smith Street with stops directly in front of the site. This service operates at 15-minute intervals during peak periods and 30-minute intervals during off-peak periods, providing connections to Richmond Station and the CBD.",
-            "guidance": "Include nearby bus routes, train stations, tram lines, service frequencies, and walking distances to stops/stations."
-        },
-        
-        "proposal_description": {
-            "instruction": "Write a comprehensive description of the proposed development.",
-            "format": "Multiple paragraphs describing the development type, size, and key features.",
-            "example": "The proposal involves the construction of a four-storey mixed-use development comprising ground floor retail and three levels of residential apartments above. The development will include 2 retail tenancies with a combined floor area of 400m² and 20 residential apartments (8 one-bedroom and 12 two-bedroom units).",
-            "guidance": "Include details about building height, floor area, number of units/tenancies, and primary functions."
-        },
-        
-        "proposal_facilities": {
-            "instruction": "Write a description of the facilities included in the proposed development.",
-            "format": "A paragraph detailing the amenities and facilities within the development.",
-            "example": "The development will include a communal rooftop garden of 150m² for residents, a ground floor lobby with secure access, bicycle storage for 30 bicycles, and a waste storage area. Each apartment will have private balconies ranging from 8-12m² in size.",
-            "guidance": "Include details about common areas, recreational facilities, service areas, and other amenities."
-        },
-        
-        "proposal_parking": {
-            "instruction": "Write a description of the proposed parking arrangement.",
-            "format": "A paragraph explaining the parking layout, access, and allocation.",
-            "example": "Parking for the development will be provided in a basement level car park accessed via a 6.0m wide ramp from Smith Street. The car park will contain 30 parking spaces, including 25 resident spaces, 3 visitor spaces, and 2 retail staff spaces. The car park layout includes 28 standard spaces and 2 accessible spaces located near the lift.",
-            "guidance": "Include the number of spaces, their allocation, access arrangements, and layout configuration."
-        },
-        
-        "parking_existing_provision": {
-            "instruction": "Write a description of the existing parking provision on the site.",
-            "format": "A paragraph describing current parking availability on the site.",
-            "example": "The site currently contains 6 at-grade parking spaces located at the rear of the existing building. These spaces are accessed via a single crossover from Smith Street and were previously used by staff and customers of the retail premises.",
-            "guidance": "Include the number of existing spaces, their configuration, and how they were used."
-        },
-        
-        "parking_proposed_provision": {
-            "instruction": "Write a description of the proposed parking provision.",
-            "format": "A detailed paragraph explaining the number and allocation of parking spaces.",
-            "example": "The development proposes a total of 30 car parking spaces located within the basement car park. These spaces will be allocated as 25 resident spaces (1 space per apartment plus 5 additional spaces), 3 visitor spaces, and 2 retail staff spaces. No customer parking is proposed for the retail component.",
-            "guidance": "Include a clear breakdown of parking numbers by user type and any special provisions."
-        },
-        
-        "parking_rates_calculations": {
-            "instruction": "Write an analysis of applicable parking rates and calculations.",
-            "format": "Multiple paragraphs showing statutory requirements, calculations, and resulting parking numbers.",
-            "example": "According to Clause 52.06 of the Yarra Planning Scheme, the statutory parking requirement for the development is as follows:\n\n- Dwellings: 1 space per 1-2 bedroom dwelling (20 spaces) and 0.1 visitor spaces per dwelling (2 spaces)\n- Retail: 4 spaces per 100m² of leasable floor area (16 spaces)\n\nThis results in a total statutory requirement of 38 spaces (22 residential and 16 retail).",
-            "guidance": "Include the relevant planning scheme requirements, calculate the statutory requirement, and compare to the proposed provision."
-        },
-        
-        "parking_expected_patrons": {
-            "instruction": "Write an analysis of expected patron numbers and patterns.",
-            "format": "A paragraph estimating visitor numbers and their arrival/departure patterns.",
-            "example": "The retail tenancies are expected to generate approximately 100 customer visits per day, with peak activity occurring between 12pm and 2pm on weekdays and 10am to 4pm on weekends. The majority of customers (approximately 70%) are expected to arrive by foot or public transport, given the site's location within an established commercial strip and proximity to public transport.",
-            "guidance": "Include estimates of visitor numbers, peak times, and mode share assumptions."
-        },
-        
-        "parking_justification": {
-            "instruction": "Write a justification for the proposed parking provision.",
-            "format": "Multiple paragraphs providing rationale for the parking numbers with supporting evidence.",
-            "example": "The proposed parking provision of 30 spaces represents a shortfall of 8 spaces against the statutory requirement. However, this reduction is considered appropriate for the following reasons:\n\n1. The site has excellent access to public transport, with high-frequency bus services directly in front of the site and a train station within 500m.\n\n2. Recent parking surveys conducted in the area indicate that on-street parking utilization is typically below 70% during business hours, with approximately 20 spaces consistently available within 200m of the site.",
-            "guidance": "Provide a clear rationale for the proposed parking, especially if there's a shortfall against requirements. Include relevant factors like public transport accessibility, existing parking availability, and car ownership trends."
-        },
-        
-        "parking_design_dimensions": {
-            "instruction": "Write a description of parking space dimensions and layout.",
-            "format": "A technical paragraph detailing dimensions of parking spaces, aisles, and access ways.",
-            "example": "The proposed car park will provide standard parking spaces with dimensions of 2.6m x 4.9m, which complies with the minimum requirements. Accessible spaces will be 2.4m wide with an adjacent shared area of 2.4m, resulting in a total width of 4.8m. The central aisle width is 6.1m, allowing for efficient two-way traffic flow and complying with the minimum 6.0m requirement for two-way aisles.",
-            "guidance": "Include specific dimensions for spaces, aisles, ramps, headroom clearance, and other relevant measurements."
-        },
-        
-        "parking_design_compliance": {
-            "instruction": "Write an analysis of the parking design's compliance with standards.",
-            "format": "Multiple paragraphs assessing compliance with relevant design standards.",
-            "example": "The proposed car park layout has been assessed against the requirements of Clause 52.06-9 of the Planning Scheme and Australian Standard AS2890.1:2004, and is found to comply with these requirements in the following ways:\n\n1. All spaces meet or exceed the minimum dimensions of 2.6m x 4.9m for user class 1A (residents).\n\n2. The aisle width of 6.1m exceeds the minimum 5.8m required for 90-degree parking.\n\n3. The 1:5 gradient of the entry ramp transitions to 1:8 at the bottom, providing suitable transitions in accordance with AS2890.1.",
-            "guidance": "Reference specific standards (e.g., Planning Scheme clauses, Australian Standards) and assess compliance with each relevant requirement."
-        },
-        
-        "other_bicycle_parking": {
-            "instruction": "Write a description of bicycle parking requirements and provision.",
-            "format": "A paragraph detailing bicycle parking requirements, provision, and facilities.",
-            "example": "Under Clause 52.34 of the Planning Scheme, the development requires 4 resident bicycle spaces, 2 visitor bicycle spaces, and 1 employee bicycle space for the retail component. The proposal exceeds these requirements by providing 30 bicycle parking spaces in a secure room at ground level, comprising 25 resident spaces and 5 visitor/staff spaces. Additionally, 4 visitor bicycle hoops will be installed on the Smith Street frontage.",
-            "guidance": "Include statutory requirements, proposed provision, and details of bicycle parking facilities and access arrangements."
-        },
-        
-        "other_loading_waste": {
-            "instruction": "Write a description of loading and waste collection arrangements.",
-            "format": "A paragraph explaining loading zones and waste collection procedures.",
-            "example": "A dedicated loading bay (3.5m x 7.5m) will be provided adjacent to the retail tenancies, accessed from the rear laneway. This bay is designed to accommodate small to medium rigid vehicles (up to 6.4m in length) and will be available for deliveries between 7am and 7pm daily. Waste collection will occur from a designated collection point at the rear of the property, with bins being transported from the waste storage room to the collection area by the building manager on collection days.",
-            "guidance": "Include details about loading bay dimensions, types of vehicles accommodated, waste collection points, and management procedures."
-        },
-        
-        "other_traffic_generation": {
-            "instruction": "Write an analysis of expected traffic generation.",
-            "format": "Multiple paragraphs with traffic estimates, peak hour impacts, and distribution.",
-            "example": "The proposed development is expected to generate approximately 120 vehicle movements per day, comprising 80 movements from the residential component and 40 movements from the retail component. During the AM peak hour (8-9am), the development is expected to generate 12 movements (10 outbound, 2 inbound), while during the PM peak hour (5-6pm), it is expected to generate 15 movements (5 outbound, 10 inbound).\n\nBased on existing traffic patterns in the area, it is estimated that 60% of traffic will access the site from/to Smith Street, with the remaining 40% using Jones Road.",
-            "guidance": "Include daily traffic generation, peak hour movements (with directional split), and distribution patterns. Reference industry standards or databases used for estimates."
-        },
-        
-        "conclusion_summary": {
-            "instruction": "Write a conclusion summarizing the key findings of the Traffic Impact Assessment.",
-            "format": "A comprehensive paragraph summarizing findings and recommendations.",
-            "example": "Based on the assessment conducted, it is concluded that the proposed development can be accommodated within the existing road network without significant adverse impacts on traffic operation or safety. The proposed parking provision, while below the statutory requirement, is considered appropriate given the site's excellent access to public transport and the availability of on-street parking in the vicinity. The car park design complies with relevant standards, and appropriate arrangements have been made for loading, waste collection, and bicycle parking. It is recommended that a Green Travel Plan be implemented to further encourage sustainable transport modes among residents and staff.",
-            "guidance": "Summarize key findings regarding traffic impact, parking adequacy, compliance with standards, and any recommendations or mitigation measures."
-        }
-    }
+    return context_header
+
+def get_optimized_prompt(
+    section: str,
+    content: str,
+    related_sections: Optional[Dict[str, str]] = None,
+    **context
+) -> str:
+    """
+    Generate optimized prompts for each section of the TIA report.
     
-    # Get the appropriate prompt structure
-    prompt_structure = prompts.get(
-        section, 
-        {
-            "instruction": "Write a section for a Traffic Impact Assessment report.",
-            "format": "A well-structured paragraph providing professional analysis.",
-            "example": "This section should contain technical information relevant to the traffic assessment.",
-            "guidance": "Include relevant technical details and professional analysis."
-        }
-    )
+    Args:
+        section: The section identifier
+        content: The user input content for this section
+        related_sections: Already generated sections this one builds on
+        context: Additional context like project_title, site_address, etc.
     
-    # Construct the optimized prompt
-    prompt = context_header
-    prompt += f"TASK: {prompt_structure['instruction']}\n\n"
-    prompt += f"EXPECTED FORMAT: {prompt_structure['format']}\n\n"
-    prompt += f"CONTENT TO EXPAND: {content}\n\n"
-    prompt += f"GUIDANCE: {prompt_structure['guidance']}\n\n"
+    Returns:
+        An optimized prompt designed for this specific section
+    """
+    prompt_structure = get_prompt_structure(section)
     
-    # Add example if helpful (only for empty or very short inputs)
+    # Static instructions first (shared prefix across projects), then the
+    # example if helpful (only for empty or very short inputs), and the
+    # project-specific context and content last
     if not content or len(content) < 20:
-        prompt += f"EXAMPLE: {prompt_structure['example']}\n\n"
+        prompt = prompt_structure["prefix_with_example"]
+    else:
+        prompt = prompt_structure["prefix"]
+    
+    prompt += get_context_header(**context)
+    
+    if related_sections:
+        prompt += "RELATED SECTIONS ALREADY WRITTEN (stay consistent with these):\n"
+        for related, text in related_sections.items():
+            prompt += f"[{related}]\n{text}\n\n"
+    
+    prompt += f"CONTENT TO EXPAND: {content}"
+    
+    return prompt
+
+def get_continuation_prompt() -> str:
+    """
+    Get the follow-up instruction used when a section was cut off by the token limit.
+    """
+    return "Your previous response was cut off. Continue exactly where it stopped, without repeating any text or adding a preamble."
+
+def get_batched_system_prompt() -> str:
+    """
+    Get the system prompt for generating several sections in one request.
+    """
+    return f"{_BASE_SYSTEM_PROMPT}\n" + "You are generating several short sections of a Traffic Impact Assessment report at once and reply only with a JSON object."
+
+def get_batched_prompt(sections: Dict[str, str], **context) -> str:
+    """
+    Generate a prompt that asks for several sections in one structured (JSON) response.
+    
+    Args:
+        sections: Mapping of section identifier to user input content
+        context: Additional context like project_title, site_address, etc.
+    
+    Returns:
+        A prompt whose expected answer is a JSON object keyed by section identifier
+    """
+    # Static instructions first, project-specific context and content last
+    prompt = "Write each of the following sections.\n\n"
+    
+    for section in sections:
+        prompt_structure = get_prompt_structure(section)
+        prompt += f'SECTION "{section}":\n'
+        prompt += f"TASK: {prompt_structure['instruction']}\n"
+        prompt += f"EXPECTED FORMAT: {prompt_structure['format']}\n"
+        prompt += f"GUIDANCE: {prompt_structure['guidance']}\n\n"
+    
+    keys = ", ".join(f'"{section}"' for section in sections)
+    prompt += (
+        f"Respond with a single JSON object whose keys are exactly {keys}. "
+        "Each value must be a string containing only the formatted text for that section "
+        "with no additional explanations or metadata.\n\n"
+    )
     
-    prompt += "Your response should contain only the formatted text for this section with no additional explanations or metadata."
+    prompt += get_context_header(**context)
+    for section, content in sections.items():
+        prompt += f'CONTENT TO EXPAND FOR "{section}": {content}\n'
     
-    return prompt
\ No newline at end of file
+    return prompt
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Per-model RPM/TPM rate limiting for TIA Generator.
+Token buckets live in Redis so every API worker and RQ process shares one
+budget per model; an in-process bucket is used when Redis is unavailable.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, Tuple
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+from model_selection import DEFAULT_MODEL, FAST_MODEL, HIGH_QUALITY_MODEL
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.ratelimit")
+
+# Account limits per model (requests and tokens per minute); 0 means no limit
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+OPENAI_FAST_RPM = int(os.getenv("OPENAI_FAST_RPM", "500"))
+OPENAI_FAST_TPM = int(os.getenv("OPENAI_FAST_TPM", "200000"))
+# Longest single sleep while waiting for budget, so waits re-check often
+RATE_LIMIT_MAX_SLEEP = float(os.getenv("RATE_LIMIT_MAX_SLEEP", "2.0"))
+# Rough characters per token used to estimate prompt size before the call
+CHARS_PER_TOKEN = 4
+
+def _load_rate_limits() -> Dict[str, Tuple[int, int]]:
+    """Build the per-model (rpm, tpm) table, applying OPENAI_RATE_LIMITS (JSON) overrides"""
+    limits = {
+        FAST_MODEL: (OPENAI_FAST_RPM, OPENAI_FAST_TPM),
+        DEFAULT_MODEL: (OPENAI_RPM, OPENAI_TPM),
+        HIGH_QUALITY_MODEL: (OPENAI_RPM, OPENAI_TPM),
+    }
+
+    overrides = os.getenv("OPENAI_RATE_LIMITS")
+    if overrides:
+        try:
+            for model, limit in json.loads(overrides).items():
+                limits[model] = (int(limit["rpm"]), int(limit["tpm"]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Invalid OPENAI_RATE_LIMITS, using defaults: {str(e)}")
+
+    return limits
+
+RATE_LIMITS = _load_rate_limits()
+
+def estimate_tokens(messages, max_tokens: int) -> int:
+    """Estimate the tokens a call will count against TPM (prompt + completion ceiling)"""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + max_tokens
+
+
+class TokenBucket:
+    """In-process token bucket used when Redis is unavailable (capacity 0: no limit)"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until cost can be paid (0 if it can be paid now)"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.refill_per_second
+
+    def consume(self, cost: float):
+        if self.capacity > 0:
+            self.tokens -= min(cost, self.capacity)
+
+
+class ModelRateLimiter:
+    """Waits for per-model RPM and TPM budget before each API call"""
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._local_buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._stats = defaultdict(lambda: {"acquired": 0, "waits": 0, "wait_time": 0.0, "local": 0, "denied": 0})
+
+    def configure(self, cache):
+        """Share budgets through a RedisCache (call once the cache is initialized)"""
+        self.cache = cache
+
+    def get_limits(self, model: str) -> Tuple[int, int]:
+        """Get (rpm, tpm) for a model"""
+        return RATE_LIMITS.get(model, (OPENAI_RPM, OPENAI_TPM))
+
+    def _local_wait(self, model: str, tokens: int) -> float:
+        if model not in self._local_buckets:
+            rpm, tpm = self.get_limits(model)
+            self._local_buckets[model] = (TokenBucket(rpm, rpm / 60), TokenBucket(tpm, tpm / 60))
+
+        request_bucket, token_bucket = self._local_buckets[model]
+        wait = max(request_bucket.wait_time(1), token_bucket.wait_time(tokens))
+        if wait == 0:
+            request_bucket.consume(1)
+            token_bucket.consume(tokens)
+        return wait
+
+    async def _try_acquire(self, model: str, tokens: int) -> float:
+        """Try once; returns seconds to wait (0 if budget was taken)"""
+        wait = None
+        if self.cache:
+            rpm, tpm = self.get_limits(model)
+            wait = await self.cache.acquire_rate_budget(model, rpm, tpm, tokens)
+
+        if wait is None:
+            self._stats[model]["local"] += 1
+            wait = self._local_wait(model, tokens)
+
+        return wait
+
+    async def acquire(self, model: str, tokens: int):
+        """Wait until the model has budget for one request of `tokens` tokens"""
+        started = time.time()
+        waited = False
+
+        while True:
+            wait = await self._try_acquire(model, tokens)
+            if wait <= 0:
+                break
+            waited = True
+            # Jitter so workers waiting on the same bucket don't retry in lockstep
+            await asyncio.sleep(min(wait, RATE_LIMIT_MAX_SLEEP) * random.uniform(1.0, 1.2))
+
+        stats = self._stats[model]
+        stats["acquired"] += 1
+        if waited:
+            stats["waits"] += 1
+            stats["wait_time"] += time.time() - started
+            logger.info(f"Waited {time.time() - started:.2f}s for {model} rate limit budget")
+
+    async def try_acquire(self, model: str, tokens: int) -> bool:
+        """Take budget only if it is available right now"""
+        if await self._try_acquire(model, tokens) <= 0:
+            self._stats[model]["acquired"] += 1
+            return True
+        self._stats[model]["denied"] += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get rate limiter metrics per model"""
+        stats = {"backend": "redis" if self.cache and self.cache.redis else "local", "models": {}}
+        for model, model_stats in self._stats.items():
+            rpm, tpm = self.get_limits(model)
+            stats["models"][model] = dict(model_stats, rpm=rpm, tpm=tpm)
+        return stats
+
+
+# Shared limiter for this process
+rate_limiter = ModelRateLimiter()
+metrics.register_metrics_provider("rate_limits", rate_limiter.get_stats)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Managed Redis connection pool for TIA Generator.
+One bounded, instrumented pool per process: callers wait (up to a timeout)
+for a free connection instead of opening more, idle connections are checked
+before reuse, and time spent waiting for a connection is recorded so pool
+saturation shows up in /metrics rather than as unexplained latency.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, Set
+from collections import deque
+
+import redis.asyncio as redis
+from redis.asyncio.connection import BlockingConnectionPool
+from redis.asyncio.retry import Retry
+from redis.backoff import EqualJitterBackoff
+from redis.exceptions import ConnectionError
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.redis-pool")
+
+# Pool size, and how long a command waits for a free connection before failing
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+# Connections idle longer than this (seconds) are pinged before reuse
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# Period of the background PING that detects a dead or restarted server
+REDIS_HEALTH_CHECK_PERIOD = float(os.getenv("REDIS_HEALTH_CHECK_PERIOD", "10"))
+# Retries of a command that hit a connection error, with jittered backoff (seconds)
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES", "2"))
+REDIS_BACKOFF_BASE = float(os.getenv("REDIS_BACKOFF_BASE", "0.05"))
+REDIS_BACKOFF_CAP = float(os.getenv("REDIS_BACKOFF_CAP", "1"))
+# Messages buffered per local subscriber of the shared pubsub before the oldest are dropped
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "1000"))
+# Seconds the shared pubsub reader waits for a message before polling again
+PUBSUB_POLL_TIMEOUT = 30.0
+
+
+def normalize_redis_url(url: str) -> str:
+    """Add the redis:// scheme if it was left out (e.g. "redis:6379")"""
+    if url and not url.startswith(("redis://", "rediss://", "unix://")):
+        return "redis://" + url
+    return url
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with equal jitter: between half and all of
+    min(cap, base * 2**attempt), so workers retrying together spread out.
+    """
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """BlockingConnectionPool recording how long callers wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_times = deque(maxlen=1000)
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.exhausted = 0
+
+    async def get_connection(self, command_name, *keys, **options):
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except ConnectionError as e:
+            # Raised (from a TimeoutError) when no connection freed up in time
+            if isinstance(e.__cause__, asyncio.TimeoutError):
+                self.exhausted += 1
+            raise
+        finally:
+            self.waiting -= 1
+            self.wait_times.append(time.perf_counter() - start)
+
+        self.acquired += 1
+        self.peak_in_use = max(self.peak_in_use, len(self._in_use_connections))
+        return connection
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool occupancy and connection wait times (ms)"""
+        in_use = len(self._in_use_connections)
+        return {
+            "max_connections": self.max_connections,
+            "in_use": in_use,
+            "idle": len(self._available_connections),
+            "peak_in_use": self.peak_in_use,
+            "utilisation": in_use / self.max_connections if self.max_connections > 0 else 0,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "exhausted": self.exhausted,
+            "wait_ms": metrics.calculate_stats([wait * 1000 for wait in self.wait_times])
+        }
+
+
+class SharedPubSub:
+    """
+    One pubsub connection for every subscriber in the process. A channel is
+    subscribed while at least one local subscriber wants it, and each message
+    is copied to the queue of every subscriber of its channel, so waiters
+    don't each hold a pool connection.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self._client = client
+        self._pubsub = None
+        self._reader = None
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+        self.delivered = 0
+        self.dropped = 0
+
+    async def subscribe(self, channel: str) -> asyncio.Queue:
+        """Get a queue receiving the data of each message published on channel"""
+        queue = asyncio.Queue(maxsize=PUBSUB_QUEUE_SIZE)
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self._client.pubsub()
+            if channel not in self._queues:
+                await self._pubsub.subscribe(channel)
+                self._queues[channel] = set()
+            self._queues[channel].add(queue)
+            if self._reader is None:
+                self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, queue: asyncio.Queue, channel: str):
+        """Stop delivering channel to a queue from subscribe()"""
+        async with self._lock:
+            listeners = self._queues.get(channel)
+            if listeners is None:
+                return
+            listeners.discard(queue)
+            if not listeners:
+                del self._queues[channel]
+                await self._pubsub.unsubscribe(channel)
+
+    async def _read(self):
+        """Fan messages out to local subscribers until cancelled"""
+        attempt = 0
+        while True:
+            try:
+                # Poll with an explicit timeout: a quiet channel is normal, not a
+                # socket timeout. The connection resubscribes itself after a drop
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=PUBSUB_POLL_TIMEOUT)
+                attempt = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shared pubsub read failed: {str(e)}")
+                await asyncio.sleep(backoff_delay(attempt, 1, 30))
+                attempt += 1
+                continue
+
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            for queue in self._queues.get(channel, ()):
+                if queue.full():
+                    # A subscriber that stopped reading loses its oldest messages
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(message["data"])
+                self.delivered += 1
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+            # Let the reader stop before its connection goes
+            await asyncio.wait({self._reader}, timeout=1)
+            self._reader = None
+        if self._pubsub:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+        self._queues.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get channel and subscriber counts"""
+        return {
+            "channels": len(self._queues),
+            "subscribers": sum(len(listeners) for listeners in self._queues.values()),
+            "delivered": self.delivered,
+            "dropped": self.dropped
+        }
+
+
+def build_client(url: str) -> redis.Redis:
+    """Create a client owning a new managed pool. Responses stay bytes."""
+    pool = InstrumentedConnectionPool.from_url(
+        url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        # Only connection errors are retried; a timed-out command may have run
+        retry=Retry(EqualJitterBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES, supported_errors=(ConnectionError,)),
+        decode_responses=False
+    )
+    logger.info(f"Created Redis connection pool (max_connections={REDIS_MAX_CONNECTIONS}, timeout={REDIS_POOL_TIMEOUT}s)")
+    return redis.Redis.from_pool(pool)
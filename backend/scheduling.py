@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Cross-job fair scheduling for TIA Generator.
+Calls waiting for an API slot are served interactive-before-bulk, and within
+a class by weighted fair queuing across tenants (each tenant's share split
+evenly between its jobs), so one burst of submissions can't starve others.
+"""
+
+import os
+import json
+import time
+import heapq
+import itertools
+import logging
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+from concurrency import request_priority
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.scheduling")
+
+# Priority classes, served in this order
+INTERACTIVE = "interactive"
+BULK = "bulk"
+WORK_CLASSES = (INTERACTIVE, BULK)
+
+DEFAULT_TENANT = "default"
+# Tenants whose stats are kept (tenant ids come from a client header); the
+# least recently served are dropped first
+SCHEDULER_MAX_TRACKED_TENANTS = int(os.getenv("SCHEDULER_MAX_TRACKED_TENANTS", "100"))
+
+def _load_tenant_weights() -> Dict[str, float]:
+    """Get per-tenant weights from TENANT_WEIGHTS (JSON); unlisted tenants weigh 1"""
+    value = os.getenv("TENANT_WEIGHTS")
+    if not value:
+        return {}
+    try:
+        return {tenant: float(weight) for tenant, weight in json.loads(value).items()}
+    except (ValueError, AttributeError) as e:
+        logger.error(f"Invalid TENANT_WEIGHTS, ignoring: {str(e)}")
+        return {}
+
+TENANT_WEIGHTS = _load_tenant_weights()
+
+# (tenant, job_id, work class) of the work running in the current task
+work_context: ContextVar[Tuple[str, str, str]] = ContextVar(
+    "work_context", default=(DEFAULT_TENANT, "", INTERACTIVE)
+)
+
+
+def set_work_context(tenant: Optional[str], job_id: str, work_class: Optional[str] = None):
+    """Tag calls made from the current task with their tenant, job and class"""
+    if work_class not in WORK_CLASSES:
+        work_class = INTERACTIVE
+    work_context.set((tenant or DEFAULT_TENANT, job_id, work_class))
+
+
+class FairQueue:
+    """
+    Wait queue for AdaptiveConcurrencyLimiter implementing start-time fair
+    queuing. Each (tenant, job) is a flow with weight tenant_weight / the
+    tenant's backlogged jobs; the flow with the smallest virtual finish tag
+    is served next, and within a flow waiters go by request_priority.
+    """
+
+    def __init__(
+        self,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        max_tracked_tenants: int = SCHEDULER_MAX_TRACKED_TENANTS
+    ):
+        self.tenant_weights = TENANT_WEIGHTS if tenant_weights is None else tenant_weights
+        self.max_tracked_tenants = max_tracked_tenants
+        self._sequence = itertools.count()
+        # Per class: flow key -> heap of (priority, sequence, waiter, enqueued_at)
+        self._flows = {work_class: {} for work_class in WORK_CLASSES}
+        # Per class virtual time, last finish tag per flow, and the start tag of
+        # each backlogged flow's next waiter (fixed when it reaches the head, so
+        # a light flow's place doesn't recede while heavier flows are served)
+        self._virtual_time = {work_class: 0.0 for work_class in WORK_CLASSES}
+        self._finish_tags = {work_class: {} for work_class in WORK_CLASSES}
+        self._start_tags = {work_class: {} for work_class in WORK_CLASSES}
+        # Where each queued waiter lives, for removal on cancellation
+        self._locations = {}
+        self._size = 0
+
+        # Stats per tenant: tenant -> {"served", "wait_times"}, least recently served first
+        self._tenant_stats = OrderedDict()
+        self._untracked_tenants = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _flow_weight(self, work_class: str, flow: Tuple[str, str]) -> float:
+        tenant = flow[0]
+        tenant_jobs = sum(1 for other in self._flows[work_class] if other[0] == tenant)
+        return self.tenant_weights.get(tenant, 1.0) / max(tenant_jobs, 1)
+
+    def push(self, waiter):
+        tenant, job_id, work_class = work_context.get()
+        flow = (tenant, job_id)
+        entry = (request_priority.get(), next(self._sequence), waiter, time.monotonic())
+        if flow not in self._flows[work_class]:
+            self._start_tags[work_class][flow] = max(
+                self._virtual_time[work_class], self._finish_tags[work_class].get(flow, 0.0)
+            )
+        heapq.heappush(self._flows[work_class].setdefault(flow, []), entry)
+        self._locations[waiter] = (work_class, flow, entry)
+        self._size += 1
+
+    def pop(self):
+        for work_class in WORK_CLASSES:
+            flows = self._flows[work_class]
+            if not flows:
+                continue
+
+            start_tags = self._start_tags[work_class]
+            best = None
+            for flow in flows:
+                start = start_tags[flow]
+                finish = start + 1.0 / self._flow_weight(work_class, flow)
+                # Ties go to the longest waiting head
+                key = (finish, flows[flow][0][1])
+                if best is None or key < best[3]:
+                    best = (flow, start, finish, key)
+
+            flow, start, finish, _ = best
+            self._virtual_time[work_class] = start
+            # Re-insert so tags stay in least recently served order
+            self._finish_tags[work_class].pop(flow, None)
+            self._finish_tags[work_class][flow] = finish
+            # The flow's next waiter starts where this one finishes
+            start_tags[flow] = finish
+
+            _, _, waiter, enqueued_at = heapq.heappop(flows[flow])
+            self._forget(waiter, work_class, flow)
+
+            self._record_served(flow[0], time.monotonic() - enqueued_at)
+            return waiter
+
+        raise IndexError("pop from empty FairQueue")
+
+    def discard(self, waiter):
+        """Remove a waiter if it is still queued"""
+        if waiter not in self._locations:
+            return
+        work_class, flow, entry = self._locations[waiter]
+        queue = self._flows[work_class][flow]
+        queue.remove(entry)
+        heapq.heapify(queue)
+        self._forget(waiter, work_class, flow)
+
+    def _forget(self, waiter, work_class: str, flow: Tuple[str, str]):
+        del self._locations[waiter]
+        self._size -= 1
+        if not self._flows[work_class][flow]:
+            del self._flows[work_class][flow]
+            del self._start_tags[work_class][flow]
+        if not self._flows[work_class]:
+            # Idle class: restart virtual time so old tags don't linger
+            self._virtual_time[work_class] = 0.0
+            self._finish_tags[work_class].clear()
+        elif len(self._finish_tags[work_class]) > 2 * len(self._flows[work_class]) + 100:
+            # Busy class: drop tags of idle flows that no longer affect their start
+            # time (at or below virtual time), then the least recently served, so
+            # finished jobs don't accumulate. A job whose tag was dropped only
+            # gains one turn if it comes back
+            virtual_time = self._virtual_time[work_class]
+            flows = self._flows[work_class]
+            tags = {
+                other: tag for other, tag in self._finish_tags[work_class].items()
+                if tag > virtual_time or other in flows
+            }
+            idle = [other for other in tags if other not in flows]
+            for other in idle[:max(0, len(tags) - len(flows) - 100)]:
+                del tags[other]
+            self._finish_tags[work_class] = tags
+
+    def _record_served(self, tenant: str, wait_time: float):
+        stats = self._tenant_stats.get(tenant)
+        if stats is None:
+            stats = self._tenant_stats[tenant] = {"served": 0, "wait_times": deque(maxlen=1000)}
+            while len(self._tenant_stats) > self.max_tracked_tenants:
+                self._tenant_stats.popitem(last=False)
+                self._untracked_tenants += 1
+        else:
+            self._tenant_stats.move_to_end(tenant)
+        stats["served"] += 1
+        stats["wait_times"].append(wait_time)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and wait times per tenant and class"""
+        tenants = {}
+        for tenant in set(self._tenant_stats) | {flow[0] for flows in self._flows.values() for flow in flows}:
+            stats = self._tenant_stats.get(tenant, {"served": 0, "wait_times": ()})
+            tenants[tenant] = {
+                "weight": self.tenant_weights.get(tenant, 1.0),
+                "queue_depth": sum(
+                    len(queue) for flows in self._flows.values()
+                    for flow, queue in flows.items() if flow[0] == tenant
+                ),
+                "served": stats["served"],
+                "wait_time": metrics.calculate_stats(list(stats["wait_times"]))
+            }
+
+        return {
+            "queue_depth": self._size,
+            "classes": {
+                work_class: {
+                    "queue_depth": sum(len(queue) for queue in self._flows[work_class].values()),
+                    "jobs": len(self._flows[work_class])
+                }
+                for work_class in WORK_CLASSES
+            },
+            "tenants": tenants,
+            # Tenants whose stats were dropped to stay within max_tracked_tenants
+            "untracked_tenants": self._untracked_tenants
+        }
+
+
+# Shared scheduler queue for this process
+fair_queue = FairQueue()
+metrics.register_metrics_provider("scheduler", fair_queue.get_stats)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Dependency-driven section scheduling for TIA Generator.
+Every section whose inputs are ready starts at once; sections that build
+on other generated sections start as soon as those complete. Priority only
+orders calls that have to queue for the concurrency limiter.
+"""
+
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List, Tuple, Set, Callable, Awaitable, Optional
+
+from dotenv import load_dotenv
+
+from concurrency import request_priority
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.scheduler")
+
+# Sections whose prompt includes other generated sections
+DEFAULT_SECTION_DEPENDENCIES = {
+    "conclusion_summary": [
+        "other_traffic_generation",
+        "parking_justification",
+        "parking_design_compliance",
+    ],
+}
+
+def _load_section_dependencies() -> Dict[str, List[str]]:
+    """Get the dependency table, replaced by SECTION_DEPENDENCIES (JSON) if set"""
+    value = os.getenv("SECTION_DEPENDENCIES")
+    if not value:
+        return DEFAULT_SECTION_DEPENDENCIES
+    try:
+        return json.loads(value)
+    except ValueError as e:
+        logger.error(f"Invalid SECTION_DEPENDENCIES, using defaults: {str(e)}")
+        return DEFAULT_SECTION_DEPENDENCIES
+
+SECTION_DEPENDENCIES = _load_section_dependencies()
+
+# Text a section is given when its generation failed
+GENERATION_ERROR_PREFIX = "Error generating content"
+
+
+def get_section_dependencies(section: str) -> List[str]:
+    """Get the sections whose generated text a section builds on"""
+    return SECTION_DEPENDENCIES.get(section, [])
+
+
+def generation_error(error: str) -> str:
+    """Section text standing in for a failed generation"""
+    return f"{GENERATION_ERROR_PREFIX}: {error}"
+
+
+def is_generation_error(content: Optional[str]) -> bool:
+    """Whether section text is a failed generation rather than generated content"""
+    return bool(content) and content.startswith(GENERATION_ERROR_PREFIX)
+
+
+async def run_section_graph(
+    units: List[List[str]],
+    run_unit: Callable[[List[str], Dict[str, str], Set[str]], Awaitable[List[Tuple[str, str]]]],
+    priorities: Dict[str, int],
+    on_complete: Optional[Callable[[str, str], Awaitable[None]]] = None
+) -> Dict[str, str]:
+    """
+    Run work units (lists of sections generated together) as a dependency graph.
+
+    Args:
+        units: Work units, e.g. from plan_section_batches
+        run_unit: Generates a unit given the generated text of its dependencies
+            and the set of dependencies that failed (left out of that text)
+        priorities: Section priorities (lower first) used to order queued calls
+        on_complete: Called with each section as soon as it is generated
+
+    Returns:
+        Generated text for every section
+    """
+    scheduled = {section for unit in units for section in unit}
+    results: Dict[str, str] = {}
+    done_sections: Set[str] = set()
+
+    def unit_dependencies(unit: List[str]) -> Set[str]:
+        # Dependencies outside this report (e.g. empty sections) are already satisfied
+        deps = {dep for section in unit for dep in get_section_dependencies(section)}
+        return (deps & scheduled) - set(unit)
+
+    waiting = {index: unit_dependencies(unit) for index, unit in enumerate(units)}
+    running: Dict[asyncio.Task, int] = {}
+
+    async def run_with_priority(unit: List[str], inputs: Dict[str, str], failed: Set[str]) -> List[Tuple[str, str]]:
+        # Each task has its own context, so the priority applies to this unit's calls only
+        request_priority.set(min(priorities.get(section, 999) for section in unit))
+        return await run_unit(unit, inputs, failed)
+
+    def start(index: int):
+        unit = units[index]
+        deps = waiting.pop(index)
+        # An error message is not content to build on
+        failed = {dep for dep in deps if is_generation_error(results.get(dep))}
+        inputs = {dep: results[dep] for dep in deps - failed if results.get(dep)}
+        if failed:
+            logger.warning(f"Generating {unit} without failed dependencies {sorted(failed)}")
+        running[asyncio.create_task(run_with_priority(unit, inputs, failed))] = index
+
+    def start_ready():
+        for index in sorted(waiting, key=lambda i: min(priorities.get(s, 999) for s in units[i])):
+            if waiting[index] <= done_sections:
+                start(index)
+
+        if not running and waiting:
+            # Only a dependency cycle can leave nothing runnable; run the rest without inputs
+            logger.warning(f"Section dependency cycle among {[units[i] for i in waiting]}, ignoring dependencies")
+            for index in list(waiting):
+                waiting[index] = set()
+                start(index)
+
+    try:
+        start_ready()
+        while running:
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                index = running.pop(task)
+                for section, content in task.result():
+                    results[section] = content
+                    if on_complete and section and content:
+                        await on_complete(section, content)
+                done_sections.update(units[index])
+            start_ready()
+    finally:
+        for task in running:
+            task.cancel()
+
+    return results
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate section lookup for TIA Generator.
+Section inputs are reduced to MinHash signatures and indexed in Redis with
+LSH buckets, scoped by section and development type, so an input that only
+differs slightly from one already generated (punctuation, a changed name,
+edited boilerplate) can reuse its output. Everything is computed locally.
+"""
+
+import os
+import re
+import random
+import hashlib
+import logging
+from array import array
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Tuple
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.similarity")
+
+# "off", "shadow" (look up and record matches, but still generate) or "reuse"
+SIMILARITY_MODE = os.getenv("SIMILARITY_MODE", "shadow").lower()
+# Minimum estimated Jaccard similarity of input shingles to count as a match
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))
+# LSH layout: BANDS * ROWS MinHash permutations. 8 x 8 finds ~99% of pairs at
+# 0.9 similarity while ~3% of pairs at 0.5 become (verified, then discarded) candidates
+SIMILARITY_BANDS = int(os.getenv("SIMILARITY_BANDS", "8"))
+SIMILARITY_ROWS = int(os.getenv("SIMILARITY_ROWS", "8"))
+# Words per shingle
+SIMILARITY_SHINGLE_SIZE = int(os.getenv("SIMILARITY_SHINGLE_SIZE", "3"))
+# Inputs shorter than this carry too little signal to match on
+SIMILARITY_MIN_WORDS = int(os.getenv("SIMILARITY_MIN_WORDS", "12"))
+# Most candidates verified per lookup
+SIMILARITY_MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "50"))
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x7141)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(SIMILARITY_BANDS * SIMILARITY_ROWS)
+]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and reduce to words, so formatting and punctuation don't matter"""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _shingles(words: List[str]) -> set:
+    size = SIMILARITY_SHINGLE_SIZE
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+@lru_cache(maxsize=1024)
+def minhash_signature(normalized: str) -> Tuple[int, ...]:
+    """MinHash signature of a normalized text's word shingles"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in _shingles(normalized.split())
+    ]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def band_hashes(signature: Tuple[int, ...]) -> List[str]:
+    """One bucket id per band of rows; texts sharing any bucket are candidates"""
+    rows = SIMILARITY_ROWS
+    return [
+        f"{band}:{hashlib.blake2b(array('Q', signature[band * rows:(band + 1) * rows]).tobytes(), digest_size=8).hexdigest()}"
+        for band in range(SIMILARITY_BANDS)
+    ]
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity from two signatures"""
+    if len(a) != len(b) or not a:
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _scope(section: str, project_context: Dict[str, str]) -> str:
+    development_type = normalize_text(project_context.get("_development_type", "")) or "unknown"
+    return f"{section}:{development_type.replace(' ', '_')}"
+
+
+class SimilarityIndex:
+    """LSH index of generated sections' inputs, stored through RedisCache"""
+
+    def __init__(self, mode: str = SIMILARITY_MODE, threshold: float = SIMILARITY_THRESHOLD):
+        self.mode = mode
+        self.threshold = threshold
+        self._stats = defaultdict(lambda: {"lookups": 0, "matches": 0, "reused": 0})
+        self._similarities = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("shadow", "reuse")
+
+    def _signature(self, content: str) -> Optional[Tuple[int, ...]]:
+        normalized = normalize_text(content)
+        if len(normalized.split()) < SIMILARITY_MIN_WORDS:
+            return None
+        return minhash_signature(normalized)
+
+    async def add(self, redis_cache, section: str, content: str, project_context: Dict[str, str], cache_key: str):
+        """Index a generated section's input under its cache key"""
+        if not self.enabled or not redis_cache:
+            return
+        signature = self._signature(content)
+        if signature is None:
+            return
+        await redis_cache.add_similarity_entry(
+            _scope(section, project_context),
+            band_hashes(signature),
+            cache_key,
+            array("Q", signature).tobytes()
+        )
+
+    async def find(
+        self,
+        redis_cache,
+        section: str,
+        content: str,
+        project_context: Dict[str, str]
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Find the indexed input most similar to content, at or above the threshold.
+        Returns (cache_key, estimated similarity), or None.
+        """
+        if not self.enabled or not redis_cache:
+            return None
+        signature = self._signature(content)
+        if signature is None:
+            return None
+
+        self._stats[section]["lookups"] += 1
+        candidates = await redis_cache.find_similarity_candidates(
+            _scope(section, project_context),
+            band_hashes(signature),
+            SIMILARITY_MAX_CANDIDATES
+        )
+
+        best = None
+        for cache_key, packed in candidates.items():
+            similarity = estimate_similarity(signature, tuple(array("Q", packed)))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (cache_key, similarity)
+
+        if best:
+            self._stats[section]["matches"] += 1
+            self._similarities.append(best[1])
+            self._similarities = self._similarities[-1000:]
+        return best
+
+    async def find_reusable(
+        self,
+        redis_cache,
+        section: str,
+        content: str,
+        project_context: Dict[str, str]
+    ) -> Optional[str]:
+        """
+        Get the cached output of a near-duplicate input, if reuse is enabled.
+        In shadow mode matches are only recorded.
+        """
+        match = await self.find(redis_cache, section, content, project_context)
+        if not match:
+            return None
+
+        cache_key, similarity = match
+        if self.mode != "reuse":
+            logger.info(f"Near-duplicate input for section {section} (similarity {similarity:.2f}), not reusing in {self.mode} mode")
+            return None
+
+        cached = await redis_cache.get_section(section, cache_key)
+        if cached:
+            logger.info(f"Reusing near-duplicate section {section} (similarity {similarity:.2f})")
+            self._stats[section]["reused"] += 1
+        return cached
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get near-duplicate lookup metrics (separate from exact cache hits)"""
+        totals = {
+            key: sum(stats[key] for stats in self._stats.values())
+            for key in ("lookups", "matches", "reused")
+        }
+        return {
+            "mode": self.mode,
+            "threshold": self.threshold,
+            **totals,
+            "match_rate": totals["matches"] / totals["lookups"] if totals["lookups"] else 0,
+            "similarity": metrics.calculate_stats(self._similarities),
+            "sections": {section: dict(stats) for section, stats in self._stats.items()}
+        }
+
+
+# Shared index for this process
+similarity_index = SimilarityIndex()
+metrics.register_metrics_provider("similarity", similarity_index.get_stats)
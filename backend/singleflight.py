@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Single-flight deduplication for TIA Generator.
+Identical generations that are already running are joined rather than
+repeated: in-process through a shared future, across workers through a
+Redis lock whose release is announced over pubsub.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.singleflight")
+
+# Single-flight settings
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "true").lower() == "true"
+# Lock expiry, so a crashed worker can't block a key forever
+SINGLEFLIGHT_LOCK_TTL = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", "600"))
+# Longest a caller waits on another worker before generating itself
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "120"))
+# How often a waiter re-checks in case a release message was missed
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "1.0"))
+
+
+class _OwnerCancelled(Exception):
+    """Handed to joiners when the caller running the work was cancelled"""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution"""
+
+    def __init__(self, kind: str, enabled: bool = SINGLEFLIGHT):
+        self.kind = kind
+        self.enabled = enabled
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._stats = {"executed": 0, "joined_local": 0, "joined_remote": 0, "wait_timeouts": 0}
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        redis_cache = None,
+        fetch_result: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        """
+        Run fn() once per key across concurrent callers.
+
+        Args:
+            key: Identity of the work (e.g. a section cache key)
+            fn: Performs the work
+            redis_cache: Enables coalescing across workers when given
+            fetch_result: Reads the result another worker stored (e.g. from
+                cache), returning None while it is not available
+        """
+        if not self.enabled:
+            return await fn()
+
+        while key in self._calls:
+            self._stats["joined_local"] += 1
+            try:
+                return await asyncio.shield(self._calls[key])
+            except _OwnerCancelled:
+                # The caller running it went away; the first joiner to wake takes over
+                pass
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await self._run_once(key, fn, redis_cache, fetch_result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            # Joiners retry rather than inherit this caller's cancellation
+            future.set_exception(_OwnerCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            # Mark retrieved so a future nobody joined doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+
+    async def _run_once(self, key, fn, redis_cache, fetch_result) -> Any:
+        if not redis_cache or not fetch_result:
+            self._stats["executed"] += 1
+            return await fn()
+
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + SINGLEFLIGHT_WAIT_TIMEOUT
+
+        while True:
+            holder = await redis_cache.acquire_inflight(self.kind, key, owner, SINGLEFLIGHT_LOCK_TTL)
+            if holder is None:
+                try:
+                    self._stats["executed"] += 1
+                    return await fn()
+                finally:
+                    await redis_cache.release_inflight(self.kind, key, owner)
+
+            # Another worker is generating this; wait for it to finish
+            logger.info(f"Waiting on in-flight {self.kind} {key} held by {holder}")
+            result = await self._wait_for_holder(key, redis_cache, fetch_result, deadline)
+            if result is not None:
+                self._stats["joined_remote"] += 1
+                return result
+
+            if time.monotonic() >= deadline:
+                self._stats["wait_timeouts"] += 1
+                logger.warning(f"Timed out waiting on in-flight {self.kind} {key}, generating locally")
+                self._stats["executed"] += 1
+                return await fn()
+            # Holder released without a stored result (e.g. it failed): try to take over
+
+    async def _wait_for_holder(self, key, redis_cache, fetch_result, deadline) -> Any:
+        channel = f"tia_inflight:{self.kind}:{key}"
+        # Release messages arrive over the process's shared pubsub connection
+        released = await redis_cache.subscribe(channel)
+        try:
+            while time.monotonic() < deadline:
+                result = await fetch_result()
+                if result is not None:
+                    return result
+                if not await redis_cache.get_inflight(self.kind, key):
+                    # Released; give a result stored just before the release one last look
+                    return await fetch_result()
+
+                if released:
+                    try:
+                        await asyncio.wait_for(released.get(), SINGLEFLIGHT_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+            return None
+        finally:
+            await redis_cache.unsubscribe(released, channel)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing metrics"""
+        return {"enabled": self.enabled, "in_flight": len(self._calls), **self._stats}
+
+
+async def claim_report(redis_cache, kind: str, report_hash: str, job_id: str) -> Optional[str]:
+    """
+    Claim generation of a report for job_id. Returns the job_id of an
+    identical report already being generated (to attach to), or None.
+    """
+    if not SINGLEFLIGHT or not redis_cache:
+        return None
+
+    holder = await redis_cache.acquire_inflight(kind, report_hash, job_id, SINGLEFLIGHT_LOCK_TTL)
+    if holder:
+        report_flights["attached"] += 1
+    return holder
+
+
+async def release_report(redis_cache, kind: str, report_hash: str, job_id: str):
+    """Release a claim taken with claim_report"""
+    if SINGLEFLIGHT and redis_cache:
+        await redis_cache.release_inflight(kind, report_hash, job_id)
+
+
+# Shared coalescing state for this process
+section_flight = SingleFlight("section")
+report_flights = {"attached": 0}
+metrics.register_metrics_provider(
+    "singleflight",
+    lambda: {"sections": section_flight.get_stats(), "reports": dict(report_flights)}
+)
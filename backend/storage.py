@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+On-disk cache store for TIA Generator.
+SQLite in WAL mode, so cached sections, reports and job state survive
+restarts and are shared by the workers of one node. Used as the whole cache
+backend on single-node deployments (CACHE_BACKEND=disk) and as an L2 behind
+Redis for sections and reports that outlive Redis memory (DISK_CACHE_L2=true).
+
+Usage: python storage.py [iterations]
+    Benchmarks section read/write latency of the disk store, the disk backend
+    and the Redis path (skipped if Redis at REDIS_URL is unreachable).
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+from contextlib import closing
+
+import orjson
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.storage")
+
+# Database file, and the total size of stored values to keep it within
+DISK_CACHE_PATH = os.getenv("DISK_CACHE_PATH", "tia_cache.sqlite3")
+DISK_CACHE_MAX_BYTES = int(os.getenv("DISK_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+DISK_CACHE_TTL = float(os.getenv("DISK_CACHE_TTL", str(60 * 60 * 24 * 7)))
+# Writes between checks of the total size against the budget
+DISK_CACHE_CHECK_INTERVAL = int(os.getenv("DISK_CACHE_CHECK_INTERVAL", "200"))
+# How long a read or write on the event loop waits for another worker's write
+# lock before giving up (a read then counts as a miss, a write is skipped)
+DISK_CACHE_BUSY_TIMEOUT_MS = int(os.getenv("DISK_CACHE_BUSY_TIMEOUT_MS", "10"))
+# Seconds before usage figures are recounted when asked for
+DISK_CACHE_STATS_INTERVAL = float(os.getenv("DISK_CACHE_STATS_INTERVAL", "30"))
+# Lock wait of the maintenance thread, which can afford to wait
+_MAINTENANCE_BUSY_TIMEOUT_MS = 5000
+# Entries dropped per statement when evicting
+_EVICTION_BATCH = 500
+
+# How values are stored: bytes as they are, str as UTF-8, anything else as JSON
+KIND_BYTES = 0
+KIND_TEXT = 1
+KIND_JSON = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+"""
+
+
+def _encode(value: Any) -> Tuple[int, bytes]:
+    if isinstance(value, bytes):
+        return KIND_BYTES, value
+    if isinstance(value, str):
+        return KIND_TEXT, value.encode("utf-8")
+    return KIND_JSON, orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _decode(kind: int, value: bytes) -> Any:
+    if kind == KIND_BYTES:
+        return bytes(value)
+    if kind == KIND_TEXT:
+        return bytes(value).decode("utf-8")
+    return orjson.loads(value)
+
+
+def _prefix_range(prefix: str) -> Tuple[str, str]:
+    """Key range matching a prefix, so lookups use the primary key index"""
+    return prefix, prefix + "\U0010ffff"
+
+
+def _connect(path: str, busy_timeout_ms: int) -> sqlite3.Connection:
+    # Autocommit; each statement is its own transaction
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+    return conn
+
+
+def _is_lock_timeout(error: sqlite3.OperationalError) -> bool:
+    return "locked" in str(error) or "busy" in str(error)
+
+
+class DiskStore:
+    """
+    Key/value store in one SQLite table with per-entry expiry and a byte budget;
+    over budget, entries closest to expiry are evicted first. Has the same
+    interface as LocalCache, so it can stand in for it.
+
+    Point reads and writes are synchronous: with WAL and synchronous=NORMAL
+    they take tens of microseconds, less than a hop to a thread would. They
+    wait at most DISK_CACHE_BUSY_TIMEOUT_MS for another worker's write lock,
+    so the event loop is never held up for long. Anything that scans the
+    table (budget enforcement, usage counts, clear) runs on its own
+    connection, off the loop.
+    """
+
+    def __init__(self, path: str = DISK_CACHE_PATH, max_bytes: int = DISK_CACHE_MAX_BYTES, ttl: float = DISK_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._conn = _connect(path, _MAINTENANCE_BUSY_TIMEOUT_MS)
+        self._conn.executescript(_SCHEMA)
+        # Only point operations from here on, so they may give up quickly
+        self._conn.execute(f"PRAGMA busy_timeout={DISK_CACHE_BUSY_TIMEOUT_MS}")
+        self._writes = 0
+        # Keys whose delete is still to be retried; they read as missing meanwhile
+        self._pending_deletes = set()
+
+        # Usage per key namespace (up to the first ":"), as of the last recount
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._usage_counted_at = 0.0
+        self._maintenance = None
+        self._maintenance_lock = threading.Lock()
+
+        # Counters for metrics (this process only)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.lock_timeouts = 0
+
+        self._start_maintenance()
+
+    def _locked(self, operation: str, key: str, error: sqlite3.OperationalError):
+        if not _is_lock_timeout(error):
+            raise error
+        self.lock_timeouts += 1
+        logger.debug(f"Disk cache {operation} of {key} gave up waiting for the write lock")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value, or None if missing, expired or locked by a writer for too long"""
+        if key in self._pending_deletes:
+            self.misses += 1
+            return None
+        try:
+            row = self._conn.execute(
+                "SELECT kind, value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            self._locked("read", key, e)
+            self.misses += 1
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+
+        kind, value, expires_at = row
+        if expires_at <= time.time():
+            try:
+                self._conn.execute("DELETE FROM entries WHERE key = ? AND expires_at <= ?", (key, time.time()))
+            except sqlite3.OperationalError as e:
+                # Left for the next maintenance pass
+                self._locked("expiry", key, e)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return _decode(kind, value)
+
+    def set(self, key: str, value: Any, size: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Store a value (skipped if another writer holds the lock for too long).
+        size is accepted for compatibility with LocalCache; the budget counts
+        the encoded size.
+        """
+        kind, data = _encode(value)
+        self._flush_deletes()
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, value, size, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, data, len(data), time.time() + (ttl or self.ttl))
+            )
+        except sqlite3.OperationalError as e:
+            self._locked("write", key, e)
+            return
+        self._pending_deletes.discard(key)
+
+        self._writes += 1
+        if self._writes % DISK_CACHE_CHECK_INTERVAL == 0:
+            self._start_maintenance()
+
+    def delete(self, key: str) -> bool:
+        """
+        Remove a key; returns whether it was present. If the write lock can't be
+        had, the key reads as missing until a later call manages the delete.
+        """
+        self._flush_deletes()
+        try:
+            deleted = self._conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount > 0
+        except sqlite3.OperationalError as e:
+            self._locked("delete", key, e)
+            self._pending_deletes.add(key)
+            return True
+        self.invalidations += deleted
+        return deleted
+
+    def _flush_deletes(self):
+        """Retry deletes that gave up waiting for the write lock"""
+        for key in list(self._pending_deletes):
+            try:
+                self.invalidations += self._conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+            except sqlite3.OperationalError as e:
+                self._locked("delete", key, e)
+                return
+            self._pending_deletes.discard(key)
+
+    def clear(self, prefix: str = "") -> int:
+        """
+        Remove every key starting with prefix (all keys by default). May wait
+        for the write lock and scan the table, so call it off the event loop.
+        """
+        with closing(_connect(self.path, _MAINTENANCE_BUSY_TIMEOUT_MS)) as conn:
+            if prefix:
+                cursor = conn.execute("DELETE FROM entries WHERE key >= ? AND key < ?", _prefix_range(prefix))
+            else:
+                cursor = conn.execute("DELETE FROM entries")
+            cleared = cursor.rowcount
+        self._pending_deletes = {key for key in self._pending_deletes if not key.startswith(prefix)}
+        self.invalidations += cleared
+        self._usage_counted_at = 0.0
+        return cleared
+
+    def items(self, prefix: str = "") -> List[Tuple[str, Any]]:
+        """Unexpired (key, value) pairs whose key starts with prefix"""
+        rows = self._conn.execute(
+            "SELECT key, kind, value FROM entries WHERE key >= ? AND key < ? AND expires_at > ?",
+            (*_prefix_range(prefix), time.time())
+        ).fetchall()
+        return [(key, _decode(kind, value)) for key, kind, value in rows]
+
+    def count(self, prefix: str = "") -> Dict[str, int]:
+        """
+        Number and total size of entries whose key starts with prefix, which must
+        be "" or a namespace ("sections:"). Counted off the event loop every
+        DISK_CACHE_STATS_INTERVAL seconds; this returns the last count.
+        """
+        if time.time() - self._usage_counted_at >= DISK_CACHE_STATS_INTERVAL:
+            self._start_maintenance()
+        usage = self._usage
+        if prefix:
+            return dict(usage.get(prefix, {"entries": 0, "bytes": 0}))
+        return {
+            "entries": sum(namespace["entries"] for namespace in usage.values()),
+            "bytes": sum(namespace["bytes"] for namespace in usage.values())
+        }
+
+    def _start_maintenance(self):
+        """Enforce the budget and recount usage in a background thread, if not already"""
+        with self._maintenance_lock:
+            if self._maintenance and self._maintenance.is_alive():
+                return
+            self._maintenance = threading.Thread(target=self.maintain, name="disk-cache-maintenance", daemon=True)
+            self._maintenance.start()
+
+    def maintain(self) -> int:
+        """
+        Drop expired entries, evict down to the budget and recount usage, on a
+        connection of its own. Blocking; runs in a background thread when
+        started by the store. Returns the number of entries evicted.
+        """
+        try:
+            with closing(_connect(self.path, _MAINTENANCE_BUSY_TIMEOUT_MS)) as conn:
+                evicted = self._enforce_budget(conn)
+                usage = {}
+                rows = conn.execute(
+                    "SELECT substr(key, 1, instr(key, ':')), COUNT(*), SUM(size) FROM entries GROUP BY 1"
+                ).fetchall()
+                for namespace, entries, size in rows:
+                    usage[namespace] = {"entries": entries, "bytes": size}
+                self._usage = usage
+                self._usage_counted_at = time.time()
+                return evicted
+        except sqlite3.Error as e:
+            logger.error(f"Disk cache maintenance failed: {str(e)}")
+            return 0
+
+    def enforce_budget(self) -> int:
+        """Drop expired entries, then the ones closest to expiry until within budget (blocking)"""
+        return self.maintain()
+
+    def _enforce_budget(self, conn: sqlite3.Connection) -> int:
+        self.expirations += conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+
+        evicted = 0
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+        while excess > 0:
+            rows = conn.execute(
+                "SELECT key, size FROM entries ORDER BY expires_at LIMIT ?", (_EVICTION_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            keys = []
+            for key, size in rows:
+                keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM entries WHERE key = ?", keys)
+            evicted += len(keys)
+
+        if evicted:
+            logger.info(f"Evicted {evicted} entries from the disk cache to stay within {self.max_bytes} bytes")
+        self.evictions += evicted
+        return evicted
+
+    def close(self):
+        if self._maintenance:
+            self._maintenance.join()
+        self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store usage (as of the last recount) and hit/miss counts"""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            **self.count(),
+            "usage_counted_at": self._usage_counted_at or None,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups > 0 else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "lock_timeouts": self.lock_timeouts
+        }
+
+
+async def _benchmark(iterations: int):
+    """Section write/read latency (ms) of each cache path"""
+    from caching import RedisCache
+    from cache_benchmark import sample_report
+
+    sections = list(sample_report().items())
+    path = f"{DISK_CACHE_PATH}.benchmark"
+
+    async def run(name: str, write, read):
+        write_times, read_times = [], []
+        for i in range(iterations):
+            section, content = sections[i % len(sections)]
+            start = time.perf_counter()
+            await write(section, f"benchmark{i}", content)
+            write_times.append((time.perf_counter() - start) * 1000)
+        for i in range(iterations):
+            section, _ = sections[i % len(sections)]
+            start = time.perf_counter()
+            await read(section, f"benchmark{i}")
+            read_times.append((time.perf_counter() - start) * 1000)
+        results[name] = {"write_ms": metrics.calculate_stats(write_times), "read_ms": metrics.calculate_stats(read_times)}
+
+    results = {}
+    store = DiskStore(path=path)
+
+    async def store_write(section, key, content):
+        store.set(f"{section}:{key}", content)
+
+    async def store_read(section, key):
+        return store.get(f"{section}:{key}")
+
+    await run("disk store", store_write, store_read)
+    store.close()
+
+    # Full RedisCache section path, without the L1 so every read reaches the backend.
+    # Entries are written with a short TTL rather than cleared afterwards
+    for backend in ("disk", "redis"):
+        cache = RedisCache()
+        cache.backend = backend
+        cache.disk_cache_path = path
+        cache.local_cache = None
+        try:
+            await cache.initialize()
+        except Exception as e:
+            results[f"{backend} backend"] = {"error": str(e)}
+            continue
+        if backend == "redis" and not cache.redis:
+            results["redis backend"] = {"error": "Redis unreachable"}
+        else:
+            async def cache_write(section, key, content):
+                await cache.set_section(section, key, content, time_to_live=300)
+            await run(f"{backend} backend", cache_write, cache.get_section)
+        await cache.close()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Token streaming helpers for TIA Generator.
+Batches token deltas from streamed completions and publishes them over
+the job's pubsub channel so the SSE endpoint can relay partial sections.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger("tia-generator.streaming")
+
+# Stream token deltas during progressive generation
+STREAM_SECTIONS = os.getenv("STREAM_SECTIONS", "true").lower() == "true"
+# Flush buffered deltas once this many characters are pending...
+STREAM_BATCH_CHARS = int(os.getenv("STREAM_BATCH_CHARS", "80"))
+# ...or this many seconds have passed since the last flush
+STREAM_BATCH_INTERVAL = float(os.getenv("STREAM_BATCH_INTERVAL", "0.25"))
+
+# "type" of delta messages on a job's channel; other messages (completed
+# sections, status) carry no type
+DELTA_MESSAGE_TYPE = "delta"
+
+
+class SectionDeltaPublisher:
+    """
+    Buffers token deltas for one section and publishes them in batches.
+
+    Each message is tagged "type": "delta" and carries the character offset of
+    its text within the section, so a client can place it correctly even if a
+    retried call restarts at 0.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, str], Awaitable[int]],
+        channel: str,
+        section: str,
+        max_chars: int = STREAM_BATCH_CHARS,
+        max_interval: float = STREAM_BATCH_INTERVAL
+    ):
+        self.publish = publish
+        self.channel = channel
+        self.section = section
+        self.max_chars = max_chars
+        self.max_interval = max_interval
+        self._buffer = []
+        self._buffered_chars = 0
+        self._offset = 0
+        self._start_offset = 0
+        self._created = time.monotonic()
+        self._last_flush = self._created
+        self._published_any = False
+
+    def reset(self):
+        """Start the section again from its start offset (e.g. before a retried call)"""
+        self._buffer = []
+        self._buffered_chars = 0
+        self._offset = self._start_offset
+
+    def resume_from(self, offset: int):
+        """Publish following deltas after offset (e.g. for a continuation call)"""
+        self._start_offset = offset
+        self.reset()
+
+    async def add(self, delta: str):
+        """Buffer a delta, flushing if the size or time threshold is reached"""
+        if not delta:
+            return
+
+        self._buffer.append(delta)
+        self._buffered_chars += len(delta)
+
+        if (
+            self._buffered_chars >= self.max_chars
+            or time.monotonic() - self._last_flush >= self.max_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """Publish any buffered text"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        text = "".join(self._buffer)
+        message = json.dumps({"type": DELTA_MESSAGE_TYPE, "section": self.section, "delta": text, "offset": self._offset})
+        self._offset += len(text)
+        self._buffer = []
+        self._buffered_chars = 0
+
+        try:
+            await self.publish(self.channel, message)
+            metrics.record_stream_delta(self.section, len(text))
+            if not self._published_any:
+                self._published_any = True
+                metrics.record_time_to_first_content(self.section, time.monotonic() - self._created)
+        except Exception as e:
+            logger.warning(f"Failed to publish delta for {self.section}: {str(e)}")
@@ -0,0 +1,21 @@
+"""Shared pytest setup: backend modules are imported flat, as the app does"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# openai_client builds its client at import; no request is ever sent
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point RedisCache at an in-process fake server (skips if fakeredis is missing)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    import caching
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(caching, "build_client", lambda url: fakeredis.FakeAsyncRedis(server=server))
+    return server
@@ -0,0 +1,109 @@
+import asyncio
+
+import batch_generation
+from batch_generation import LocalBatchProvider, poll_and_ingest, submit_bulk_jobs, wait_for_polling
+from caching import RedisCache
+from section_scheduler import is_generation_error
+
+REQUEST = {
+    "project_details": {"project_title": "12 Smith Street", "site_address": "12 Smith Street, Fitzroy"},
+    "introduction": {"purpose": "Assess the parking and traffic impacts."},
+    "parking_assessment": {"justification": "Close to the tram."},
+    "other_matters": {"traffic_generation": "Six trips in the peak hour."},
+    "conclusion": {"summary": "Acceptable."},
+}
+
+
+class Responder:
+    """Batch responder recording the request bodies it answers"""
+
+    def __init__(self):
+        self.bodies = []
+
+    def __call__(self, body):
+        self.bodies.append(body)
+        return f"Generated for: {body['messages'][-1]['content'][-30:]}"
+
+    def dependents(self):
+        """Prompts of the requests that were given related sections"""
+        prompts = [body["messages"][-1]["content"] for body in self.bodies]
+        return [prompt for prompt in prompts if "RELATED SECTIONS" in prompt]
+
+
+class ExpiringProvider(LocalBatchProvider):
+    async def poll(self, batch_id):
+        return "expired"
+
+
+class FailingSectionProvider(LocalBatchProvider):
+    """Answers every request except those for one section, which get a 500"""
+
+    def __init__(self, section, **kwargs):
+        super().__init__(**kwargs)
+        self.section = section
+
+    async def fetch_results(self, batch_id):
+        lines = await super().fetch_results(batch_id)
+        for line in lines:
+            if line["custom_id"].endswith(f":{self.section}"):
+                line["response"] = {"status_code": 500, "body": {"error": "server error"}}
+        return lines
+
+
+def run_batch(tmp_path, monkeypatch, jobs, provider):
+    monkeypatch.setattr(batch_generation, "BATCH_WORK_DIR", str(tmp_path))
+
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            batch_id = await submit_bulk_jobs(jobs, cache, provider)
+            queued = {job_id: await cache.get_job_status(job_id) for job_id in jobs}
+            await poll_and_ingest(batch_id, cache, provider, interval=0)
+            await wait_for_polling()
+            states = {job_id: await cache.get_job_state(job_id) for job_id in jobs}
+            return queued, states, await cache.get_batch(batch_id)
+        finally:
+            await cache.close()
+
+    return asyncio.run(scenario())
+
+
+def test_jobs_are_generated_in_batches_with_dependents_following(fake_redis, tmp_path, monkeypatch):
+    responder = Responder()
+    provider = LocalBatchProvider(work_dir=str(tmp_path), responder=responder)
+    queued, states, record = run_batch(tmp_path, monkeypatch, {"job1": REQUEST, "job2": REQUEST}, provider)
+
+    assert queued == {"job1": "queued_batch", "job2": "queued_batch"}
+    for state in states.values():
+        assert state["status"] == "finished"
+        assert set(state["result"]) == {
+            "introduction_purpose", "parking_justification", "other_traffic_generation", "conclusion_summary"
+        }
+    # The conclusion waits for a follow-up batch that is given what it builds on
+    assert record["jobs"]["job1"]["deferred"] == ["conclusion_summary"]
+    assert record["next_batch"]
+    dependents = responder.dependents()
+    assert len(dependents) == 2
+    assert states["job1"]["result"]["parking_justification"] in dependents[0]
+
+
+def test_expired_batch_fails_its_jobs(fake_redis, tmp_path, monkeypatch):
+    provider = ExpiringProvider(work_dir=str(tmp_path), responder=Responder())
+    _, states, record = run_batch(tmp_path, monkeypatch, {"job1": REQUEST}, provider)
+
+    assert states["job1"]["status"] == "failed"
+    assert "expired" in states["job1"]["error"]
+    assert record["ingested"]
+
+
+def test_failed_request_is_reported_and_left_out_of_dependents(fake_redis, tmp_path, monkeypatch):
+    responder = Responder()
+    provider = FailingSectionProvider("parking_justification", work_dir=str(tmp_path), responder=responder)
+    _, states, _ = run_batch(tmp_path, monkeypatch, {"job1": REQUEST}, provider)
+
+    result = states["job1"]["result"]
+    assert states["job1"]["status"] == "finished"
+    assert is_generation_error(result["parking_justification"])
+    assert "[other_traffic_generation]" in responder.dependents()[0]
+    assert "[parking_justification]" not in responder.dependents()[0]
@@ -0,0 +1,127 @@
+import asyncio
+
+from caching import BLOB_REFS_KEY, RedisCache, blob_digest
+
+
+async def blob_refs(cache, text):
+    refs = await cache.redis.hget(BLOB_REFS_KEY, f"tia:blob:{blob_digest(text)}")
+    return int(refs) if refs is not None else None
+
+
+async def blob_exists(cache, text):
+    return bool(await cache.redis.exists(f"tia:blob:{blob_digest(text)}"))
+
+
+def run_with_cache(scenario):
+    async def wrapper():
+        cache = RedisCache()
+        # L1 would answer reads without touching the blobs under test
+        cache.local_cache = None
+        await cache.initialize()
+        try:
+            return await scenario(cache)
+        finally:
+            await cache.close()
+    return asyncio.run(wrapper())
+
+
+def test_identical_sections_share_one_blob(fake_redis):
+    async def scenario(cache):
+        await cache.set_section("introduction_purpose", "key1", "Shared text")
+        await cache.set_section("introduction_purpose", "key2", "Shared text")
+        blobs = [key async for key in cache.redis.scan_iter(match="tia:blob:*")]
+        return len(blobs), await blob_refs(cache, "Shared text"), await cache.get_section("introduction_purpose", "key2")
+
+    assert run_with_cache(scenario) == (1, 2, "Shared text")
+
+
+def test_job_result_and_report_entry_share_blobs(fake_redis):
+    result = {"introduction_purpose": "Intro text", "conclusion_summary": "Conclusion text"}
+
+    async def scenario(cache):
+        await cache.finish_job("job1", result, report_hash="hash1")
+        refs = [await blob_refs(cache, text) for text in result.values()]
+        return refs, await cache.get_job_result("job1"), await cache.get_report_by_hash("hash1")
+
+    refs, job_result, report = run_with_cache(scenario)
+    assert refs == [2, 2]
+    assert job_result == result
+    assert report == result
+
+
+def test_blob_deleted_only_when_last_holder_goes(fake_redis):
+    result = {"introduction_purpose": "Shared text", "conclusion_summary": "Report only"}
+
+    async def scenario(cache):
+        await cache.set_section("introduction_purpose", "key1", "Shared text")
+        await cache.set_report_hash("hash1", result)
+        await cache.clear_cache("sections")
+        after_sections = (await blob_refs(cache, "Shared text"), await blob_exists(cache, "Shared text"))
+        await cache.clear_cache("reports")
+        after_reports = (await blob_refs(cache, "Shared text"), await blob_exists(cache, "Shared text"))
+        return after_sections, after_reports, await blob_exists(cache, "Report only")
+
+    after_sections, after_reports, report_only_exists = run_with_cache(scenario)
+    assert after_sections == (1, True)
+    assert after_reports == (None, False)
+    assert not report_only_exists
+
+
+def test_missing_blob_reads_as_miss(fake_redis):
+    result = {"introduction_purpose": "Intro text"}
+
+    async def scenario(cache):
+        await cache.set_report_hash("hash1", result)
+        await cache.redis.delete(f"tia:blob:{blob_digest('Intro text')}")
+        return await cache.get_report_by_hash("hash1")
+
+    assert run_with_cache(scenario) is None
+
+
+def test_garbage_collection_drops_counts_of_expired_blobs(fake_redis):
+    async def scenario(cache):
+        await cache.set_section("introduction_purpose", "key1", "Kept text")
+        await cache.set_section("introduction_purpose", "key2", "Expired text")
+        # As if the blob expired along with its holder
+        await cache.redis.delete(f"tia:blob:{blob_digest('Expired text')}")
+        stats = await cache.collect_blob_garbage()
+        return stats, await blob_refs(cache, "Kept text"), await blob_refs(cache, "Expired text")
+
+    assert run_with_cache(scenario) == ({"checked": 2, "removed": 1}, 1, None)
+
+
+def test_overwritten_section_releases_old_text(fake_redis):
+    async def scenario(cache):
+        await cache.set_section("introduction_purpose", "key1", "First draft")
+        # Regenerating the same inputs gives different text under the same key
+        await cache.set_section("introduction_purpose", "key1", "Second draft")
+        await cache.set_section("introduction_purpose", "key1", "Second draft")
+        return (
+            await blob_refs(cache, "First draft"),
+            await blob_exists(cache, "First draft"),
+            await blob_refs(cache, "Second draft"),
+            await cache.get_section("introduction_purpose", "key1"),
+        )
+
+    assert run_with_cache(scenario) == (None, False, 1, "Second draft")
+
+
+def test_overwritten_report_entries_release_old_text(fake_redis):
+    async def scenario(cache):
+        await cache.set_report_hash("hash1", {"introduction_purpose": "Old report"})
+        await cache.set_report_hash("hash1", {"introduction_purpose": "New report"})
+        await cache.finish_job("job1", {"introduction_purpose": "Old result"}, report_hash="hash2")
+        await cache.finish_job("job1", {"introduction_purpose": "New result"}, report_hash="hash2")
+        return [await blob_refs(cache, text) for text in ("Old report", "New report", "Old result", "New result")]
+
+    assert run_with_cache(scenario) == [None, 1, None, 2]
+
+
+def test_released_refs_reach_zero_after_overwrites(fake_redis):
+    async def scenario(cache):
+        for text in ("Draft one", "Draft two", "Draft three"):
+            await cache.set_section("introduction_purpose", "key1", text)
+        await cache.clear_cache("sections")
+        return await cache.redis.hlen(BLOB_REFS_KEY), [key async for key in cache.redis.scan_iter(match="tia:blob:*")]
+
+    assert run_with_cache(scenario) == (0, [])
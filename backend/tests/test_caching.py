@@ -0,0 +1,137 @@
+import asyncio
+
+import redis.asyncio.client
+
+import caching
+from caching import RedisCache
+
+
+def test_invalidation_listener_survives_quiet_channel(fake_redis, monkeypatch):
+    # A quiet channel must not look like a dropped connection: the listener polls
+    # with an explicit timeout rather than blocking into the pool's socket timeout
+    monkeypatch.setattr(caching, "INVALIDATION_POLL_TIMEOUT", 0.02)
+    timeouts = []
+    get_message = redis.asyncio.client.PubSub.get_message
+
+    async def recording_get_message(self, *args, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+        return await get_message(self, *args, **kwargs)
+
+    monkeypatch.setattr(redis.asyncio.client.PubSub, "get_message", recording_get_message)
+
+    async def scenario():
+        writer, reader = RedisCache(), RedisCache()
+        await writer.initialize()
+        await reader.initialize()
+        try:
+            await asyncio.sleep(0.05)
+            reader.local_cache.set("tia:report:kept", {"a": 1}, 10)
+            reader.local_cache.set("tia:report:stale", {"a": 1}, 10)
+            # Several poll timeouts pass with nothing published
+            await asyncio.sleep(0.2)
+            listener_alive = not reader._invalidation_task.done()
+            kept_while_quiet = reader.local_cache.get("tia:report:kept")
+
+            await writer._invalidate(keys=["tia:report:stale"])
+            await asyncio.sleep(0.1)
+            return (
+                listener_alive,
+                kept_while_quiet,
+                reader.local_cache.get("tia:report:stale"),
+                reader.local_cache.get("tia:report:kept"),
+            )
+        finally:
+            await writer.close()
+            await reader.close()
+
+    listener_alive, kept_while_quiet, stale, kept = asyncio.run(scenario())
+    assert listener_alive
+    # The listener clears L1 whenever it resubscribes, so entries surviving means it never restarted
+    assert kept_while_quiet == {"a": 1}
+    assert stale is None
+    assert kept == {"a": 1}
+    assert timeouts and None not in timeouts
+
+
+def test_job_sections_stay_out_of_the_job_namespace(fake_redis):
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            await cache.start_job("job1", {"project": "A"})
+            await cache.add_job_section("job1", "intro", "Intro text")
+            keys = sorted(key.decode() for key in await cache.redis.keys("tia:job*"))
+            await cache.redis.unlink("tia:index:jobs")
+            rebuilt = (await cache.rebuild_cache_indexes())["jobs"]
+            stats = (await cache.get_cache_stats())["jobs"]
+            sections = await cache.get_job_sections("job1")
+            await cache.clear_cache("jobs")
+            left = await cache.redis.keys("tia:job*")
+            return keys, rebuilt, stats, sections, left
+        finally:
+            await cache.close()
+
+    keys, rebuilt, stats, sections, left = asyncio.run(scenario())
+    assert keys == ["tia:job:job1", "tia:jobsections:job1"]
+    assert rebuilt == 1 and stats == 1
+    assert sections == {"intro": "Intro text"}
+    assert left == []
+
+
+def test_memory_fallback_stats_count_reports(monkeypatch):
+    def unreachable(url):
+        raise ConnectionError("no redis")
+
+    monkeypatch.setattr(caching, "build_client", unreachable)
+
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            await cache.finish_job("job1", {"intro": "Intro text"}, report_hash="hash1")
+            await cache.set_report_hash("hash2", {"intro": "Other text"})
+            return await cache.get_cache_stats()
+        finally:
+            await cache.close()
+
+    stats = asyncio.run(scenario())
+    assert stats["type"] == "memory"
+    assert stats["reports"] == 2 and stats["jobs"] == 1
+
+
+def test_job_transitions_are_never_seen_half_written(fake_redis):
+    result = {"intro": "Intro text " * 50, "summary": "Summary text"}
+
+    async def scenario():
+        writer, reader = RedisCache(), RedisCache()
+        await writer.initialize()
+        await reader.initialize()
+        seen = []
+        done = asyncio.Event()
+
+        async def poll():
+            while not done.is_set():
+                state = await reader.get_job_state("job1")
+                report = await reader.redis.exists("tia:report:hash1")
+                sections = await reader.redis.exists("tia:jobsections:job1")
+                seen.append((state["status"], state["result"] is not None, report, sections))
+                await asyncio.sleep(0)
+
+        try:
+            await writer.start_job("job1", {"project": "A"})
+            await writer.add_job_section("job1", "intro", "Intro text")
+            poller = asyncio.create_task(poll())
+            await asyncio.sleep(0.01)
+            await writer.finish_job("job1", result, report_hash="hash1")
+            await asyncio.sleep(0.01)
+            done.set()
+            await poller
+            return seen, await reader.get_report_by_hash("hash1")
+        finally:
+            await writer.close()
+            await reader.close()
+
+    seen, report = asyncio.run(scenario())
+    # Status, result, report entry and the sections' removal land together
+    assert set(seen) == {("processing", False, 0, 1), ("finished", True, 1, 0)}
+    assert report == result
@@ -0,0 +1,86 @@
+import pytest
+
+from canonicalization import (
+    canonicalize_request, canonicalize_text, fuzzy_report_hash, report_hash, stable_hash,
+)
+
+REQUEST = {
+    "project_details": {
+        "project_title": "12 Smith Street",
+        "site_address": "12 Smith Street, Fitzroy",
+        "development_type": "Residential",
+        "council": "City of Yarra",
+    },
+    "introduction": {"purpose": "Assess the parking and traffic impacts."},
+    "parking_assessment": {"proposed_parking_provision": "Two spaces per dwelling."},
+}
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (None, ""),
+    (3, "3"),
+    ("  two   spaces\t per dwelling  ", "two spaces per dwelling"),
+    ("\u201cquoted\u201d \u2018text\u2019 \u2013 dash", "\"quoted\" 'text' - dash"),
+    ("zero\u200bwidth\ufeff", "zerowidth"),
+    ("\uff21\uff22 full width", "AB full width"),
+    ("line one\r\nline two\rline three", "line one\nline two\nline three"),
+    ("para one\n\n\n\n  para two  ", "para one\n\npara two"),
+])
+def test_canonicalize_text(raw, expected):
+    assert canonicalize_text(raw) == expected
+
+
+def test_request_has_every_field_in_model_order():
+    canonical = canonicalize_request(REQUEST)
+    assert list(canonical)[:2] == ["project_details", "introduction"]
+    assert canonical["conclusion"] == {"summary": ""}
+    assert canonical["project_details"]["consultant_name"] == ""
+
+
+def test_missing_none_and_empty_are_equivalent():
+    with_none = dict(REQUEST, conclusion={"summary": None})
+    with_empty = dict(REQUEST, conclusion={"summary": ""})
+    assert canonicalize_request(with_none) == canonicalize_request(with_empty) == canonicalize_request(REQUEST)
+
+
+def test_unknown_fields_are_kept_after_known_ones():
+    canonical = canonicalize_request(dict(REQUEST, zz_extra="  note ", aa_extra={"b": None}))
+    assert list(canonical)[-2:] == ["aa_extra", "zz_extra"]
+    assert canonical["zz_extra"] == "note"
+    assert canonical["aa_extra"] == {"b": ""}
+
+
+def test_canonicalization_is_idempotent():
+    canonical = canonicalize_request(REQUEST)
+    assert canonicalize_request(canonical) == canonical
+
+
+def test_cosmetic_differences_share_report_hash():
+    variant = {
+        "parking_assessment": {"proposed_parking_provision": "Two  spaces per dwelling. "},
+        "introduction": {"purpose": "Assess the parking and traffic impacts.", "council_feedback": None},
+        "project_details": dict(REQUEST["project_details"], council="CITY OF YARRA", development_type=" residential"),
+    }
+    assert report_hash(canonicalize_request(variant)) == report_hash(canonicalize_request(REQUEST))
+
+
+def test_content_changes_change_report_hash():
+    variant = dict(REQUEST, parking_assessment={"proposed_parking_provision": "One space per dwelling."})
+    assert report_hash(canonicalize_request(variant)) != report_hash(canonicalize_request(REQUEST))
+
+
+def test_report_hash_does_not_modify_request():
+    canonical = canonicalize_request(REQUEST)
+    report_hash(canonical)
+    assert canonical["project_details"]["council"] == "City of Yarra"
+
+
+def test_fuzzy_hash_uses_identifying_fields_only():
+    canonical = canonicalize_request(REQUEST)
+    other_content = canonicalize_request(dict(REQUEST, introduction={"purpose": "Something else"}))
+    assert fuzzy_report_hash(other_content) == fuzzy_report_hash(canonical)
+    assert fuzzy_report_hash(canonicalize_request({})) is None
+
+
+def test_stable_hash_ignores_key_order():
+    assert stable_hash({"a": 1, "b": {"c": 2, "d": 3}}) == stable_hash({"b": {"d": 3, "c": 2}, "a": 1})
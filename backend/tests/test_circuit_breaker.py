@@ -0,0 +1,157 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry, is_service_failure
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def status_error(status: int) -> openai.APIStatusError:
+    return openai.APIStatusError("error", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def make_breaker(**kwargs):
+    options = dict(failure_threshold=3, window_seconds=60, open_seconds=30, slow_call_seconds=10, half_open_probes=1, probe_timeout=60)
+    options.update(kwargs)
+    return CircuitBreaker("gpt-test", **options)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (openai.APIConnectionError(request=REQUEST), True),
+    (openai.APITimeoutError(request=REQUEST), True),
+    (asyncio.TimeoutError(), True),
+    (status_error(500), True),
+    (status_error(503), True),
+    (status_error(400), False),
+    (status_error(429), False),
+    (ValueError("bad"), False),
+])
+def test_only_service_faults_count(error, expected):
+    assert is_service_failure(error) is expected
+
+
+def test_opens_after_threshold_failures():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record_failure("boom")
+    assert breaker.state == CLOSED and breaker.allow_request()
+    breaker.record_failure("boom")
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert not breaker.is_available()
+
+
+def test_failures_outside_window_expire():
+    breaker = make_breaker(window_seconds=0)
+    for _ in range(5):
+        breaker.record_failure("boom")
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_success(5)
+    assert breaker.state == CLOSED
+    breaker.record_success(11)
+    assert breaker.state == OPEN
+
+
+def test_half_open_allows_one_probe_then_closes_on_success():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0)
+    breaker.record_failure("boom")
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_success(1)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0)
+    breaker.record_failure("boom")
+    assert breaker.allow_request()
+    breaker.record_failure("still down")
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_stale_probe_frees_its_slot():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0, probe_timeout=0)
+    breaker.record_failure("boom")
+    assert breaker.allow_request()
+    # The probe's call was cancelled and never reported back
+    assert breaker.allow_request()
+
+
+def test_caller_error_releases_probe_without_verdict():
+    registry = CircuitBreakerRegistry()
+    breaker = registry.get("gpt-test")
+    breaker.failure_threshold = 1
+    breaker.open_seconds = 0
+    registry.on_api_failure("gpt-test", "boom")
+    assert breaker.allow_request()
+    registry.on_api_failure("gpt-test", "rate limited", service_fault=False)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_route_fails_over_while_open(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "FALLBACK_MODELS", {"primary": "backup"})
+    registry = CircuitBreakerRegistry()
+    assert registry.route("primary") == "primary"
+
+    registry.get("primary").failure_threshold = 1
+    registry.on_api_failure("primary", "boom")
+    assert registry.route("primary") == "backup"
+    assert registry.get_stats()["failovers"] == 1
+
+    # With the fallback down too, the call goes to the original model
+    registry.get("backup").failure_threshold = 1
+    registry.on_api_failure("backup", "boom")
+    assert registry.route("primary") == "primary"
+
+
+def test_half_open_fallback_takes_only_its_probe(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "FALLBACK_MODELS", {"primary": "backup"})
+    registry = CircuitBreakerRegistry()
+    for model, open_seconds in (("primary", 30), ("backup", 0)):
+        registry.get(model).failure_threshold = 1
+        registry.get(model).open_seconds = open_seconds
+        registry.on_api_failure(model, "boom")
+
+    assert registry.route("primary") == "backup"
+    assert registry.get("backup").state == HALF_OPEN
+    # The backup's probe is out, so further calls stay on the original model
+    assert registry.route("primary") == "primary"
+    assert registry.get_stats()["failovers"] == 1
+
+
+def test_failed_call_keeps_the_half_open_probe_free(monkeypatch):
+    import tia_generator
+
+    monkeypatch.setattr(circuit_breaker, "FALLBACK_MODELS", {"primary": "backup"})
+    registry = CircuitBreakerRegistry()
+    monkeypatch.setattr(tia_generator, "circuit_breakers", registry)
+    breaker = registry.get("primary")
+    breaker.failure_threshold = 1
+    breaker.open_seconds = 0
+    registry.on_api_failure("primary", "boom")
+    calls = []
+
+    async def call_openai_api(model, **kwargs):
+        calls.append(model)
+        # A caller error hands the probe back, as call_openai_api reports it
+        registry.on_api_failure(model, "bad request", service_fault=False)
+        raise ValueError("bad request")
+
+    monkeypatch.setattr(tia_generator, "call_openai_api", call_openai_api)
+
+    with pytest.raises(ValueError):
+        asyncio.run(tia_generator.call_with_failover("primary"))
+    assert calls == ["primary"]
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
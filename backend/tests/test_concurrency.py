@@ -0,0 +1,110 @@
+import asyncio
+
+from concurrency import AdaptiveConcurrencyLimiter, request_priority
+
+
+def make_limiter(**kwargs):
+    options = dict(initial_limit=2, min_limit=1, max_limit=8, decrease_cooldown=0)
+    options.update(kwargs)
+    return AdaptiveConcurrencyLimiter(**options)
+
+
+def test_successes_grow_limit_additively():
+    limiter = make_limiter()
+    for _ in range(2):
+        limiter.on_success(0.1)
+    # +1 per window of `limit` successes
+    assert 2.8 < limiter.limit < 3.0
+
+
+def test_limit_capped_at_max():
+    limiter = make_limiter(max_limit=3)
+    for _ in range(100):
+        limiter.on_success(0.1)
+    assert limiter.limit == 3
+
+
+def test_throttle_cuts_multiplicatively_with_floor():
+    limiter = make_limiter(initial_limit=8)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.limit == 1
+
+
+def test_decrease_cooldown_cuts_once_per_burst():
+    limiter = make_limiter(initial_limit=8, decrease_cooldown=60)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    assert limiter.throttles == 2
+
+
+def test_latency_spike_decreases_after_baseline():
+    limiter = make_limiter(initial_limit=8)
+    for _ in range(10):
+        limiter.on_success(0.1)
+    before = limiter.limit
+    limiter.on_success(1.0)
+    assert limiter.latency_spikes == 1
+    assert limiter.limit == before * 0.5
+
+
+def test_errors_hold_growth():
+    limiter = make_limiter()
+    for _ in range(5):
+        limiter.on_error()
+    limiter.on_success(0.1)
+    assert limiter.limit == 2
+
+
+def test_waiters_served_by_priority():
+    async def run():
+        limiter = make_limiter(initial_limit=1, max_limit=1)
+        order = []
+
+        async def call(name, priority):
+            request_priority.set(priority)
+            async with limiter:
+                order.append(name)
+
+        await limiter.acquire()
+        tasks = [asyncio.create_task(call("low", 5)), asyncio.create_task(call("high", 0))]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["high", "low"]
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def run():
+        limiter = make_limiter(initial_limit=1, max_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        return limiter.in_flight, len(limiter._waiters)
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_handed_on():
+    async def run():
+        limiter = make_limiter(initial_limit=1, max_limit=1)
+        await limiter.acquire()
+        first = asyncio.create_task(limiter.acquire())
+        second = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot goes to first, which is cancelled before it resumes
+        limiter.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+        return first.cancelled(), limiter.in_flight, len(limiter._waiters)
+
+    assert asyncio.run(run()) == (True, 1, 0)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+import metrics
+from hedging import HedgePolicy
+
+
+def make_policy(delay=0.05, budget=1.0):
+    policy = HedgePolicy(enabled=True, budget=budget)
+    policy.hedge_delay = lambda model: delay
+    return policy
+
+
+class FakeRequests:
+    """Request factory whose calls take the given durations in turn"""
+
+    def __init__(self, *durations):
+        self.durations = list(durations)
+        self.started = []
+        self.cancelled = []
+
+    def __call__(self):
+        index = len(self.started)
+        self.started.append(index)
+        return self._run(index, self.durations[index])
+
+    async def _run(self, index, duration):
+        try:
+            await asyncio.sleep(duration)
+            return f"response {index}"
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+
+
+def test_fast_primary_is_not_hedged():
+    policy = make_policy()
+    requests = FakeRequests(0.01)
+    assert asyncio.run(policy.call("gpt-test", requests)) == "response 0"
+    assert requests.started == [0]
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    policy = make_policy()
+    requests = FakeRequests(1.0, 0.01)
+    losers, hedges = [], []
+
+    async def scenario():
+        result = await policy.call("gpt-test", requests, on_loser=losers.append, on_hedge=lambda: hedges.append(1))
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == "response 1"
+    assert requests.cancelled == [0]
+    assert losers == [None] and hedges == [1]
+    assert policy.get_stats()["models"]["gpt-test"]["hedge_wins"] == 1
+
+
+def test_hedge_skipped_over_budget():
+    policy = make_policy(budget=0)
+    requests = FakeRequests(0.1)
+    assert asyncio.run(policy.call("gpt-test", requests)) == "response 0"
+    assert requests.started == [0]
+    assert policy.get_stats()["models"]["gpt-test"]["skipped_budget"] == 1
+
+
+@pytest.mark.parametrize("cancel_after", [0.01, 0.1])
+def test_cancelled_caller_cancels_primary(cancel_after):
+    # Cancelled while waiting out the hedge delay, or while checking hedge budget
+    policy = make_policy(delay=0.05)
+    requests = FakeRequests(1.0)
+
+    async def slow_check():
+        await asyncio.sleep(1.0)
+        return True
+
+    async def scenario():
+        call = asyncio.ensure_future(policy.call("gpt-test", requests, can_hedge=slow_check))
+        await asyncio.sleep(cancel_after)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert requests.cancelled == [0]
+
+
+def test_report_latency_split_by_calls_actually_hedged():
+    metrics.reset_metrics()
+    metrics.record_token_usage("gpt-test", 10, 5, job_id="plain")
+    metrics.record_token_usage("gpt-test", 10, 5, job_id="hedged")
+    metrics.record_token_usage("gpt-test", 10, 5, job_id="hedged", hedged=True)
+    assert not metrics.job_was_hedged("plain")
+    assert metrics.job_was_hedged("hedged")
+
+    metrics.record_full_report_generation(10.0, 19, hedged=False)
+    metrics.record_full_report_generation(4.0, 19, hedged=True)
+    by_hedging = metrics.get_report_generation_metrics()["by_hedging"]
+    assert by_hedging["hedged"]["max"] == 4.0
+    assert by_hedging["unhedged"]["max"] == 10.0
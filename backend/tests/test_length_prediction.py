@@ -0,0 +1,53 @@
+from length_prediction import OutputLengthPredictor
+
+
+def make_predictor(**overrides):
+    settings = dict(enabled=True, min_samples=3, margin=0.0, error_stds=0.0, min_tokens=1, max_tokens=10000)
+    settings.update(overrides)
+    return OutputLengthPredictor(**settings)
+
+
+def test_default_until_enough_samples():
+    predictor = make_predictor()
+    predictor.observe("intro", 100, 200)
+    predictor.observe("intro", 200, 300)
+
+    assert predictor.predict("intro", 150, default=800) == 800
+
+
+def test_fits_length_against_input():
+    predictor = make_predictor()
+    for chars in (100, 200, 300, 400):
+        predictor.observe("intro", chars, 100 + chars)
+
+    assert predictor.predict("intro", 500, default=800) == 600
+
+
+def test_margin_and_bounds_apply():
+    predictor = make_predictor(margin=0.5, max_tokens=500)
+    for _ in range(3):
+        predictor.observe("intro", 100, 200)
+
+    assert predictor.predict("intro", 100, default=800) == 300
+    assert make_predictor(min_tokens=250).predict("unseen", 100, default=800) == 800
+
+
+def test_truncated_replies_are_counted_not_fitted():
+    predictor = make_predictor()
+    for chars in (100, 200, 300):
+        predictor.observe("intro", chars, 100 + chars)
+    # Cut off at a max_tokens well below the true length
+    for _ in range(5):
+        predictor.observe("intro", 1000, 150, truncated=True)
+
+    assert predictor.predict("intro", 1000, default=800) == 1100
+    stats = predictor.get_stats()["sections"]["intro"]
+    assert stats["samples"] == 3 and stats["truncated"] == 5
+
+
+def test_disabled_returns_default():
+    predictor = make_predictor(enabled=False)
+    for _ in range(3):
+        predictor.observe("intro", 100, 200)
+
+    assert predictor.predict("intro", 100, default=800) == 800
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from local_cache import LocalCache, approximate_size
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LocalCache(max_bytes=10, ttl=60)
+    cache.set("a", "aaaa", 4)
+    cache.set("b", "bbbb", 4)
+    assert cache.get("a") == "aaaa"
+    cache.set("c", "cccc", 4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    stats = cache.get_stats()
+    assert stats["bytes"] == 8 and stats["evictions"] == 1
+
+
+def test_replacing_a_key_recounts_its_size():
+    cache = LocalCache(max_bytes=10, ttl=60)
+    cache.set("a", "aaaa", 4)
+    cache.set("a", "aaaaaaaa", 8)
+    cache.set("b", "bb", 2)
+
+    assert cache.get_stats()["bytes"] == 10
+    assert cache.get_stats()["evictions"] == 0
+
+
+def test_value_larger_than_the_budget_is_not_cached():
+    cache = LocalCache(max_bytes=10, ttl=60)
+    cache.set("a", "aaaa", 4)
+    cache.set("b", "old", 3)
+    cache.set("b", "x" * 11, 11)
+
+    # Neither stored nor allowed to flush what is there; the stale value goes
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get_stats()["bytes"] == 4 and cache.get_stats()["evictions"] == 0
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LocalCache(max_bytes=100, ttl=10)
+    cache.set("default", 1, 8)
+    cache.set("short", 2, 8, ttl=1)
+
+    now[0] += 5
+    assert cache.get("short") is None and cache.get("default") == 1
+    assert cache.count() == {"entries": 1, "bytes": 8}
+    now[0] += 10
+    assert cache.get("default") is None
+    stats = cache.get_stats()
+    assert stats["expirations"] == 2 and stats["bytes"] == 0
+
+
+def test_clear_by_prefix():
+    cache = LocalCache(max_bytes=100, ttl=60)
+    cache.set("jobs:1", 1, 8)
+    cache.set("jobs:2", 2, 8)
+    cache.set("sections:1", 3, 8)
+
+    assert cache.clear("jobs:") == 2
+    assert [key for key, _ in cache.items()] == ["sections:1"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("abc", 3),
+    (b"ab", 2),
+    ({"ab": "cde"}, 5),
+    (["ab", 1], 10),
+])
+def test_approximate_size(value, expected):
+    assert approximate_size(value) == expected
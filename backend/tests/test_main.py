@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import BackgroundTasks
+
+import main
+from caching import RedisCache
+from models import TIARequest
+
+REQUEST = {
+    "project_details": {"project_title": "12 Smith Street", "site_address": "12 Smith Street, Fitzroy"},
+    "introduction": {"purpose": "Assess the parking and traffic impacts."},
+    "existing_conditions": {},
+    "proposal": {"description": "Six townhouses."},
+    "parking_assessment": {},
+    "parking_design": {},
+    "other_matters": {},
+    "conclusion": {},
+}
+
+
+@pytest.mark.parametrize("endpoint", [main.create_tia_job, main.create_tia_streaming_job])
+def test_attached_request_always_finds_the_owner_queued(fake_redis, monkeypatch, endpoint):
+    claimed = main.claim_report
+    status_at_claim = []
+
+    async def claim_report(redis_cache, kind, report_hash, job_id):
+        owner = await claimed(redis_cache, kind, report_hash, job_id)
+        # By the time the claim is visible to others, the claimant has a status
+        status_at_claim.append(await redis_cache.get_job_status(job_id))
+        return owner
+
+    monkeypatch.setattr(main, "claim_report", claim_report)
+
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        monkeypatch.setattr(main, "redis_cache", cache)
+        try:
+            first = await endpoint(TIARequest(**REQUEST), BackgroundTasks(), None, "interactive")
+            second_tasks = BackgroundTasks()
+            second = await endpoint(TIARequest(**REQUEST), second_tasks, None, "interactive")
+            owner_status = await cache.get_job_status(first["job_id"])
+            jobs = await cache.redis.keys("tia:job:*")
+            return first, second, owner_status, len(second_tasks.tasks), jobs
+        finally:
+            await cache.close()
+
+    first, second, owner_status, second_queued, jobs = asyncio.run(scenario())
+    assert status_at_claim == ["queued", "queued"]
+    assert second == {"job_id": first["job_id"], "status": "attached"}
+    assert owner_status == "queued" and second_queued == 0
+    # The attached request's own job is deleted rather than left queued
+    assert [key.decode() for key in jobs] == [f"tia:job:{first['job_id']}"]
+
+
+class FailingJobCache:
+    """Cache whose job fails just after a client subscribes to its updates"""
+
+    def __init__(self):
+        self.updates = asyncio.Queue()
+        self.updates.put_nowait(json.dumps({"status": "failed", "error": "boom"}))
+
+    async def subscribe(self, channel):
+        return self.updates
+
+    async def unsubscribe(self, updates, channel):
+        pass
+
+    async def get_job_sections(self, job_id):
+        return {}
+
+    async def get_job_state(self, job_id):
+        return {"status": "failed", "result": None, "error": "boom"}
+
+
+def test_stream_ends_on_a_failure_message(monkeypatch):
+    monkeypatch.setattr(main, "redis_cache", FailingJobCache())
+
+    async def scenario():
+        response = await main.stream_job_sections("job")
+        return [event async for event in response.body_iterator]
+
+    events = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert events == ['data: {"status": "failed", "error": "boom"}\n\n']
@@ -0,0 +1,65 @@
+import pytest
+
+import metrics
+import model_selection
+from model_selection import DEFAULT_MODEL, FAST_MODEL, ModelRouter
+
+
+@pytest.fixture
+def performance(monkeypatch):
+    """Per-model live metrics the router reads, set by each test"""
+    table = {}
+
+    def get_model_performance(model, window=100):
+        defaults = {"calls": 0, "avg_latency": 0.0, "failure_rate": 0.0,
+                    "avg_prompt_tokens": 500, "avg_completion_tokens": 300}
+        return {**defaults, **table.get(model, {})}
+
+    monkeypatch.setattr(metrics, "get_model_performance", get_model_performance)
+    monkeypatch.setattr(model_selection, "MODEL_QUALITY", {FAST_MODEL: 1, DEFAULT_MODEL: 2})
+    monkeypatch.setattr(model_selection, "SECTION_QUALITY_FLOORS", {"hard": DEFAULT_MODEL})
+    metrics.reset_metrics()
+    return table
+
+
+def test_quality_floor_excludes_weaker_models(performance):
+    router = ModelRouter(exploration=1.0, min_samples=1)
+    performance.update({FAST_MODEL: {"calls": 50, "avg_latency": 0.1},
+                        DEFAULT_MODEL: {"calls": 50, "avg_latency": 9.0}})
+
+    assert {router.choose("hard", 100) for _ in range(20)} == {DEFAULT_MODEL}
+    decision = metrics.get_routing_metrics()["recent_decisions"][-1]
+    assert decision["reason"] == "only model meeting quality floor"
+
+
+def test_models_without_history_are_explored_first(performance):
+    router = ModelRouter(exploration=0.0, min_samples=10)
+    performance.update({FAST_MODEL: {"calls": 50, "avg_latency": 0.1},
+                        DEFAULT_MODEL: {"calls": 3, "avg_latency": 9.0}})
+
+    assert router.choose("easy", 100) == DEFAULT_MODEL
+    assert metrics.get_routing_metrics()["recent_decisions"][-1]["reason"] == "exploring (not enough samples)"
+
+
+def test_lowest_expected_latency_wins(performance):
+    router = ModelRouter(exploration=0.0, min_samples=10, cost_weight=0)
+    performance.update({FAST_MODEL: {"calls": 50, "avg_latency": 1.0},
+                        DEFAULT_MODEL: {"calls": 50, "avg_latency": 2.0}})
+    assert router.choose("easy", 100) == FAST_MODEL
+
+    # Failures are retried, so a flaky model's expected latency is stretched
+    performance[FAST_MODEL]["failure_rate"] = 0.6
+    assert router.choose("easy", 100) == DEFAULT_MODEL
+    assert metrics.get_routing_metrics()["sections"]["easy"] == {FAST_MODEL: 1, DEFAULT_MODEL: 1}
+
+
+def test_cost_is_traded_against_latency(performance):
+    router = ModelRouter(exploration=0.0, min_samples=10)
+    performance.update({FAST_MODEL: {"calls": 50, "avg_latency": 1.0},
+                        DEFAULT_MODEL: {"calls": 50, "avg_latency": 1.0}})
+    scores = {model: router.score(model) for model in (FAST_MODEL, DEFAULT_MODEL)}
+    cheaper = min(scores, key=lambda model: scores[model]["cost"])
+
+    assert scores[FAST_MODEL]["cost"] != scores[DEFAULT_MODEL]["cost"]
+    assert scores[FAST_MODEL]["latency"] == scores[DEFAULT_MODEL]["latency"]
+    assert router.choose("easy", 100) == cheaper
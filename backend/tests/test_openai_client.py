@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+import pytest
+
+import openai_client
+
+
+@pytest.fixture
+def mock_pool(monkeypatch):
+    """Route the shared client's HTTP through an in-process transport"""
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        return httpx.Response(200, json={"data": []})
+
+    def build():
+        return httpx.AsyncClient(
+            transport=httpx.MockTransport(handler),
+            event_hooks={"request": [openai_client._count_request]},
+        )
+
+    monkeypatch.setattr(openai_client, "_build_http_client", build)
+    monkeypatch.setattr(openai_client, "_requests_sent", 0)
+    yield paths
+    asyncio.run(openai_client.close_client())
+
+
+def test_one_client_is_shared_until_closed(mock_pool):
+    first = openai_client.get_client()
+    assert openai_client.get_client() is first
+    assert openai_client.get_pool_stats()["initialized"]
+
+    asyncio.run(openai_client.close_client())
+    assert not openai_client.get_pool_stats()["initialized"]
+    assert openai_client.get_client() is not first
+
+
+def test_warm_up_sends_requests_through_the_pool(mock_pool):
+    warmed = asyncio.run(openai_client.warm_up(3))
+
+    assert warmed == 3
+    assert mock_pool == ["/v1/models"] * 3
+    assert openai_client.get_pool_stats()["requests_sent"] == 3
+
+
+def test_warm_up_can_be_disabled(mock_pool):
+    assert asyncio.run(openai_client.warm_up(0)) == 0
+    assert mock_pool == []
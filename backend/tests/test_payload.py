@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import caching
+from caching import (
+    CODEC_NONE, CODEC_ZLIB, FORMAT_JSON, FORMAT_MANIFEST, FORMAT_TEXT, PAYLOAD_MAGIC,
+    BlobManifest, decode_payload, encode_payload,
+)
+
+
+@pytest.mark.parametrize("value", [
+    "Traffic generation is expected to be low.",
+    "",
+    "Ünïcödé — text",
+    {"introduction_purpose": "text", "count": 3, "nested": {"a": [1, 2]}},
+    [1, "two", None],
+    {1: "non-string key"},
+])
+def test_round_trip(value):
+    decoded = decode_payload(encode_payload(value))
+    expected = {str(k): v for k, v in value.items()} if isinstance(value, dict) else value
+    assert decoded == expected
+
+
+def test_header_records_format():
+    assert encode_payload("text")[:3] == bytes((PAYLOAD_MAGIC, 1, FORMAT_TEXT))
+    assert encode_payload({"a": 1})[2] == FORMAT_JSON
+    assert encode_payload(BlobManifest(a="digest"))[2] == FORMAT_MANIFEST
+
+
+def test_manifest_decodes_as_manifest():
+    decoded = decode_payload(encode_payload(BlobManifest(section="abc123")))
+    assert isinstance(decoded, BlobManifest)
+    assert decoded == {"section": "abc123"}
+
+
+def test_small_payloads_stay_uncompressed():
+    assert encode_payload("short")[3] == CODEC_NONE
+
+
+def test_large_payloads_are_compressed(monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_COMPRESSION", "zlib")
+    text = "The site is well served by public transport. " * 100
+    data = encode_payload(text)
+    assert data[3] == CODEC_ZLIB
+    assert len(data) < len(text)
+    assert decode_payload(data) == text
+
+
+def test_compression_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_COMPRESSION", "none")
+    assert encode_payload("x" * 10000)[3] == CODEC_NONE
+
+
+def test_legacy_entries_without_header():
+    assert decode_payload(b"plain text") == "plain text"
+    assert decode_payload("plain text") == "plain text"
+    legacy = json.dumps({"status": "finished"}).encode("utf-8")
+    assert decode_payload(legacy, legacy_json=True) == {"status": "finished"}
+    assert decode_payload(None) is None
+
+
+def test_newer_version_is_rejected():
+    data = bytearray(encode_payload("text"))
+    data[1] = 99
+    with pytest.raises(ValueError):
+        decode_payload(bytes(data))
+
+
+def test_unknown_codec_is_rejected():
+    data = bytearray(encode_payload("text"))
+    data[3] = 42
+    with pytest.raises(ValueError):
+        decode_payload(bytes(data))
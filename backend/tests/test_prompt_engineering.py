@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import prompt_engineering
+from prompt_engineering import (
+    PROMPT_REGISTRY,
+    get_batched_system_prompt,
+    get_optimized_prompt,
+    get_section_system_prompt,
+)
+from tia_generator import build_section_messages
+
+SHARED = prompt_engineering._BASE_SYSTEM_PROMPT
+
+PROJECTS = [
+    {
+        "_project_title": "Residential Apartments",
+        "_site_address": "12 Smith Street, Fitzroy",
+        "_development_type": "Residential",
+        "_council": "City of Yarra",
+    },
+    {
+        "_project_title": "Childcare Centre",
+        "_site_address": "4 Station Road, Parramatta",
+        "_development_type": "Childcare",
+        "_council": "City of Parramatta",
+    },
+]
+
+
+def test_shared_prefix_is_long_enough_to_cache():
+    # Every whitespace-separated word is at least one token
+    assert len(SHARED.split()) >= 1024
+
+
+def test_every_system_prompt_opens_with_the_shared_guide():
+    prompts = [get_section_system_prompt(s) for s in PROMPT_REGISTRY]
+    prompts += [get_section_system_prompt("unknown_section"), get_batched_system_prompt()]
+
+    for prompt in prompts:
+        assert prompt.startswith(SHARED)
+        assert len(prompt) > len(SHARED)
+
+
+@pytest.mark.parametrize("section", ["existing_conditions_road_network", "parking_proposed_provision", "conclusion_summary"])
+def test_serialized_requests_share_a_byte_identical_prefix(section):
+    requests = [
+        json.dumps(build_section_messages(other, content, project, deps)).encode()
+        for other in ("introduction_purpose", section)
+        for content, project, deps in [
+            ("Site is on the corner of two local streets with rear lane access.", PROJECTS[0], None),
+            ("x", PROJECTS[1], {"introduction_purpose": "The proposal is for a childcare centre."}),
+        ]
+    ]
+    # The system message up to the end of the guide, without its closing quote
+    prefix = ('[{"role": "system", "content": ' + json.dumps(SHARED)[:-1]).encode()
+
+    for request in requests:
+        assert request.startswith(prefix)
+
+
+def test_section_static_text_precedes_project_content():
+    first = get_optimized_prompt("parking_proposed_provision", "Forty spaces in a basement car park.",
+                                 project_title="A", council="City of Yarra")
+    second = get_optimized_prompt("parking_proposed_provision", "Twelve spaces at grade behind the building.",
+                                  project_title="B", council="City of Monash")
+    static = PROMPT_REGISTRY["parking_proposed_provision"]["prefix"]
+
+    assert first.startswith(static)
+    assert second.startswith(static)
+    assert first.endswith("CONTENT TO EXPAND: Forty spaces in a basement car park.")
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from caching import RedisCache
+from rate_limiting import ModelRateLimiter, TokenBucket, estimate_tokens
+
+
+def test_estimate_tokens_counts_prompt_and_completion_ceiling():
+    messages = [{"role": "system", "content": "x" * 40}, {"role": "user", "content": None}]
+    assert estimate_tokens(messages, 100) == 40 // 4 + 100
+
+
+def test_bucket_waits_for_refill():
+    bucket = TokenBucket(capacity=10, refill_per_second=2)
+    assert bucket.wait_time(10) == 0
+    bucket.consume(10)
+    # 4 tokens at 2/s, less whatever refilled since consume
+    assert 1.9 < bucket.wait_time(4) <= 2.0
+
+
+def test_bucket_caps_cost_at_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_second=1)
+    # A call larger than the whole bucket must still be admitted once it is full
+    assert bucket.wait_time(50) == 0
+    bucket.consume(50)
+    assert bucket.tokens == 0
+
+
+def test_local_limiter_denies_once_rpm_drained(monkeypatch):
+    limiter = ModelRateLimiter()
+    monkeypatch.setattr(limiter, "get_limits", lambda model: (3, 100000))
+
+    async def scenario():
+        return [await limiter.try_acquire("gpt-test", 10) for _ in range(4)]
+
+    assert asyncio.run(scenario()) == [True, True, True, False]
+    stats = limiter.get_stats()
+    assert stats["backend"] == "local"
+    assert stats["models"]["gpt-test"]["acquired"] == 3
+    assert stats["models"]["gpt-test"]["denied"] == 1
+
+
+def test_local_limiter_tokens_limit_independently(monkeypatch):
+    limiter = ModelRateLimiter()
+    monkeypatch.setattr(limiter, "get_limits", lambda model: (100, 1000))
+
+    async def scenario():
+        return [await limiter.try_acquire("gpt-test", 600) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [True, False]
+
+
+def test_shared_buckets_are_shared_between_limiters(fake_redis, monkeypatch):
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            first, second = ModelRateLimiter(cache), ModelRateLimiter(cache)
+            for limiter in (first, second):
+                monkeypatch.setattr(limiter, "get_limits", lambda model: (2, 100000))
+            granted = [
+                await first.try_acquire("gpt-test", 10),
+                await second.try_acquire("gpt-test", 10),
+                await first.try_acquire("gpt-test", 10),
+            ]
+            wait = await cache.acquire_rate_budget("gpt-test", 2, 100000, 10)
+            return granted, wait, second.get_stats()
+        finally:
+            await cache.close()
+
+    granted, wait, stats = asyncio.run(scenario())
+    assert granted == [True, True, False]
+    # One request at 2/min is 30s away
+    assert 25 < wait <= 30
+    assert stats["backend"] == "redis"
+    assert stats["models"]["gpt-test"]["local"] == 0
+
+
+def test_zero_capacity_bucket_is_unlimited():
+    bucket = TokenBucket(capacity=0, refill_per_second=0)
+    for _ in range(3):
+        assert bucket.wait_time(100) == 0
+        bucket.consume(100)
+
+
+@pytest.mark.parametrize("limits, calls, granted", [
+    ((0, 1000), [600, 600], [True, False]),
+    ((1, 0), [10 ** 6, 10 ** 6], [True, False]),
+    ((0, 0), [10 ** 6] * 3, [True] * 3),
+])
+def test_local_limiter_treats_zero_as_no_limit(monkeypatch, limits, calls, granted):
+    limiter = ModelRateLimiter()
+    monkeypatch.setattr(limiter, "get_limits", lambda model: limits)
+
+    async def scenario():
+        return [await limiter.try_acquire("gpt-test", tokens) for tokens in calls]
+
+    assert asyncio.run(scenario()) == granted
+
+
+@pytest.mark.parametrize("limits, calls, granted", [
+    ((0, 1000), [600, 600], [True, False]),
+    ((1, 0), [10 ** 6, 10 ** 6], [True, False]),
+    ((0, 0), [10 ** 6] * 3, [True] * 3),
+])
+def test_shared_buckets_treat_zero_as_no_limit(fake_redis, monkeypatch, limits, calls, granted):
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            limiter = ModelRateLimiter(cache)
+            monkeypatch.setattr(limiter, "get_limits", lambda model: limits)
+            results = [await limiter.try_acquire("gpt-test", tokens) for tokens in calls]
+            return results, limiter.get_stats()["models"]["gpt-test"]["local"]
+        finally:
+            await cache.close()
+
+    assert asyncio.run(scenario()) == (granted, 0)
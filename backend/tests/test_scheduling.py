@@ -0,0 +1,101 @@
+import contextvars
+
+from concurrency import request_priority
+from scheduling import BULK, INTERACTIVE, FairQueue, set_work_context
+
+
+def push(queue, waiter, tenant, job_id, work_class=INTERACTIVE, priority=0):
+    """Queue a waiter as if from a task tagged with this work context"""
+    def tagged_push():
+        set_work_context(tenant, job_id, work_class)
+        request_priority.set(priority)
+        queue.push(waiter)
+    contextvars.copy_context().run(tagged_push)
+
+
+def drain(queue):
+    return [queue.pop() for _ in range(len(queue))]
+
+
+def test_interactive_served_before_bulk():
+    queue = FairQueue(tenant_weights={})
+    push(queue, "bulk-1", "a", "job1", BULK)
+    push(queue, "interactive-1", "b", "job2", INTERACTIVE)
+    push(queue, "bulk-2", "a", "job1", BULK)
+    assert drain(queue) == ["interactive-1", "bulk-1", "bulk-2"]
+
+
+def test_unknown_class_is_interactive():
+    queue = FairQueue(tenant_weights={})
+    push(queue, "bulk", "a", "job1", BULK)
+    push(queue, "unknown", "a", "job2", "urgent")
+    assert queue.pop() == "unknown"
+
+
+def test_burst_from_one_tenant_does_not_starve_another():
+    queue = FairQueue(tenant_weights={})
+    for i in range(10):
+        push(queue, f"a{i}", "a", "job-a")
+    push(queue, "b0", "b", "job-b")
+    # b's one call goes out within the first two, not after a's burst
+    assert "b0" in drain(queue)[:2]
+
+
+def test_tenant_share_is_split_between_its_jobs():
+    queue = FairQueue(tenant_weights={})
+    for i in range(4):
+        push(queue, f"a1-{i}", "a", "job-a1")
+        push(queue, f"a2-{i}", "a", "job-a2")
+        push(queue, f"b-{i}", "b", "job-b")
+    served = drain(queue)[:6]
+    # Tenant b gets half the slots even though tenant a has two jobs
+    assert sum(1 for waiter in served if waiter.startswith("b")) == 3
+
+
+def test_weights_skew_share():
+    queue = FairQueue(tenant_weights={"heavy": 3.0})
+    for i in range(8):
+        push(queue, f"heavy-{i}", "heavy", "job-h")
+        push(queue, f"light-{i}", "light", "job-l")
+    served = drain(queue)[:8]
+    assert sum(1 for waiter in served if waiter.startswith("heavy")) == 6
+
+
+def test_priority_orders_within_a_flow():
+    queue = FairQueue(tenant_weights={})
+    push(queue, "late", "a", "job1", priority=5)
+    push(queue, "early", "a", "job1", priority=1)
+    assert drain(queue) == ["early", "late"]
+
+
+def test_discard_removes_queued_waiter():
+    queue = FairQueue(tenant_weights={})
+    push(queue, "kept", "a", "job1")
+    push(queue, "cancelled", "a", "job1")
+    queue.discard("cancelled")
+    queue.discard("never-queued")
+    assert len(queue) == 1
+    assert queue.pop() == "kept"
+    assert queue.get_stats()["queue_depth"] == 0
+
+
+def test_tenant_stats_are_bounded():
+    queue = FairQueue(tenant_weights={}, max_tracked_tenants=3)
+    for i in range(5):
+        push(queue, f"w{i}", f"tenant{i}", "job")
+        queue.pop()
+    stats = queue.get_stats()
+    assert set(stats["tenants"]) == {"tenant2", "tenant3", "tenant4"}
+    assert stats["untracked_tenants"] == 2
+
+
+def test_finish_tags_of_finished_jobs_are_pruned():
+    queue = FairQueue(tenant_weights={})
+    push(queue, "long-running", "a", "job-long")
+    push(queue, "long-running-2", "a", "job-long")
+    for i in range(500):
+        push(queue, f"w{i}", "b", f"job{i}")
+        queue.pop()
+    assert len(queue._finish_tags[INTERACTIVE]) <= 2 * len(queue._flows[INTERACTIVE]) + 101
+    # Every job was still served in turn
+    assert len(queue) == 2
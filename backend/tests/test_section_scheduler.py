@@ -0,0 +1,86 @@
+import asyncio
+
+import section_scheduler
+import tia_generator
+from section_scheduler import generation_error, is_generation_error, run_section_graph
+
+DEPENDENCIES = {"conclusion": ["traffic", "parking"]}
+
+
+def run_graph(units, outputs, monkeypatch, dependencies=DEPENDENCIES):
+    """Run a graph whose units return outputs[section]; returns (results, calls, completed)"""
+    monkeypatch.setattr(section_scheduler, "SECTION_DEPENDENCIES", dependencies)
+    calls = {}
+    completed = []
+
+    async def run_unit(unit, inputs, failed):
+        calls[tuple(unit)] = (dict(inputs), set(failed))
+        await asyncio.sleep(0)
+        return [(section, outputs[section]) for section in unit]
+
+    async def on_complete(section, content):
+        completed.append(section)
+
+    results = asyncio.run(run_section_graph(units, run_unit, {}, on_complete))
+    return results, calls, completed
+
+
+def test_dependent_gets_generated_inputs(monkeypatch):
+    outputs = {"traffic": "Traffic text", "parking": "Parking text", "conclusion": "Conclusion text"}
+    results, calls, completed = run_graph([["traffic"], ["parking"], ["conclusion"]], outputs, monkeypatch)
+    assert results == outputs
+    assert calls[("conclusion",)] == ({"traffic": "Traffic text", "parking": "Parking text"}, set())
+    assert completed[-1] == "conclusion"
+
+
+def test_failed_dependency_is_reported_not_passed_as_input(monkeypatch):
+    outputs = {
+        "traffic": generation_error("API timeout"),
+        "parking": "Parking text",
+        "conclusion": "Conclusion text",
+    }
+    _, calls, _ = run_graph([["traffic"], ["parking"], ["conclusion"]], outputs, monkeypatch)
+    inputs, failed = calls[("conclusion",)]
+    assert inputs == {"parking": "Parking text"}
+    assert failed == {"traffic"}
+
+
+def test_dependencies_outside_the_report_are_ignored(monkeypatch):
+    outputs = {"parking": "Parking text", "conclusion": "Conclusion text"}
+    _, calls, _ = run_graph([["parking"], ["conclusion"]], outputs, monkeypatch)
+    assert calls[("conclusion",)] == ({"parking": "Parking text"}, set())
+
+
+def test_dependency_cycle_runs_without_inputs(monkeypatch):
+    outputs = {"a": "A text", "b": "B text"}
+    results, calls, _ = run_graph([["a"], ["b"]], outputs, monkeypatch, dependencies={"a": ["b"], "b": ["a"]})
+    assert results == outputs
+    assert calls[("a",)] == ({}, set())
+
+
+def test_generation_error_marker():
+    assert is_generation_error(generation_error("boom"))
+    assert not is_generation_error("Generated text")
+    assert not is_generation_error(None)
+
+
+def test_section_with_failed_dependency_bypasses_shared_cache(monkeypatch):
+    class UnusableCache:
+        """Any cache access fails the test"""
+        def __getattr__(self, name):
+            raise AssertionError(f"cache used: {name}")
+
+    async def fake_generate(model, messages, token_limit, section, **kwargs):
+        return "Conclusion without traffic", 10, False
+
+    monkeypatch.setattr(tia_generator, "generate_with_continuation", fake_generate)
+
+    section, content = asyncio.run(tia_generator.generate_section(
+        "conclusion_summary",
+        "Summarise the assessment.",
+        {"_project_title": "Test", "_development_type": "Residential", "_council": "Yarra"},
+        redis_cache=UnusableCache(),
+        dependencies={"parking_justification": "Parking text"},
+        failed_dependencies={"other_traffic_generation"}
+    ))
+    assert (section, content) == ("conclusion_summary", "Conclusion without traffic")
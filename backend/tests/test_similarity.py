@@ -0,0 +1,120 @@
+import asyncio
+import random
+
+from caching import RedisCache
+from similarity import (
+    SimilarityIndex, band_hashes, estimate_similarity, minhash_signature, normalize_text,
+)
+
+WORDS = ("site", "access", "parking", "traffic", "road", "bicycle", "lane", "bus", "stop", "car",
+         "spaces", "visitor", "residential", "dwelling", "peak", "hour", "trips", "street", "footpath", "loading")
+
+
+def make_text(seed: int, words: int = 150) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def edit(text: str) -> str:
+    """Change one word and the punctuation, as a resubmitted input would"""
+    words = text.split()
+    words[len(words) // 2] = "renamed"
+    return "  ".join(words).upper() + "."
+
+
+CONTEXT = {"_development_type": "Residential"}
+
+
+def test_normalize_ignores_case_and_punctuation():
+    assert normalize_text("The SITE, at 12 Smith St.!") == "the site at 12 smith st"
+
+
+def test_near_duplicates_estimate_high_similarity():
+    text = make_text(1)
+    near = minhash_signature(normalize_text(edit(text)))
+    assert minhash_signature(normalize_text(text)) == minhash_signature(normalize_text(text))
+    assert estimate_similarity(minhash_signature(normalize_text(text)), near) >= 0.9
+
+
+def test_unrelated_texts_estimate_low_similarity():
+    a = minhash_signature(normalize_text(make_text(1)))
+    b = minhash_signature(normalize_text(make_text(2)))
+    assert estimate_similarity(a, b) < 0.5
+
+
+def test_near_duplicates_share_a_band():
+    text = make_text(1)
+    bands = set(band_hashes(minhash_signature(normalize_text(text))))
+    assert bands & set(band_hashes(minhash_signature(normalize_text(edit(text)))))
+
+
+def test_mismatched_signatures_are_not_similar():
+    assert estimate_similarity((1, 2), (1, 2, 3)) == 0.0
+    assert estimate_similarity((), ()) == 0.0
+
+
+def run_with_cache(scenario):
+    async def wrapper():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            return await scenario(cache)
+        finally:
+            await cache.close()
+    return asyncio.run(wrapper())
+
+
+def test_index_finds_near_duplicate_in_same_scope(fake_redis):
+    index = SimilarityIndex(mode="shadow", threshold=0.9)
+    text = make_text(1)
+
+    async def scenario(cache):
+        await index.add(cache, "parking_justification", text, CONTEXT, "key1")
+        return (
+            await index.find(cache, "parking_justification", edit(text), CONTEXT),
+            await index.find(cache, "parking_justification", make_text(2), CONTEXT),
+            # Other sections and development types are separate scopes
+            await index.find(cache, "introduction_purpose", edit(text), CONTEXT),
+            await index.find(cache, "parking_justification", edit(text), {"_development_type": "Retail"}),
+        )
+
+    match, unrelated, other_section, other_type = run_with_cache(scenario)
+    assert match[0] == "key1" and match[1] >= 0.9
+    assert unrelated is None and other_section is None and other_type is None
+    assert index.get_stats()["matches"] == 1
+
+
+def test_short_inputs_are_not_indexed(fake_redis):
+    index = SimilarityIndex(mode="shadow")
+
+    async def scenario(cache):
+        await index.add(cache, "parking_justification", "Two spaces.", CONTEXT, "key1")
+        return await index.find(cache, "parking_justification", "Two spaces.", CONTEXT)
+
+    assert run_with_cache(scenario) is None
+    assert index.get_stats()["lookups"] == 0
+
+
+def test_only_reuse_mode_returns_cached_output(fake_redis):
+    text = make_text(1)
+
+    async def scenario(cache):
+        await cache.set_section("parking_justification", "key1", "Generated parking text")
+        shadow, reuse = SimilarityIndex(mode="shadow"), SimilarityIndex(mode="reuse")
+        await reuse.add(cache, "parking_justification", text, CONTEXT, "key1")
+        return (
+            await shadow.find_reusable(cache, "parking_justification", edit(text), CONTEXT),
+            await reuse.find_reusable(cache, "parking_justification", edit(text), CONTEXT),
+        )
+
+    assert run_with_cache(scenario) == (None, "Generated parking text")
+
+
+def test_off_mode_does_nothing():
+    index = SimilarityIndex(mode="off")
+
+    async def scenario():
+        await index.add(object(), "parking_justification", make_text(1), CONTEXT, "key1")
+        return await index.find(object(), "parking_justification", make_text(1), CONTEXT)
+
+    assert asyncio.run(scenario()) is None
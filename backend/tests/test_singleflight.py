@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+import pytest
+
+import singleflight
+from caching import RedisCache
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_run_once():
+    flight = SingleFlight("section", enabled=True)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "text"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("key", generate) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["text"] * 5
+    assert len(calls) == 1
+    stats = flight.get_stats()
+    assert stats["executed"] == 1 and stats["joined_local"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_error_reaches_joiners_and_key_is_freed():
+    flight = SingleFlight("section", enabled=True)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.run("key", fail) for _ in range(3)), return_exceptions=True)
+        # A later call runs again rather than reusing the failure
+        retried = await flight.run("key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retried
+
+    results, retried = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "ok"
+
+
+def test_disabled_runs_every_call():
+    flight = SingleFlight("section", enabled=False)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "text"
+
+    async def scenario():
+        await asyncio.gather(*(flight.run("key", generate) for _ in range(3)))
+
+    asyncio.run(scenario())
+    assert len(calls) == 3
+
+
+def test_remote_waiter_woken_by_release(fake_redis, monkeypatch):
+    # Waiters must not depend on polling to see the holder finish
+    monkeypatch.setattr(singleflight, "SINGLEFLIGHT_POLL_INTERVAL", 5.0)
+
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            stored = {}
+
+            async def generate():
+                await asyncio.sleep(0.2)
+                stored["value"] = "text"
+                return "text"
+
+            async def fetch_result():
+                return stored.get("value")
+
+            async def never():
+                raise AssertionError("waiter generated")
+
+            # Separate instances stand in for separate workers
+            holder = asyncio.create_task(SingleFlight("section", enabled=True).run("key", generate, cache, fetch_result))
+            await asyncio.sleep(0.05)
+            waiter_flights = [SingleFlight("section", enabled=True) for _ in range(5)]
+            started = time.monotonic()
+            results = await asyncio.gather(holder, *(
+                flight.run("key", never, cache, fetch_result) for flight in waiter_flights
+            ))
+            elapsed = time.monotonic() - started
+            pubsub = cache.shared_pubsub.get_stats()
+            return results, elapsed, waiter_flights, pubsub
+        finally:
+            await cache.close()
+
+    results, elapsed, waiter_flights, pubsub = asyncio.run(scenario())
+    assert results == ["text"] * 6
+    assert elapsed < 2
+    assert all(flight.get_stats()["joined_remote"] == 1 for flight in waiter_flights)
+    # Every waiter shared the one pubsub connection and left no subscriptions behind
+    assert pubsub["channels"] == 0
+
+
+def test_remote_waiter_takes_over_failed_holder(fake_redis, monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLEFLIGHT_POLL_INTERVAL", 0.05)
+
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            async def fail():
+                await asyncio.sleep(0.1)
+                raise RuntimeError("boom")
+
+            async def no_result():
+                return None
+
+            async def generate():
+                return "text"
+
+            holder = asyncio.create_task(SingleFlight("section", enabled=True).run("key", fail, cache, no_result))
+            await asyncio.sleep(0.02)
+            waiter = SingleFlight("section", enabled=True)
+            result = await waiter.run("key", generate, cache, no_result)
+            with pytest.raises(RuntimeError):
+                await holder
+            return result, waiter.get_stats()
+        finally:
+            await cache.close()
+
+    result, stats = asyncio.run(scenario())
+    assert result == "text"
+    assert stats["executed"] == 1 and stats["joined_remote"] == 0
+
+
+def test_claim_report_attaches_to_holder(fake_redis):
+    async def scenario():
+        cache = RedisCache()
+        await cache.initialize()
+        try:
+            first = await singleflight.claim_report(cache, "report", "hash", "job1")
+            second = await singleflight.claim_report(cache, "report", "hash", "job2")
+            await singleflight.release_report(cache, "report", "hash", "job1")
+            third = await singleflight.claim_report(cache, "report", "hash", "job3")
+            return first, second, third
+        finally:
+            await cache.close()
+
+    assert asyncio.run(scenario()) == (None, "job1", None)
+
+
+def test_joiners_take_over_when_the_runner_is_cancelled():
+    flight = SingleFlight("section", enabled=True)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "text"
+
+    async def scenario():
+        runner = asyncio.create_task(flight.run("key", generate))
+        await asyncio.sleep(0)
+        joiners = [asyncio.create_task(flight.run("key", generate)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        runner.cancel()
+        results = await asyncio.gather(*joiners)
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+        return results
+
+    assert asyncio.run(scenario()) == ["text"] * 3
+    # The first joiner to wake ran it again; the others joined that run
+    assert len(calls) == 2
+    assert flight.get_stats()["in_flight"] == 0
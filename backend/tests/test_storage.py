@@ -0,0 +1,109 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from storage import DiskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DiskStore(path=str(tmp_path / "cache.sqlite3"), max_bytes=10000, ttl=60)
+    # Let the startup maintenance pass finish so tests see settled counts
+    store._maintenance.join()
+    yield store
+    store.close()
+
+
+@contextmanager
+def write_lock(store):
+    """Hold the database write lock from another connection, as a busy worker would"""
+    conn = sqlite3.connect(store.path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield
+        conn.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("value", ["text", b"\x00\xffbytes", {"a": [1, 2]}, [1, "two"]])
+def test_round_trip(store, value):
+    store.set("sections:key", value)
+    assert store.get("sections:key") == value
+
+
+def test_missing_and_expired_are_misses(store):
+    store.set("sections:old", "text", ttl=0.01)
+    time.sleep(0.02)
+    assert store.get("sections:old") is None
+    assert store.get("sections:never") is None
+    stats = store.get_stats()
+    assert stats["misses"] == 2 and stats["expirations"] == 1
+
+
+def test_values_persist_across_instances(store):
+    store.set("reports:key", {"section": "text"})
+    other = DiskStore(path=store.path)
+    try:
+        assert other.get("reports:key") == {"section": "text"}
+    finally:
+        other.close()
+
+
+def test_delete_and_clear_by_prefix(store):
+    store.set("sections:a", "1")
+    store.set("sections:b", "2")
+    store.set("reports:a", "3")
+    assert store.delete("sections:a")
+    assert not store.delete("sections:a")
+    assert store.clear("sections:") == 1
+    assert store.items() == [("reports:a", "3")]
+
+
+def test_maintenance_evicts_closest_to_expiry_and_counts_usage(store):
+    for i in range(12):
+        store.set(f"sections:{i:02d}", "x" * 1000, ttl=60 + i)
+    evicted = store.maintain()
+    assert evicted == 2
+    assert store.get("sections:00") is None and store.get("sections:01") is None
+    assert store.get("sections:11") == "x" * 1000
+    assert store.count("sections:") == {"entries": 10, "bytes": 10000}
+    assert store.count() == {"entries": 10, "bytes": 10000}
+
+
+def test_locked_write_is_skipped_quickly(store):
+    with write_lock(store):
+        started = time.monotonic()
+        store.set("sections:key", "text")
+        assert time.monotonic() - started < 1
+    assert store.get_stats()["lock_timeouts"] == 1
+    assert store.get("sections:key") is None
+
+
+def test_reads_are_not_blocked_by_a_writer(store):
+    store.set("sections:key", "text")
+    with write_lock(store):
+        assert store.get("sections:key") == "text"
+
+
+def test_locked_delete_reads_as_missing_until_flushed(store):
+    store.set("sections:key", "text")
+    with write_lock(store):
+        assert store.delete("sections:key")
+        assert store.get("sections:key") is None
+    assert store.get_stats()["lock_timeouts"] == 1
+
+    # The next write retries the delete
+    store.set("sections:other", "text")
+    assert not store._pending_deletes
+    assert store.items("sections:key") == []
+
+
+def test_rewrite_after_locked_delete_is_visible(store):
+    store.set("sections:key", "old")
+    with write_lock(store):
+        store.delete("sections:key")
+    store.set("sections:key", "new")
+    assert store.get("sections:key") == "new"
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import metrics
+from streaming import SectionDeltaPublisher
+
+
+class Channel:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, channel, message):
+        self.messages.append(json.loads(message))
+        return 1
+
+
+def test_deltas_are_batched_with_offsets():
+    channel = Channel()
+    publisher = SectionDeltaPublisher(channel.publish, "tia_updates:job", "intro", max_chars=5, max_interval=60)
+
+    async def scenario():
+        for delta in ("ab", "cd", "ef", "g"):
+            await publisher.add(delta)
+        await publisher.flush()
+
+    asyncio.run(scenario())
+    assert [(m["delta"], m["offset"]) for m in channel.messages] == [("abcdef", 0), ("g", 6)]
+    assert all(m["type"] == "delta" and m["section"] == "intro" for m in channel.messages)
+
+
+def test_stream_metrics_are_kept_per_section():
+    metrics.reset_metrics()
+    channel = Channel()
+    intro = SectionDeltaPublisher(channel.publish, "tia_updates:job", "intro", max_chars=1)
+    summary = SectionDeltaPublisher(channel.publish, "tia_updates:job", "summary", max_chars=1)
+
+    async def scenario():
+        await intro.add("abc")
+        await intro.add("de")
+        await summary.add("xyz1")
+
+    asyncio.run(scenario())
+    stats = metrics.get_streaming_metrics()
+    assert stats["delta_messages"] == 3 and stats["delta_chars"] == 9
+    assert {section: (s["messages"], s["chars"]) for section, s in stats["sections"].items()} == {
+        "intro": (2, 5), "summary": (1, 4)
+    }
+    # Time to first content is recorded once per section
+    assert stats["sections"]["intro"]["time_to_first_content"]["count"] == 1
+    assert stats["time_to_first_content"]["count"] == 2
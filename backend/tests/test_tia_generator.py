@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+
+import section_scheduler
+import tia_generator
+from tia_generator import generate_section_batch, is_batchable_section, plan_section_batches
+
+PROJECT = {"_project_title": "12 Smith Street", "_site_address": "12 Smith Street, Fitzroy"}
+
+
+@pytest.fixture
+def batching(monkeypatch):
+    monkeypatch.setattr(tia_generator, "BATCH_SECTIONS", True)
+    monkeypatch.setattr(tia_generator, "BATCH_MAX_SECTIONS", 2)
+    monkeypatch.setattr(tia_generator, "BATCH_MAX_INPUT_CHARS", 100)
+    monkeypatch.setattr(section_scheduler, "SECTION_DEPENDENCIES", {"other_loading_waste": ["proposal_facilities"]})
+
+
+def test_only_short_independent_sections_are_batchable(batching):
+    assert is_batchable_section("parking_existing_provision", "x" * 500)
+    assert is_batchable_section("proposal_facilities", "Two lifts.")
+    assert not is_batchable_section("proposal_facilities", "x" * 500)
+    assert not is_batchable_section("conclusion_summary", "Short.")
+    assert not is_batchable_section("other_loading_waste", "Kerbside collection.")
+    assert not is_batchable_section("proposal_facilities", "   ")
+
+
+def test_batches_are_packed_in_input_order(batching):
+    sections = {
+        "existing_conditions_land_use": "Vacant lot.",
+        "conclusion_summary": "Acceptable.",
+        "proposal_facilities": "Two lifts.",
+        "proposal_parking": "Basement.",
+        "parking_existing_provision": "x" * 95,
+    }
+
+    assert plan_section_batches(sections) == [
+        ["conclusion_summary"],
+        ["existing_conditions_land_use", "proposal_facilities"],
+        ["proposal_parking"],
+        ["parking_existing_provision"],
+    ]
+
+
+def test_batching_disabled_gives_single_units(monkeypatch):
+    monkeypatch.setattr(tia_generator, "BATCH_SECTIONS", False)
+    sections = {"proposal_facilities": "Two lifts.", "proposal_parking": "Basement."}
+    assert plan_section_batches(sections) == [["proposal_facilities"], ["proposal_parking"]]
+
+
+def test_batched_reply_is_split_and_gaps_fall_back(monkeypatch):
+    requests = []
+    singles = []
+
+    async def call_with_failover(model, **kwargs):
+        requests.append(kwargs)
+        return json.dumps({"proposal_facilities": " Two lifts serve all levels. ", "proposal_parking": ""})
+
+    async def generate_section(section, content, project_context, redis_cache=None, job_id=None):
+        singles.append(section)
+        return section, f"Single {section}"
+
+    monkeypatch.setattr(tia_generator, "call_with_failover", call_with_failover)
+    monkeypatch.setattr(tia_generator, "generate_section", generate_section)
+    sections = {"proposal_facilities": "Two lifts.", "proposal_parking": "Basement.", "existing_conditions_land_use": "Vacant."}
+
+    results = asyncio.run(generate_section_batch(sections, PROJECT))
+
+    assert dict(results) == {
+        "proposal_facilities": "Two lifts serve all levels.",
+        "proposal_parking": "Single proposal_parking",
+        "existing_conditions_land_use": "Single existing_conditions_land_use",
+    }
+    assert singles == ["proposal_parking", "existing_conditions_land_use"]
+    assert len(requests) == 1 and requests[0]["response_format"] == {"type": "json_object"}
+    assert requests[0]["section"] == "batch:proposal_facilities+proposal_parking+existing_conditions_land_use"
+
+
+@pytest.mark.parametrize("reply", ["not json", "[]"])
+def test_unparseable_batched_reply_falls_back_to_single_calls(monkeypatch, reply):
+    async def call_with_failover(model, **kwargs):
+        return reply
+
+    async def generate_section(section, content, project_context, redis_cache=None, job_id=None):
+        return section, f"Single {section}"
+
+    monkeypatch.setattr(tia_generator, "call_with_failover", call_with_failover)
+    monkeypatch.setattr(tia_generator, "generate_section", generate_section)
+
+    results = asyncio.run(generate_section_batch({"proposal_facilities": "Two lifts.", "proposal_parking": "Basement."}, PROJECT))
+    assert sorted(results) == [("proposal_facilities", "Single proposal_facilities"), ("proposal_parking", "Single proposal_parking")]
+
+
+class Replies:
+    """call_with_failover stand-in answering with (text, finish_reason) in turn"""
+
+    def __init__(self, *replies, model="gpt-answered"):
+        self.replies = list(replies)
+        self.model = model
+        self.calls = []
+
+    async def __call__(self, model, **kwargs):
+        self.calls.append(dict(kwargs, model=model))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        text, finish_reason = reply
+        kwargs["details"].update(model=self.model, text=text, completion_tokens=len(text), finish_reason=finish_reason)
+        return text.strip()
+
+
+def continue_section(monkeypatch, *replies):
+    replies = Replies(*replies)
+    monkeypatch.setattr(tia_generator, "call_with_failover", replies)
+    monkeypatch.setattr(tia_generator, "MAX_CONTINUATIONS", 2)
+    messages = [{"role": "user", "content": "Write it"}]
+    result = asyncio.run(tia_generator.generate_with_continuation("gpt-test", messages, 1000, "intro"))
+    return result, replies.calls
+
+
+def test_reply_cut_off_is_continued(monkeypatch):
+    (text, tokens, truncated), calls = continue_section(
+        monkeypatch, ("The site is ", "length"), ("on Smith Street.", "stop")
+    )
+
+    assert (text, tokens, truncated) == ("The site is on Smith Street.", 28, False)
+    # The continuation goes to the model that answered, with the reply so far
+    assert calls[1]["model"] == "gpt-answered"
+    assert calls[1]["messages"][-2] == {"role": "assistant", "content": "The site is "}
+    assert calls[1]["max_tokens"] == 500
+
+
+def test_continuations_are_capped(monkeypatch):
+    (text, _, truncated), calls = continue_section(monkeypatch, ("a", "length"), ("b", "length"), ("c", "length"))
+
+    assert (text, truncated) == ("abc", True)
+    assert len(calls) == 3
+
+
+def test_failed_continuation_keeps_text_marked_truncated(monkeypatch):
+    (text, tokens, truncated), _ = continue_section(monkeypatch, ("The site is", "length"), RuntimeError("timeout"))
+
+    assert (text, tokens, truncated) == ("The site is", 11, True)
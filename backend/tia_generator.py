@@ -9,9 +9,8 @@ import json
 import time
 import asyncio
 import logging
-import hashlib
 import traceback
-from typing import Dict, Any, List, Tuple, Optional, Set
+from typing import Dict, Any, List, Tuple, Optional, Set, Callable, Awaitable
 
 # Update imports
 from openai import AsyncOpenAI
@@ -19,8 +18,32 @@ import openai
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from dotenv import load_dotenv
 
-from prompt_engineering import get_optimized_prompt, get_section_system_prompt
-from model_selection import select_model_for_section
+from prompt_engineering import (
+    get_optimized_prompt,
+    get_section_system_prompt,
+    get_batched_prompt,
+    get_batched_system_prompt,
+    get_continuation_prompt
+)
+from model_selection import (
+    select_model_for_section,
+    FAST_MODEL_SECTIONS,
+    HIGH_COMPLEXITY_SECTIONS,
+    COMPLEXITY_THRESHOLD
+)
+from openai_client import get_client
+from pricing import build_cost_breakdown
+from concurrency import AdaptiveConcurrencyLimiter
+from rate_limiting import rate_limiter, estimate_tokens
+from hedging import hedge_policy
+from streaming import SectionDeltaPublisher, STREAM_SECTIONS
+from circuit_breaker import circuit_breakers, is_service_failure
+from length_prediction import length_predictor
+from section_scheduler import run_section_graph, get_section_dependencies, generation_error
+from scheduling import fair_queue, set_work_context, INTERACTIVE
+from singleflight import section_flight, release_report
+from similarity import similarity_index
+from canonicalization import stable_hash, report_hash, fold_case
 import metrics
 
 # Initialize logging
@@ -37,10 +60,22 @@ DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
 DEFAULT_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
 DEFAULT_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))  # Reduced per section
 DEFAULT_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+# Continuation calls allowed when a section is cut off by max_tokens
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", "2"))
+CONTINUATION_MIN_TOKENS = int(os.getenv("CONTINUATION_MIN_TOKENS", "200"))
 DEFAULT_CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "5"))
 
-# Concurrency control
-api_semaphore = asyncio.Semaphore(DEFAULT_CONCURRENCY_LIMIT)
+# Multi-section batching for short, cheap sections
+BATCH_SECTIONS = os.getenv("BATCH_SECTIONS", "").lower() == "true"
+BATCH_MAX_SECTIONS = int(os.getenv("BATCH_MAX_SECTIONS", "4"))
+BATCH_MAX_INPUT_CHARS = int(os.getenv("BATCH_MAX_INPUT_CHARS", "600"))  # Combined input per batch
+BATCH_TOKENS_PER_SECTION = int(os.getenv("BATCH_TOKENS_PER_SECTION", "350"))
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "1400"))  # max_tokens for one batch
+
+# Concurrency control (adapts between CONCURRENCY_MIN and CONCURRENCY_MAX);
+# queued calls are served fairly across tenants and jobs
+api_limiter = AdaptiveConcurrencyLimiter(initial_limit=DEFAULT_CONCURRENCY_LIMIT, queue=fair_queue)
+metrics.register_metrics_provider("concurrency", api_limiter.get_stats)
 
 def validate_input_data(data: Dict[str, Any]) -> List[str]:
     """
@@ -110,20 +145,75 @@ def extract_sections(data: Dict[str, Any]) -> Dict[str, str]:
     
     return sections
 
-def get_cache_key(section: str, content: str, project_context: Dict[str, str]) -> str:
+def get_cache_key(
+    section: str,
+    content: str,
+    project_context: Dict[str, str],
+    dependencies: Optional[Dict[str, str]] = None
+) -> str:
     """
     Generate deterministic cache key based on input data
+    (and the generated sections it builds on, if any).
+    Expects canonical input (see canonicalization.canonicalize_request).
     """
     # Include project context in the key for better matching
-    context_str = json.dumps({
+    key_data = {
         "section": section,
         "content": content,
-        "project_title": project_context.get("_project_title", ""),
-        "development_type": project_context.get("_development_type", ""),
-        "council": project_context.get("_council", "")
-    }, sort_keys=True)
+        "project_title": project_context.get("_project_title") or "",
+        "development_type": fold_case(project_context.get("_development_type") or ""),
+        "council": fold_case(project_context.get("_council") or "")
+    }
+    if dependencies:
+        key_data["dependencies"] = dependencies
+    
+    return stable_hash(key_data)
+
+async def get_cached_section(
+    section: str,
+    content: str,
+    project_context: Dict[str, str],
+    redis_cache,
+    dependencies: Optional[Dict[str, str]] = None
+) -> Optional[str]:
+    """
+    Look a section up in the cache: by exact key, then (for sections without
+    dependencies) by near-duplicate input if similarity reuse is enabled
+    """
+    cache_key = get_cache_key(section, content, project_context, dependencies)
+    cached_result = await redis_cache.get_section(section, cache_key)
+    if cached_result:
+        logger.info(f"Cache hit for section {section}")
+        metrics.record_cache_hit(section)
+        return cached_result
     
-    return hashlib.md5(context_str.encode()).hexdigest()
+    if dependencies:
+        return None
+    similar_result = await similarity_index.find_reusable(redis_cache, section, content, project_context)
+    if similar_result:
+        # Store under the exact key too; the text itself is shared, not copied
+        await redis_cache.set_section(section, cache_key, similar_result)
+    return similar_result
+
+async def cache_section(
+    section: str,
+    content: str,
+    project_context: Dict[str, str],
+    result: str,
+    redis_cache,
+    dependencies: Optional[Dict[str, str]] = None
+):
+    """Cache a generated section and index its input for near-duplicate lookup"""
+    cache_key = get_cache_key(section, content, project_context, dependencies)
+    await redis_cache.set_section(section, cache_key, result)
+    if not dependencies:
+        await similarity_index.add(redis_cache, section, content, project_context, cache_key)
+
+def get_report_hash(data: Dict[str, Any]) -> str:
+    """
+    Generate the cache key for a full (canonical) report request
+    """
+    return report_hash(data)
 
 def prioritize_sections() -> Dict[str, int]:
     """
@@ -152,90 +242,251 @@ def prioritize_sections() -> Dict[str, int]:
         "conclusion_summary": 14,
     }
 
+def _circuit_closed(retry_state) -> bool:
+    """Don't keep retrying a model whose circuit breaker has opened"""
+    return circuit_breakers.is_available(retry_state.kwargs.get("model"))
+
 @retry(
     stop=stop_after_attempt(DEFAULT_MAX_RETRIES),
     wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError)),
+    retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError)) & _circuit_closed,
     reraise=True
 )
-async def call_openai_api(model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+async def call_openai_api(
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    section: Optional[str] = None,
+    job_id: Optional[str] = None,
+    stream_to: Optional[SectionDeltaPublisher] = None,
+    response_format: Optional[Dict[str, str]] = None,
+    details: Optional[Dict[str, Any]] = None
+) -> str:
     """
-    Call OpenAI API with retry logic, optimized for async operation
+    Call OpenAI API with retry logic, optimized for async operation.
+    Token usage from the response is recorded against the section and job.
+    If stream_to is given the completion is streamed and token deltas are
+    published through it as they arrive; the full text is still returned.
+    response_format is passed through for structured (JSON) output.
+    If details is given it is filled with the model, finish_reason,
+    completion_tokens and unstripped text of the reply.
     """
-    async with api_semaphore:  # Limit concurrent API calls
+    # Wait for shared RPM/TPM budget up front rather than running into 429s
+    estimated_tokens = estimate_tokens(messages, max_tokens)
+    await rate_limiter.acquire(model, estimated_tokens)
+    
+    async with api_limiter:  # Limit concurrent API calls
         start_time = time.time()
         try:
-            # Fix: Use the correct async pattern for current OpenAI SDK
-            # The client doesn't have an 'acreate' method, we need to use the async client
-            client = openai.AsyncOpenAI(api_key=openai.api_key)
-            response = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            # Shared client so connections are reused across sections and jobs
+            client = get_client()
+            # Set if a backup request was sent (streamed calls are never hedged)
+            hedged = []
+            
+            if stream_to:
+                text, usage, finish_reason = await _stream_completion(
+                    client, model, messages, max_tokens, temperature, stream_to
+                )
+            else:
+                extra_args = {"response_format": response_format} if response_format else {}
+                
+                def record_hedge_loser(loser):
+                    # A loser cancelled in flight has at least had its prompt processed
+                    if loser is not None and loser.usage:
+                        prompt_tokens, completion_tokens = loser.usage.prompt_tokens, loser.usage.completion_tokens
+                    else:
+                        prompt_tokens, completion_tokens = estimate_tokens(messages, 0), 0
+                    hedge_policy.record_overhead(model, prompt_tokens, completion_tokens, estimated=loser is None)
+                    metrics.record_token_usage(model, prompt_tokens, completion_tokens, section=section, job_id=job_id, hedged=True)
+                
+                # Slow calls may be hedged with a duplicate request (shares this slot)
+                response = await hedge_policy.call(
+                    model,
+                    lambda: client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **extra_args
+                    ),
+                    can_hedge=lambda: rate_limiter.try_acquire(model, estimated_tokens),
+                    on_loser=record_hedge_loser,
+                    on_hedge=lambda: hedged.append(True)
+                )
+                choice = response.choices[0]
+                text, usage, finish_reason = choice.message.content, response.usage, choice.finish_reason
             
             # Extract and return the response text
-            result = response.choices[0].message.content.strip()
+            result = (text or "").strip()
             
-            # Record metrics
+            # Record metrics using the token counts the API actually reports
             duration = time.time() - start_time
-            metrics.record_api_call(model, duration, max_tokens)
+            prompt_tokens = usage.prompt_tokens if usage else 0
+            completion_tokens = usage.completion_tokens if usage else 0
+            prompt_details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = (getattr(prompt_details, "cached_tokens", 0) or 0) if prompt_details else 0
+            metrics.record_api_call(
+                model,
+                duration,
+                prompt_tokens + completion_tokens,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cached_tokens=cached_tokens
+            )
+            metrics.record_token_usage(
+                model, prompt_tokens, completion_tokens, section=section, job_id=job_id, hedged=bool(hedged)
+            )
+            api_limiter.on_success(duration, key=model)
+            
+            if details is not None:
+                details.update({
+                    "model": model,
+                    "finish_reason": finish_reason,
+                    "completion_tokens": completion_tokens,
+                    "text": text or ""
+                })
             
             return result
             
-        except (openai.RateLimitError, openai.APIConnectionError) as e:
+        except openai.RateLimitError as e:
+            # Back off concurrency, then let tenacity retry
+            logger.warning(f"OpenAI rate limit (will retry): {str(e)}")
+            metrics.record_api_failure(model, str(e), service_fault=False)
+            api_limiter.on_throttle()
+            raise
+            
+        except openai.APIConnectionError as e:
             # These errors are automatically retried
             logger.warning(f"OpenAI API error (will retry): {str(e)}")
             metrics.record_api_failure(model, str(e))
+            api_limiter.on_error()
             raise
             
         except Exception as e:
-            # Other errors are logged and re-raised
+            # Other errors are logged and re-raised; only 5xx count against the model
             logger.error(f"OpenAI API error: {str(e)}")
-            metrics.record_api_failure(model, str(e))
+            metrics.record_api_failure(model, str(e), service_fault=is_service_failure(e))
+            api_limiter.on_error()
             raise
-async def generate_section(
-    section: str, 
-    content: str,
-    project_context: Dict[str, str],
-    redis_cache = None
-) -> Tuple[str, str]:
+
+async def call_with_failover(model: str, **kwargs) -> str:
     """
-    Generate a single TIA section asynchronously
+    call_openai_api, routed around open circuit breakers. If the call fails
+    and the model's breaker has opened meanwhile, it is retried once on the
+    fallback model instead of surfacing the error.
     """
-    if not content or content.strip() == "":
-        return section, ""
+    routed = circuit_breakers.route(model)
+    try:
+        return await call_openai_api(model=routed, **kwargs)
+    except Exception as e:
+        # Only a failure that opened the circuit fails over; route() would
+        # use up a half-open probe of a model that isn't being called
+        if circuit_breakers.is_available(routed):
+            raise
+        fallback = circuit_breakers.route(routed)
+        if fallback == routed:
+            raise
+        logger.warning(f"{routed} failed with circuit open, failing over to {fallback}: {str(e)}")
+        if kwargs.get("stream_to"):
+            kwargs["stream_to"].reset()
+        return await call_openai_api(model=fallback, **kwargs)
+
+async def _stream_completion(
+    client,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    stream_to: SectionDeltaPublisher
+) -> Tuple[str, Any, Optional[str]]:
+    """
+    Stream a chat completion, forwarding token deltas to stream_to.
+    Returns the full text, the usage reported in the final chunk and the finish reason.
+    """
+    stream_to.reset()
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
     
-    # Check cache if available
-    if redis_cache:
-        cache_key = get_cache_key(section, content, project_context)
-        cached_result = await redis_cache.get_section(section, cache_key)
-        if cached_result:
-            logger.info(f"Cache hit for section {section}")
-            metrics.record_cache_hit(section)
-            return section, cached_result
+    parts = []
+    usage = None
+    finish_reason = None
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].finish_reason:
+            finish_reason = chunk.choices[0].finish_reason
+        if chunk.choices and chunk.choices[0].delta.content:
+            delta = chunk.choices[0].delta.content
+            parts.append(delta)
+            await stream_to.add(delta)
     
-    # Select appropriate model based on section complexity
-    content_length = len(content)
-    model = select_model_for_section(section, content_length)
+    await stream_to.flush()
+    return "".join(parts), usage, finish_reason
+
+async def record_job_cost(
+    job_id: str,
+    redis_cache = None,
+    earlier_calls: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Build the cost breakdown for a job from its recorded token usage
+    (plus earlier_calls, usage popped before, e.g. by an earlier batch stage)
+    and store it alongside the job
+    """
+    usage = metrics.pop_job_usage(job_id)
+    breakdown = build_cost_breakdown({"calls": (earlier_calls or []) + usage["calls"]})
+    metrics.record_report_cost(
+        breakdown["total_cost"],
+        breakdown["prompt_tokens"],
+        breakdown["completion_tokens"]
+    )
+    logger.info(
+        f"Job {job_id} used {breakdown['prompt_tokens']} prompt + "
+        f"{breakdown['completion_tokens']} completion tokens (${breakdown['total_cost']:.4f})"
+    )
+    
+    if redis_cache:
+        await redis_cache.set_job_cost(job_id, breakdown)
     
+    return breakdown
+
+def build_section_messages(
+    section: str,
+    content: str,
+    project_context: Dict[str, str],
+    dependencies: Optional[Dict[str, str]] = None
+) -> List[Dict[str, str]]:
+    """
+    Build the chat messages for generating a single section
+    """
     # Get optimized prompt for this section
     system_prompt = get_section_system_prompt(section)
     user_prompt = get_optimized_prompt(
         section, 
         content, 
+        related_sections=dependencies,
         project_title=project_context.get("_project_title", ""),
         site_address=project_context.get("_site_address", ""),
         development_type=project_context.get("_development_type", ""),
         council=project_context.get("_council", "")
     )
     
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
-    
+
+def get_section_token_limit(section: str) -> int:
+    """
+    Get the max_tokens to request for a section
+    """
     # Set appropriate token limit based on section
     token_limit = DEFAULT_MAX_TOKENS
     if section in ["introduction_purpose", "conclusion_summary"]:
@@ -243,82 +494,364 @@ async def generate_section(
     elif section in ["existing_conditions_road_network", "proposal_description"]:
         token_limit = 1200  # Potentially longer sections
     
+    return token_limit
+
+async def generate_with_continuation(
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    section: str,
+    job_id: Optional[str] = None,
+    stream_to: Optional[SectionDeltaPublisher] = None
+) -> Tuple[str, int, bool]:
+    """
+    Generate a section, continuing the reply (up to MAX_CONTINUATIONS times)
+    when it is cut off by max_tokens instead of regenerating it.
+    Returns the text, total completion tokens and whether it is still truncated
+    (also the case when a continuation fails, leaving the text cut off).
+    """
+    details = {}
+    text = await call_with_failover(
+        model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=DEFAULT_TEMPERATURE,
+        section=section,
+        job_id=job_id,
+        stream_to=stream_to,
+        details=details
+    )
+    if not details:
+        return text, 0, False
+    
+    # Continue on whichever model actually answered (it may have failed over)
+    model = details["model"]
+    raw_text = details["text"]
+    completion_tokens = details["completion_tokens"]
+    continuations = 0
+    
+    while details.get("finish_reason") == "length" and continuations < MAX_CONTINUATIONS:
+        continuations += 1
+        length_predictor.record_continuation(section)
+        logger.info(f"Section {section} hit max_tokens ({max_tokens}), continuing ({continuations}/{MAX_CONTINUATIONS})")
+        
+        if stream_to:
+            stream_to.resume_from(len(raw_text))
+        
+        details = {}
+        try:
+            await call_with_failover(
+                model,
+                messages=messages + [
+                    {"role": "assistant", "content": raw_text},
+                    {"role": "user", "content": get_continuation_prompt()}
+                ],
+                max_tokens=max(max_tokens // 2, CONTINUATION_MIN_TOKENS),
+                temperature=DEFAULT_TEMPERATURE,
+                section=section,
+                job_id=job_id,
+                stream_to=stream_to,
+                details=details
+            )
+        except Exception as e:
+            logger.error(f"Continuation {continuations} of section {section} failed: {str(e)}")
+        if not details:
+            # No reply to append; what we have is still cut off
+            return raw_text.strip(), completion_tokens, True
+        raw_text += details["text"]
+        completion_tokens += details["completion_tokens"]
+    
+    return raw_text.strip(), completion_tokens, details.get("finish_reason") == "length"
+
+async def generate_section(
+    section: str, 
+    content: str,
+    project_context: Dict[str, str],
+    redis_cache = None,
+    job_id: Optional[str] = None,
+    stream: bool = False,
+    dependencies: Optional[Dict[str, str]] = None,
+    failed_dependencies: Optional[Set[str]] = None
+) -> Tuple[str, str]:
+    """
+    Generate a single TIA section asynchronously.
+    With stream=True, token deltas are published on the job's update channel
+    while the section is generated. dependencies holds the generated text
+    of sections this one builds on; failed_dependencies names those that
+    failed, in which case the section is generated without them and neither
+    read from nor written to the cache.
+    """
+    if not content or content.strip() == "":
+        return section, ""
+    
+    cache_key = get_cache_key(section, content, project_context, dependencies)
+    # Text built on incomplete inputs must not be served for complete ones
+    shared_cache = None if failed_dependencies else redis_cache
+    
+    # Check cache if available
+    if shared_cache:
+        cached_result = await get_cached_section(section, content, project_context, redis_cache, dependencies)
+        if cached_result:
+            return section, cached_result
+    
+    async def generate() -> str:
+        # Select appropriate model based on section complexity
+        content_length = len(content)
+        model = select_model_for_section(section, content_length)
+        
+        messages = build_section_messages(section, content, project_context, dependencies)
+        # Size max_tokens from this section's observed output lengths once there is enough history
+        token_limit = length_predictor.predict(section, content_length, get_section_token_limit(section))
+        
+        stream_to = None
+        if stream and redis_cache and job_id:
+            stream_to = SectionDeltaPublisher(redis_cache.publish, f"tia_updates:{job_id}", section)
+        
+        start_time = time.time()
+        try:
+            # Call OpenAI API (failing over if the model's circuit is open)
+            result, completion_tokens, truncated = await generate_with_continuation(
+                model,
+                messages,
+                token_limit,
+                section,
+                job_id=job_id,
+                stream_to=stream_to
+            )
+            length_predictor.observe(section, content_length, completion_tokens, truncated=truncated)
+        
+            # Cache the result if cache is available; text left cut off is
+            # returned for this report but not reused
+            if shared_cache and not truncated:
+                await cache_section(section, content, project_context, result, redis_cache, dependencies)
+        
+            metrics.record_section_generation(section, time.time() - start_time)
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error generating section {section}: {str(e)}")
+            metrics.record_section_failure(section, str(e))
+            return generation_error(str(e))
+    
+    # Join an identical section already being generated (by this or another job)
+    result = await section_flight.run(
+        cache_key,
+        generate,
+        redis_cache=shared_cache,
+        fetch_result=(lambda: shared_cache.get_section(section, cache_key)) if shared_cache else None
+    )
+    return section, result
+
+def is_batchable_section(section: str, content: str) -> bool:
+    """Short, low-complexity sections without dependencies can share one request"""
+    if not content or not content.strip() or section in HIGH_COMPLEXITY_SECTIONS:
+        return False
+    if get_section_dependencies(section):
+        return False
+    return section in FAST_MODEL_SECTIONS or len(content) <= COMPLEXITY_THRESHOLD
+
+def plan_section_batches(sections: Dict[str, str]) -> List[List[str]]:
+    """
+    Group sections into work units: batches of short sections packed up to
+    BATCH_MAX_SECTIONS / BATCH_MAX_INPUT_CHARS / BATCH_TOKEN_BUDGET, and
+    single sections for everything else. Input order is preserved.
+    """
+    units = []
+    batch, batch_chars = [], 0
+    
+    for section, content in sections.items():
+        if not BATCH_SECTIONS or not is_batchable_section(section, content):
+            units.append([section])
+            continue
+        
+        fits = (
+            len(batch) < BATCH_MAX_SECTIONS
+            and batch_chars + len(content) <= BATCH_MAX_INPUT_CHARS
+            and (len(batch) + 1) * BATCH_TOKENS_PER_SECTION <= BATCH_TOKEN_BUDGET
+        )
+        if batch and not fits:
+            units.append(batch)
+            batch, batch_chars = [], 0
+        
+        batch.append(section)
+        batch_chars += len(content)
+    
+    if batch:
+        units.append(batch)
+    
+    return units
+
+async def generate_section_batch(
+    sections: Dict[str, str],
+    project_context: Dict[str, str],
+    redis_cache = None,
+    job_id: Optional[str] = None
+) -> List[Tuple[str, str]]:
+    """
+    Generate several short sections with one structured (JSON) request.
+    Each section is cached under its own key; sections missing from an
+    unparseable or incomplete reply fall back to individual calls.
+    """
+    results = []
+    pending = {}
+    
+    # Serve what we can from cache first
+    for section, content in sections.items():
+        if redis_cache:
+            cached_result = await get_cached_section(section, content, project_context, redis_cache)
+            if cached_result:
+                results.append((section, cached_result))
+                continue
+        pending[section] = content
+    
+    if len(pending) < 2:
+        for section, content in pending.items():
+            results.append(await generate_section(section, content, project_context, redis_cache, job_id))
+        return results
+    
+    # Use the fast model only if every section in the batch would have used it
+    models = {select_model_for_section(section, len(content)) for section, content in pending.items()}
+    model = models.pop() if len(models) == 1 else DEFAULT_MODEL
+    
+    messages = [
+        {"role": "system", "content": get_batched_system_prompt()},
+        {"role": "user", "content": get_batched_prompt(
+            pending,
+            project_title=project_context.get("_project_title", ""),
+            site_address=project_context.get("_site_address", ""),
+            development_type=project_context.get("_development_type", ""),
+            council=project_context.get("_council", "")
+        )}
+    ]
+    
     start_time = time.time()
+    parsed = {}
     try:
-        # Call OpenAI API
-        result = await call_openai_api(
-            model=model,
+        reply = await call_with_failover(
+            model,
             messages=messages,
-            max_tokens=token_limit,
-            temperature=DEFAULT_TEMPERATURE
+            max_tokens=min(BATCH_TOKEN_BUDGET, BATCH_TOKENS_PER_SECTION * len(pending)),
+            temperature=DEFAULT_TEMPERATURE,
+            section="batch:" + "+".join(pending),
+            job_id=job_id,
+            response_format={"type": "json_object"}
         )
+        parsed = json.loads(reply)
+        if not isinstance(parsed, dict):
+            raise ValueError("batched reply is not a JSON object")
+    except Exception as e:
+        logger.warning(f"Batched generation failed for {list(pending)}, falling back to single calls: {str(e)}")
+        parsed = {}
+    
+    duration = time.time() - start_time
+    fallback = {}
+    for section, content in pending.items():
+        result = parsed.get(section)
+        if not isinstance(result, str) or not result.strip():
+            fallback[section] = content
+            continue
         
-        # Cache the result if cache is available
+        result = result.strip()
         if redis_cache:
-            cache_key = get_cache_key(section, content, project_context)
-            await redis_cache.set_section(section, cache_key, result)
-        
-        metrics.record_section_generation(section, time.time() - start_time)
-        return section, result
+            await cache_section(section, content, project_context, result, redis_cache)
+        metrics.record_section_generation(section, duration)
+        results.append((section, result))
+    
+    metrics.record_section_batch(len(pending), len(fallback))
+    
+    if fallback:
+        results.extend(await asyncio.gather(*[
+            generate_section(section, content, project_context, redis_cache, job_id)
+            for section, content in fallback.items()
+        ]))
+    
+    return results
+
+async def generate_report_sections(
+    job_id: str,
+    sections: Dict[str, str],
+    redis_cache = None,
+    stream: bool = False,
+    on_complete: Optional[Callable[[str, str], Awaitable[None]]] = None
+) -> Dict[str, str]:
+    """
+    Generate every non-empty section of a report. Independent sections (and
+    batches of short ones) all start at once; sections with dependencies
+    start when the sections they build on are done. on_complete is called
+    with each section as it finishes.
+    """
+    priorities = prioritize_sections()
+    project_context = {k: v for k, v in sections.items() if k.startswith("_")}
+    section_keys = sorted(
+        [s for s in sections.keys() if not s.startswith("_") and sections[s]],
+        key=lambda s: priorities.get(s, 999)
+    )
+    
+    async def run_unit(unit: List[str], inputs: Dict[str, str], failed: Set[str]) -> List[Tuple[str, str]]:
+        # Short sections may be packed into batches (when BATCH_SECTIONS is on)
+        if len(unit) > 1:
+            return await generate_section_batch(
+                sections={section: sections[section] for section in unit},
+                project_context=project_context,
+                redis_cache=redis_cache,
+                job_id=job_id
+            )
         
-    except Exception as e:
-        logger.error(f"Error generating section {section}: {str(e)}")
-        metrics.record_section_failure(section, str(e))
-        return section, f"Error generating content: {str(e)}"
+        return [await generate_section(
+            section=unit[0],
+            content=sections[unit[0]],
+            project_context=project_context,
+            redis_cache=redis_cache,
+            job_id=job_id,
+            stream=stream,
+            dependencies=inputs or None,
+            failed_dependencies=failed or None
+        )]
+    
+    units = plan_section_batches({section: sections[section] for section in section_keys})
+    results = await run_section_graph(units, run_unit, priorities, on_complete)
+    
+    # Report order follows priority, not completion order
+    return {section: results[section] for section in section_keys if section in results}
 
-async def generate_tia_report(job_id: str, data: Dict[str, Any], redis_cache = None) -> Dict[str, str]:
+async def generate_tia_report(
+    job_id: str,
+    data: Dict[str, Any],
+    redis_cache = None,
+    tenant: Optional[str] = None,
+    work_class: str = INTERACTIVE
+) -> Dict[str, str]:
     """
-    Generate a complete TIA report using parallel processing
+    Generate a complete TIA report using parallel processing.
+    tenant and work_class decide how its API calls are scheduled against other jobs.
     """
     start_time = time.time()
+    set_work_context(tenant, job_id, work_class)
     
     try:
         logger.info(f"Starting TIA generation for job {job_id}")
         
         # Update job status
         if redis_cache:
-            await redis_cache.set_job_status(job_id, "processing")
-            await redis_cache.set_job_input(job_id, data)
+            await redis_cache.start_job(job_id, data)
         
         # Extract sections from input data
         sections = extract_sections(data)
-        priorities = prioritize_sections()
         
-        # Create tasks for all sections, sorted by priority
-        tasks = []
-        section_keys = sorted(
-            [s for s in sections.keys() if not s.startswith("_")],
-            key=lambda s: priorities.get(s, 999)
-        )
-        
-        for section in section_keys:
-            tasks.append(
-                generate_section(
-                    section=section,
-                    content=sections[section],
-                    project_context={k: v for k, v in sections.items() if k.startswith("_")},
-                    redis_cache=redis_cache
-                )
-            )
-        
-        # Run all tasks concurrently with bounded concurrency
-        results = await asyncio.gather(*tasks)
+        # Generate all sections, each starting as soon as its inputs are ready
+        results = await generate_report_sections(job_id, sections, redis_cache)
         
         # Combine results
-        final_report = {section: content for section, content in results if section and content}
+        final_report = {section: content for section, content in results.items() if section and content}
         
         total_time = time.time() - start_time
         logger.info(f"TIA generation completed in {total_time:.2f}s for job {job_id}")
-        metrics.record_full_report_generation(total_time, len(final_report))
+        metrics.record_full_report_generation(total_time, len(final_report), hedged=metrics.job_was_hedged(job_id))
+        await record_job_cost(job_id, redis_cache)
         
-        # Update job status and store result
+        # Store the result, also under the report hash for future similar requests
         if redis_cache:
-            await redis_cache.set_job_result(job_id, final_report)
-            await redis_cache.set_job_status(job_id, "finished")
-            
-            # Generate cache key for the full report for future similar requests
-            report_hash = hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
-            await redis_cache.set_report_hash(report_hash, final_report)
+            await redis_cache.finish_job(job_id, final_report, report_hash=get_report_hash(data))
         
         return final_report
         
@@ -327,17 +860,29 @@ async def generate_tia_report(job_id: str, data: Dict[str, Any], redis_cache = N
         logger.error(error_msg)
         
         # Update job status
+        await record_job_cost(job_id, redis_cache)
         if redis_cache:
-            await redis_cache.set_job_error(job_id, error_msg)
-            await redis_cache.set_job_status(job_id, "failed")
+            await redis_cache.fail_job(job_id, error_msg)
         
         return {"error": str(e), "traceback": traceback.format_exc()}
+    
+    finally:
+        # Let identical requests arriving from now on start their own job (or hit the cache)
+        await release_report(redis_cache, "report", get_report_hash(data), job_id)
 
-async def generate_tia_report_progressive(job_id: str, data: Dict[str, Any], redis_cache = None) -> None:
+async def generate_tia_report_progressive(
+    job_id: str,
+    data: Dict[str, Any],
+    redis_cache = None,
+    tenant: Optional[str] = None,
+    work_class: str = INTERACTIVE
+) -> None:
     """
-    Generate a TIA report with progressive updates sent via Redis pubsub
+    Generate a TIA report with progressive updates sent via Redis pubsub.
+    tenant and work_class decide how its API calls are scheduled against other jobs.
     """
     start_time = time.time()
+    set_work_context(tenant, job_id, work_class)
     completed_sections: Set[str] = set()
     
     try:
@@ -345,100 +890,59 @@ async def generate_tia_report_progressive(job_id: str, data: Dict[str, Any], red
         
         # Update job status
         if redis_cache:
-            await redis_cache.set_job_status(job_id, "processing")
-            await redis_cache.set_job_input(job_id, data)
+            await redis_cache.start_job(job_id, data)
         
         # Extract sections from input data
         sections = extract_sections(data)
-        priorities = prioritize_sections()
-        
-        # Sort sections by priority
-        section_keys = sorted(
-            [s for s in sections.keys() if not s.startswith("_")],
-            key=lambda s: priorities.get(s, 999)
-        )
-        
-        # Process in batches based on priority tiers
-        priority_tiers = {}
-        for section in section_keys:
-            priority = priorities.get(section, 999)
-            if priority not in priority_tiers:
-                priority_tiers[priority] = []
-            priority_tiers[priority].append(section)
-        
-        # Get context that will be shared across all sections
-        project_context = {k: v for k, v in sections.items() if k.startswith("_")}
         
-        # Process each priority tier
-        final_report = {}
-        for priority in sorted(priority_tiers.keys()):
-            tier_sections = priority_tiers[priority]
+        async def publish_section(section: str, content: str):
+            completed_sections.add(section)
             
-            # Create tasks for this tier
-            tasks = []
-            for section in tier_sections:
-                if sections[section]:  # Only process non-empty sections
-                    tasks.append(
-                        generate_section(
-                            section=section,
-                            content=sections[section],
-                            project_context=project_context,
-                            redis_cache=redis_cache
-                        )
-                    )
-            
-            # Skip if no tasks in this tier
-            if not tasks:
-                continue
+            # Publish each section as soon as it completes, recording it first so
+            # clients that subscribe later (e.g. attached duplicates) can replay it
+            if redis_cache:
+                await redis_cache.add_job_section(job_id, section, content)
+                section_data = json.dumps({section: content})
+                await redis_cache.publish(f"tia_updates:{job_id}", section_data)
                 
-            # Process this tier
-            tier_results = await asyncio.gather(*tasks)
-            
-            # Publish each completed section
-            for section, content in tier_results:
-                if section and content:
-                    final_report[section] = content
-                    completed_sections.add(section)
-                    
-                    # Publish section update
-                    if redis_cache:
-                        section_data = json.dumps({section: content})
-                        await redis_cache.publish(f"tia_updates:{job_id}", section_data)
-                        
-                        # Update metrics
-                        metrics.record_progressive_update(section)
-            
-            # Brief pause between tiers to allow frontend to process
-            await asyncio.sleep(0.1)
+                # Update metrics
+                metrics.record_progressive_update(section)
+        
+        results = await generate_report_sections(
+            job_id,
+            sections,
+            redis_cache,
+            stream=STREAM_SECTIONS,
+            on_complete=publish_section
+        )
+        final_report = {section: content for section, content in results.items() if section and content}
         
-        # Publish completion message
         if redis_cache:
+            # Store the result before announcing completion, so clients that
+            # react to the message find the job finished
+            await redis_cache.finish_job(job_id, final_report, report_hash=get_report_hash(data))
             await redis_cache.publish(
                 f"tia_updates:{job_id}", 
                 json.dumps({"status": "complete"})
             )
-            
-            # Store final result
-            await redis_cache.set_job_result(job_id, final_report)
-            await redis_cache.set_job_status(job_id, "finished")
-            
-            # Generate cache key for the full report
-            report_hash = hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
-            await redis_cache.set_report_hash(report_hash, final_report)
         
         total_time = time.time() - start_time
         logger.info(f"Progressive TIA generation completed in {total_time:.2f}s for job {job_id}")
-        metrics.record_full_report_generation(total_time, len(final_report))
+        metrics.record_full_report_generation(total_time, len(final_report), hedged=metrics.job_was_hedged(job_id))
+        await record_job_cost(job_id, redis_cache)
         
     except Exception as e:
         error_msg = f"Error in progressive TIA generation: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
         
         # Update job status and publish error
+        await record_job_cost(job_id, redis_cache)
         if redis_cache:
-            await redis_cache.set_job_error(job_id, error_msg)
-            await redis_cache.set_job_status(job_id, "failed")
+            await redis_cache.fail_job(job_id, error_msg)
             await redis_cache.publish(
                 f"tia_updates:{job_id}", 
                 json.dumps({"status": "failed", "error": str(e)})
-            )
\ No newline at end of file
+            )
+    
+    finally:
+        await release_report(redis_cache, "report_stream", get_report_hash(data), job_id)
\ No newline at end of file